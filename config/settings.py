@@ -52,7 +52,6 @@ INSTALLED_APPS = [
 
     # Third-party apps
     'drf_yasg',
-    'debug_toolbar',
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
@@ -66,7 +65,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.instrumentation.QueryInstrumentationMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -77,10 +77,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# debug toolbar is only used in development
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# Query instrumentation config(core.instrumentation), budgets are max
+# number of queries per endpoint("<url name>:<action or method>") that are
+# checked by tests of store, only endpoints that their queries don't grow
+# with data(e.g. depth of categories) have a budget
+QUERY_INSTRUMENTATION = env.bool('DJANGO_QUERY_INSTRUMENTATION', DEBUG)
+QUERY_N_PLUS_ONE_THRESHOLD = env.int('DJANGO_QUERY_N_PLUS_ONE_THRESHOLD', 5)
+QUERY_BUDGETS = {
+    'store:menu-list:list': 1,
+    'store:customer-me:me': 2,
+    'store:product-batch:batch': 2,
+}
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -115,6 +132,47 @@ DATABASES = {
     }
 }
 
+# Read replicas of default database(comma separated hosts), reads of safe
+# requests to catalog views are sent to them by core.routers.ReplicaRouter
+DATABASE_REPLICAS = []
+for index, host in enumerate(env.list('DJANGO_DATABASE_REPLICA_HOSTS', []), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds that a request(cookie) or user that wrote reads from primary
+DATABASE_PRIMARY_STICKY_SECONDS = env.int('DJANGO_DATABASE_PRIMARY_STICKY_SECONDS', 5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': env.dj_cache_url('DJANGO_CACHE_URL', 'locmem://?max_entries=10000')
+}
+
+# Entries of these backends aren't seen by other processes(or aren't kept at
+# all), DJANGO_CACHE_URL must point to a shared cache(e.g. redis://) when the
+# project is served by more than one process, tiered cache, cache broadcast,
+# idempotency keys, cache OTP store and claims auth keep their state in it,
+# `manage.py check --deploy` warns(core.W001-W005) when they run on one of
+# these backends
+PROCESS_LOCAL_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+# Tiered cache config(core.caches), in-process LRU in front of the shared
+# cache, local copies live at most TIERED_CACHE_LOCAL_TIMEOUT seconds and are
+# dropped in other processes by messages of CACHE_BROADCAST(core.caches.
+# CacheBroadcast through the shared cache or in-process core.caches.LocalBroadcast)
+TIERED_CACHE_ALIAS = env('DJANGO_TIERED_CACHE_ALIAS', 'default')
+TIERED_CACHE_MAX_ENTRIES = env.int('DJANGO_TIERED_CACHE_MAX_ENTRIES', 10000)
+TIERED_CACHE_LOCAL_TIMEOUT = env.int('DJANGO_TIERED_CACHE_LOCAL_TIMEOUT', 30)
+CACHE_BROADCAST = env('DJANGO_CACHE_BROADCAST', 'core.caches.CacheBroadcast')
+CACHE_BROADCAST_POLL_INTERVAL = env.float('DJANGO_CACHE_BROADCAST_POLL_INTERVAL', 1)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -171,18 +229,72 @@ AUTHENTICATION_BACKENDS = ['core.backends.CustomAuthBackend']
 # Rest framework config
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'core.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'otp_request': env('DJANGO_THROTTLE_OTP_REQUEST_RATE', '1/min'),
+        'otp_request_ip': env('DJANGO_THROTTLE_OTP_REQUEST_IP_RATE', '10/min'),
+        'otp_verify': env('DJANGO_THROTTLE_OTP_VERIFY_RATE', '5/min'),
+        'login': env('DJANGO_THROTTLE_LOGIN_RATE', '5/min'),
+        'login_ip': env('DJANGO_THROTTLE_LOGIN_IP_RATE', '20/min'),
+        'products_anon': env('DJANGO_THROTTLE_PRODUCTS_ANON_RATE', '120/min'),
+        'products_user': env('DJANGO_THROTTLE_PRODUCTS_USER_RATE', '600/min'),
+    }
 }
 
+# Throttle store, core.throttles.LocalThrottleStore(per process) or
+# core.throttles.CacheThrottleStore(shared between processes by cache)
+THROTTLE_STORE = env('DJANGO_THROTTLE_STORE', 'core.throttles.LocalThrottleStore')
+
 # Config json web token
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=env.int('DJANGO_JWT_ACCESS_MINUTES')),
     "REFRESH_TOKEN_LIFETIME": timedelta(minutes=env.int('DJANGO_JWT_REFRESH_MINUTES')),
-}    
+    "TOKEN_REFRESH_SERIALIZER": "core.serializers.CustomTokenRefreshSerializer",
+}
+
+# Seconds that user data of core.authentication.ClaimsJWTAuthentication is cached
+AUTH_USER_CACHE_TIMEOUT = env.int('DJANGO_AUTH_USER_CACHE_TIMEOUT', 5 * 60)
 
 # Config zarinpal
 ZARINPAL_MERCHANT_ID = env('DJANGO_ZARINPAL_MERCHANT_ID')
+ZARINPAL_BASE_URL = env('DJANGO_ZARINPAL_BASE_URL', 'https://sandbox.zarinpal.com')
+ZARINPAL_CONNECT_TIMEOUT = env.float('DJANGO_ZARINPAL_CONNECT_TIMEOUT', 3)
+ZARINPAL_READ_TIMEOUT = env.float('DJANGO_ZARINPAL_READ_TIMEOUT', 10)
+ZARINPAL_POOL_MAXSIZE = env.int('DJANGO_ZARINPAL_POOL_MAXSIZE', 20)
+ZARINPAL_ASYNC_POOL_MAXSIZE = env.int('DJANGO_ZARINPAL_ASYNC_POOL_MAXSIZE', 200)
+ZARINPAL_VERIFY_RETRIES = env.int('DJANGO_ZARINPAL_VERIFY_RETRIES', 2)
+ZARINPAL_VERIFY_RETRY_BACKOFF = env.float('DJANGO_ZARINPAL_VERIFY_RETRY_BACKOFF', 0.2)
+ZARINPAL_CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int('DJANGO_ZARINPAL_CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+ZARINPAL_CIRCUIT_BREAKER_RECOVERY_TIMEOUT = env.float('DJANGO_ZARINPAL_CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 30)
 
 # Rosetta config
 ROSETTA_ACCESS_CONTROL_FUNCTION = is_access_to_rosetta_views
+
+# Cart snapshot config
+CART_SNAPSHOT_TIMEOUT = env.int('DJANGO_CART_SNAPSHOT_TIMEOUT', 60 * 60)
+
+# Product owner cache config(seconds, 0 disables shared cache)
+PRODUCT_SELLER_CACHE_TIMEOUT = env.int('DJANGO_PRODUCT_SELLER_CACHE_TIMEOUT', 30)
+
+# Max number of ids of products batch endpoint(/store/products/batch/?ids=...)
+PRODUCT_BATCH_MAX_IDS = env.int('DJANGO_PRODUCT_BATCH_MAX_IDS', 50)
+
+# Max age(seconds) of Cache-Control of precompiled menus, clients revalidate by ETag
+MENU_CACHE_MAX_AGE = env.int('DJANGO_MENU_CACHE_MAX_AGE', 60)
+
+# Admin changelist config(0 disables estimated count and facets cache)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('DJANGO_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+ADMIN_FACETS_CACHE_TIMEOUT = env.int('DJANGO_ADMIN_FACETS_CACHE_TIMEOUT', 60)
+
+# One-time password config, OTPs are kept in cache only if it's shared, otherwise
+# an OTP that is created in one process isn't found by the others
+OTP_STORE = env(
+    'DJANGO_OTP_STORE',
+    'core.otp.DatabaseOTPStore' if CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS else 'core.otp.CacheOTPStore'
+)
+OTP_EXPIRE_SECONDS = env.int('DJANGO_OTP_EXPIRE_SECONDS', 120)
+
+# Idempotency config
+IDEMPOTENCY_KEY_TIMEOUT = env.int('DJANGO_IDEMPOTENCY_KEY_TIMEOUT', 24 * 60 * 60)
+IDEMPOTENCY_WAIT_TIMEOUT = env.int('DJANGO_IDEMPOTENCY_WAIT_TIMEOUT', 30)
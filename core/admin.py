@@ -8,6 +8,7 @@ from django.http import HttpResponseRedirect
 
 from .models import CustomUser, OTP
 from .signals import add_user_to_staff, remove_users_from_staff
+from .authentication import invalidate_user_auth
 
 
 # Custom Filter
@@ -58,7 +59,9 @@ class CustomUserAdmin(BaseUserAdmin):
 
     @admin.action(description=_('Active users accounts'))
     def active_users_accounts(self, request, queryset):
+        user_ids = list(queryset.values_list('id', flat=True))
         update_count = queryset.update(is_active=True)
+        invalidate_user_auth(*user_ids)
         self.message_user(
             request,
             _('%(update_count)d accounts of users activated.') % {'update_count': update_count},
@@ -96,7 +99,9 @@ class CustomUserAdmin(BaseUserAdmin):
         queryset = queryset.filter(is_staff=True)
         remove_users_from_staff.send_robust(self.__class__, queryset=queryset)
         
+        user_ids = list(queryset.values_list('id', flat=True))
         update_count = queryset.update(is_staff=False)
+        invalidate_user_auth(*user_ids)
         self.message_user(request, 
                           _('%(update_count)d users have been removed from the admin.') % {'update_count': update_count},
                           messages.SUCCESS)
@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.db.models import DEFERRED, F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from uuid import uuid4
+
+from .caches import is_shared_cache
+
+User = get_user_model()
+
+AUTH_VERSION_KEY = 'core:auth_version:{user_id}'
+AUTH_USER_KEY = 'core:auth_user:{user_id}'
+
+AUTH_VERSION_CLAIM = 'auth_version'
+USER_CLAIMS = ['phone', 'is_active', 'is_staff', 'is_superuser']
+ROLE_CLAIMS = ['customer_id', 'seller_id', 'seller_status']
+
+# fields of user that are cached, password is never cached and stays deferred
+USER_FIELDS = ['id', 'phone', 'email', 'is_active', 'is_staff', 'is_superuser']
+
+
+def get_auth_version(user_id):
+    """
+        version of authentication data of user, a missing version gets a
+        random one, so tokens issued before the cache was cleared don't match
+    """
+    version_key = AUTH_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(version_key)
+
+    if version is None:
+        cache.add(version_key, uuid4().hex, None)
+        version = cache.get(version_key)
+    return version
+
+
+def invalidate_user_auth(*user_ids):
+    """
+        claims of issued tokens and cached data of users become stale, call it
+        when is_active, is_staff, is_superuser or seller of users change
+    """
+    cache.set_many({AUTH_VERSION_KEY.format(user_id=user_id): uuid4().hex for user_id in user_ids}, None)
+    cache.delete_many([AUTH_USER_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def get_user_data(user_id, version=None):
+    """
+        return fields of user and its roles(customer_id, seller_id, seller_status)
+        from cache or by one query, None if user doesn't exist
+    """
+    version = version or get_auth_version(user_id)
+    user_key = AUTH_USER_KEY.format(user_id=user_id)
+
+    data = cache.get(user_key)
+    if data is not None and data['version'] == version:
+        return data
+
+    data = User.objects.filter(id=user_id).values(
+        *USER_FIELDS, customer_id=F('customer__id'), seller_id=F('seller__id'), seller_status=F('seller__status')
+    ).first()
+
+    if data is not None:
+        data['version'] = version
+        cache.set(user_key, data, settings.AUTH_USER_CACHE_TIMEOUT)
+    return data
+
+
+def build_user(data):
+    """
+        user instance from data without query, fields that aren't in
+        data(e.g. password) are deferred and loaded on first access,
+        save() of the instance only updates the loaded fields
+    """
+    fields = User._meta.concrete_fields
+    user = User.from_db(
+        router.db_for_read(User),
+        [field.attname for field in fields],
+        [data.get(field.attname, DEFERRED) for field in fields]
+    )
+    user.role_claims = {claim: data[claim] for claim in ROLE_CLAIMS}
+    return user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+        refresh token that carries user and role claims, claims are
+        renewed when an access token is made from a stale refresh token
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(get_user_data(user.pk))
+        return token
+
+    def set_user_claims(self, data):
+        if data is None:
+            return
+        for claim in USER_CLAIMS + ROLE_CLAIMS:
+            self[claim] = data[claim]
+        self[AUTH_VERSION_CLAIM] = data['version']
+
+    @property
+    def access_token(self):
+        user_id = self.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            version = get_auth_version(user_id)
+            if self.get(AUTH_VERSION_CLAIM) != version:
+                self.set_user_claims(get_user_data(user_id, version))
+        return super().access_token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+        authenticate by claims of token while their version is the current
+        auth version of user(one cache read), otherwise by cached user data,
+        so requests are authenticated without query
+
+        versions must be in a shared cache, a version that is bumped in a
+        process-local cache isn't seen by other processes, so without a
+        shared cache user is read from database like JWTAuthentication
+    """
+
+    def get_user(self, validated_token):
+        if not is_shared_cache():
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version = get_auth_version(user_id)
+        if validated_token.get(AUTH_VERSION_CLAIM) == version:
+            data = {claim: validated_token[claim] for claim in USER_CLAIMS + ROLE_CLAIMS}
+            data['id'] = user_id
+        else:
+            data = get_user_data(user_id, version)
+            if data is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not data['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return build_user(data)
@@ -0,0 +1,306 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.utils.module_loading import import_string
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+NAMESPACE_PRODUCTS = 'products'
+NAMESPACE_CATEGORIES = 'categories'
+NAMESPACE_MENUS = 'menus'
+NAMESPACE_CARTS = 'carts'
+
+NAMESPACE_VERSION_KEY = 'core:cache_namespace:{namespace}'
+NAMESPACED_KEY = 'core:cache:{namespace}:{version}:{key}'
+BROADCAST_SEQUENCE_KEY = 'core:cache_broadcast:sequence'
+BROADCAST_MESSAGE_KEY = 'core:cache_broadcast:{sequence}'
+
+# message of broadcast that drops every entry of local tier
+CLEAR_ALL = '*'
+
+MISSING = object()
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+        whether entries of cache are seen by every process, caches of
+        PROCESS_LOCAL_CACHE_BACKENDS(e.g. locmem) aren't
+    """
+    return settings.CACHES[alias]['BACKEND'] not in settings.PROCESS_LOCAL_CACHE_BACKENDS
+
+
+class CacheMetrics:
+    """
+        hit, miss and eviction counters of tiers of the cache
+    """
+    def __init__(self):
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name, count=1):
+        with self._lock:
+            self._counters[name] += count
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+        for tier in ['local', 'shared']:
+            lookups = counters.get(f'{tier}_hits', 0) + counters.get(f'{tier}_misses', 0)
+            counters[f'{tier}_hit_ratio'] = round(counters.get(f'{tier}_hits', 0) / lookups, 4) if lookups else None
+        return counters
+
+    def reset(self):
+        with self._lock:
+            self._counters = Counter()
+
+
+cache_metrics = CacheMetrics()
+
+
+class LocalTier:
+    """
+        bounded in-process LRU with timeout per entry, least recently
+        used entries are evicted when max_entries is reached
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # key: (expire time, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            evictions = len(self._entries) - self.max_entries
+            for _ in range(evictions):
+                self._entries.popitem(last=False)
+        if evictions > 0:
+            cache_metrics.incr('local_evictions', evictions)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalBroadcast:
+    """
+        in-process stand-in of broadcast channel, messages are only delivered
+        to subscribers of this process(e.g. development server and tests)
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, message):
+        cache_metrics.incr('broadcast_published')
+        self.deliver([message])
+
+    def deliver(self, messages):
+        for message in messages:
+            for callback in self._subscribers:
+                callback(message)
+
+    def poll(self):
+        pass
+
+
+class CacheBroadcast(LocalBroadcast):
+    """
+        broadcast channel on the shared cache, messages are numbered by an
+        atomic sequence and each process reads the new ones at most once per
+        CACHE_BROADCAST_POLL_INTERVAL seconds, a process that missed expired
+        messages clears its whole local tier
+    """
+
+    def __init__(self, poll_interval=None, message_timeout=60):
+        super().__init__()
+        self.poll_interval = poll_interval if poll_interval is not None else settings.CACHE_BROADCAST_POLL_INTERVAL
+        self.message_timeout = message_timeout
+        self._last_sequence = None
+        self._next_poll = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[settings.TIERED_CACHE_ALIAS]
+
+    def publish(self, message):
+        self.shared.add(BROADCAST_SEQUENCE_KEY, 0, None)
+        try:
+            sequence = self.shared.incr(BROADCAST_SEQUENCE_KEY)
+        except ValueError:
+            # sequence is evicted, other processes miss nothing but this message
+            self.shared.set(BROADCAST_SEQUENCE_KEY, 0, None)
+            sequence = self.shared.incr(BROADCAST_SEQUENCE_KEY)
+        self.shared.set(BROADCAST_MESSAGE_KEY.format(sequence=sequence), message, self.message_timeout)
+        super().publish(message)
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self._next_poll or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + self.poll_interval
+            sequence = self.shared.get(BROADCAST_SEQUENCE_KEY, 0)
+            last_sequence, self._last_sequence = self._last_sequence, sequence
+            if last_sequence is None or sequence == last_sequence:
+                return
+
+            if sequence < last_sequence:
+                # sequence is reset
+                messages = [CLEAR_ALL]
+            else:
+                keys = [BROADCAST_MESSAGE_KEY.format(sequence=number) for number in range(last_sequence + 1, sequence + 1)]
+                values = self.shared.get_many(keys)
+                messages = [values[key] for key in keys] if len(values) == len(keys) else [CLEAR_ALL]
+        finally:
+            self._lock.release()
+
+        cache_metrics.incr('broadcast_received', len(messages))
+        self.deliver(messages)
+
+
+class TieredCache:
+    """
+        in-process LRU(local tier) in front of a django cache(shared tier),
+        keys live in versioned namespaces so a namespace is invalidated by
+        bumping its version, local copies of changed keys and versions are
+        dropped in other processes by messages of the broadcast channel,
+        local timeout bounds staleness when a message is lost
+
+        None isn't cached, same as the django cache
+    """
+
+    def __init__(self, alias='default', max_entries=10000, local_timeout=30, broadcast=None):
+        self.alias = alias
+        self.local_timeout = local_timeout
+        self.local = LocalTier(max_entries)
+        self.broadcast = broadcast or LocalBroadcast()
+        self.broadcast.subscribe(self._on_message)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _get_local_timeout(self, timeout):
+        return self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def _on_message(self, message):
+        if message == CLEAR_ALL:
+            self.local.clear()
+        else:
+            self.local.delete(message)
+
+    def _get(self, key, local_timeout):
+        value = self.local.get(key)
+        if value is not MISSING:
+            cache_metrics.incr('local_hits')
+            return value
+        cache_metrics.incr('local_misses')
+
+        value = self.shared.get(key)
+        if value is None:
+            cache_metrics.incr('shared_misses')
+            return None
+        cache_metrics.incr('shared_hits')
+        self.local.set(key, value, local_timeout)
+        return value
+
+    def get_version(self, namespace):
+        self.broadcast.poll()
+        version_key = NAMESPACE_VERSION_KEY.format(namespace=namespace)
+        version = self._get(version_key, self.local_timeout)
+        if version is None:
+            self.shared.add(version_key, 1, None)
+            version = self.shared.get(version_key, 1)
+            self.local.set(version_key, version, self.local_timeout)
+        return version
+
+    def bump_version(self, namespace):
+        """
+            invalidate all keys of namespace in every process
+        """
+        version_key = NAMESPACE_VERSION_KEY.format(namespace=namespace)
+        if not self.shared.add(version_key, 2, None):
+            try:
+                self.shared.incr(version_key)
+            except ValueError:
+                self.shared.set(version_key, 2, None)
+        self.local.delete(version_key)
+        self.broadcast.publish(version_key)
+
+    def make_key(self, namespace, key):
+        return NAMESPACED_KEY.format(namespace=namespace, version=self.get_version(namespace), key=key)
+
+    def get(self, namespace, key, default=None):
+        value = self._get(self.make_key(namespace, key), self.local_timeout)
+        return default if value is None else value
+
+    def set(self, namespace, key, value, timeout):
+        """
+            timeout is of shared tier(None for no expiry), local tier keeps
+            value at most for local timeout
+        """
+        namespaced_key = self.make_key(namespace, key)
+        self.shared.set(namespaced_key, value, timeout)
+        self.broadcast.publish(namespaced_key)
+        self.local.set(namespaced_key, value, self._get_local_timeout(timeout))
+
+    def get_or_set(self, namespace, key, default, timeout):
+        """
+            default(a callable) is only called on miss of both tiers,
+            filling a miss isn't broadcast because no process has a copy
+        """
+        namespaced_key = self.make_key(namespace, key)
+        local_timeout = self._get_local_timeout(timeout)
+        value = self._get(namespaced_key, local_timeout)
+        if value is None:
+            value = default() if callable(default) else default
+            if value is not None:
+                self.shared.set(namespaced_key, value, timeout)
+                self.local.set(namespaced_key, value, local_timeout)
+        return value
+
+    def delete(self, namespace, key):
+        namespaced_key = self.make_key(namespace, key)
+        self.shared.delete(namespaced_key)
+        self.local.delete(namespaced_key)
+        self.broadcast.publish(namespaced_key)
+
+    def clear_local(self):
+        self.local.clear()
+
+
+@lru_cache
+def get_tiered_cache():
+    return TieredCache(
+        alias=settings.TIERED_CACHE_ALIAS,
+        max_entries=settings.TIERED_CACHE_MAX_ENTRIES,
+        local_timeout=settings.TIERED_CACHE_LOCAL_TIMEOUT,
+        broadcast=import_string(settings.CACHE_BROADCAST)(),
+    )
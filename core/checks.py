@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.checks import Tags, Warning, register
+from django.utils.module_loading import import_string
+
+from .caches import CacheBroadcast, is_shared_cache
+
+SHARED_CACHE_HINT = (
+    "Set DJANGO_CACHE_URL to a cache that is shared by all processes(e.g. redis://), "
+    "a process-local cache only works when the project is served by one process."
+)
+
+
+def is_subclass(import_path, base_import_path):
+    return issubclass(import_string(import_path), import_string(base_import_path))
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+        warn about features that keep their state in a process-local
+        cache(PROCESS_LOCAL_CACHE_BACKENDS), with more than one process
+        each of them sees its own copy of state, only run by check --deploy
+        because a process-local cache is fine for development
+    """
+    errors = []
+
+    if not is_shared_cache(settings.TIERED_CACHE_ALIAS):
+        errors.append(Warning(
+            f"Shared tier of tiered cache(TIERED_CACHE_ALIAS='{settings.TIERED_CACHE_ALIAS}') is process-local, "
+            "invalidation of cached products, categories and menus isn't seen by other processes.",
+            hint=SHARED_CACHE_HINT,
+            id='core.W001',
+        ))
+
+        if issubclass(import_string(settings.CACHE_BROADCAST), CacheBroadcast):
+            errors.append(Warning(
+                f"CACHE_BROADCAST='{settings.CACHE_BROADCAST}' publishes messages on a process-local cache, "
+                "local tiers of other processes are never notified.",
+                hint=SHARED_CACHE_HINT,
+                id='core.W002',
+            ))
+
+    if not is_shared_cache(DEFAULT_CACHE_ALIAS):
+        errors.append(Warning(
+            "Idempotency keys are kept in a process-local cache, a retried request that reaches "
+            "another process is executed again.",
+            hint=SHARED_CACHE_HINT,
+            id='core.W003',
+        ))
+
+        if is_subclass(settings.OTP_STORE, 'core.otp.CacheOTPStore'):
+            errors.append(Warning(
+                f"OTP_STORE='{settings.OTP_STORE}' keeps one-time passwords in a process-local cache, "
+                "a password that is sent by one process isn't found by the others.",
+                hint=SHARED_CACHE_HINT + " Or set DJANGO_OTP_STORE to core.otp.DatabaseOTPStore.",
+                id='core.W004',
+            ))
+
+        authentication_classes = settings.REST_FRAMEWORK.get('DEFAULT_AUTHENTICATION_CLASSES', [])
+        if any(is_subclass(import_path, 'core.authentication.ClaimsJWTAuthentication') for import_path in authentication_classes):
+            errors.append(Warning(
+                "Auth versions of ClaimsJWTAuthentication need a shared cache, "
+                "users are read from database on every request.",
+                hint=SHARED_CACHE_HINT,
+                id='core.W005',
+            ))
+
+    return errors
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from collections import Counter
+from contextlib import ExitStack
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+IN_PARAMS_PATTERN = re.compile(r'IN \((?:%s, )*%s\)')
+SPACES_PATTERN = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+        sql of query without its parameters, queries that are different only
+        in parameters(e.g. same query for each row) have the same fingerprint
+    """
+    return SPACES_PATTERN.sub(' ', IN_PARAMS_PATTERN.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """
+        record fingerprint and duration of queries of all databases
+        that are executed inside of `with` block
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((fingerprint(sql), time.perf_counter() - start_time))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration_ms(self):
+        return round(sum(duration for _, duration in self.queries) * 1000, 2)
+
+    @property
+    def duplicates(self):
+        """
+            fingerprints that are executed more than once with their count
+        """
+        return {sql: count for sql, count in Counter(sql for sql, _ in self.queries).items() if count > 1}
+
+    @property
+    def n_plus_one(self):
+        """
+            fingerprints that are repeated at least QUERY_N_PLUS_ONE_THRESHOLD
+            times, usually a query per row of a list
+        """
+        return {sql: count for sql, count in self.duplicates.items() if count >= settings.QUERY_N_PLUS_ONE_THRESHOLD}
+
+
+def get_endpoint(request, view_func):
+    """
+        name of url with action of viewset(or method of other views), e.g.
+        "product-list:list", "product-list:create", "product-comments-like:post"
+    """
+    view_name = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_name}:{actions.get(method, method)}'
+
+
+class QueryInstrumentationMiddleware:
+    """
+        record query count, duplicated fingerprints and database time of each
+        request when QUERY_INSTRUMENTATION is enabled(otherwise it isn't used),
+        warn about N+1 queries and requests over their QUERY_BUDGETS, the record
+        is set on response as `query_record` for assertQueryBudget of
+        QueryBudgetTestMixin
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.process_response(request, response, recorder)
+
+    async def __acall__(self, request):
+        # queries of async requests are executed in threads of sync_to_async,
+        # wrappers are added to connections of the thread of this request
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.process_response(request, response, recorder)
+
+    def process_response(self, request, response, recorder):
+        recorder.endpoint = getattr(request, '_query_endpoint', None) or request.path
+        response.query_record = recorder
+        response['X-Query-Count'] = recorder.count
+        response['X-Query-Duration-Ms'] = recorder.duration_ms
+
+        budget = settings.QUERY_BUDGETS.get(recorder.endpoint)
+        if recorder.n_plus_one:
+            logger.warning(
+                '%s executed %d queries(%s ms), repeated queries: %s',
+                recorder.endpoint, recorder.count, recorder.duration_ms, recorder.n_plus_one
+            )
+        elif budget is not None and recorder.count > budget:
+            logger.warning('%s executed %d queries, budget is %d', recorder.endpoint, recorder.count, budget)
+        else:
+            logger.debug('%s executed %d queries(%s ms)', recorder.endpoint, recorder.count, recorder.duration_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_endpoint = get_endpoint(request, view_func)
+
+
+class QueryBudgetTestMixin:
+    """
+        mixin of TestCase for checking queries of responses of test client,
+        QUERY_INSTRUMENTATION must be enabled(e.g. by override_settings)
+    """
+
+    def assertQueryBudget(self, response, budget=None, allow_n_plus_one=False):
+        record = getattr(response, 'query_record', None)
+        if record is None:
+            self.fail("Response has no query record, enable QUERY_INSTRUMENTATION.")
+
+        if budget is None:
+            budget = settings.QUERY_BUDGETS.get(record.endpoint)
+        if budget is not None and record.count > budget:
+            self.fail(f"{record.endpoint} executed {record.count} queries, budget is {budget}: {record.duplicates}")
+        if not allow_n_plus_one and record.n_plus_one:
+            self.fail(f"{record.endpoint} has N+1 queries: {record.n_plus_one}")
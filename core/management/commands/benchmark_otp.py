@@ -0,0 +1,60 @@
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    help = "Measure throughput of requesting and verifying one-time passwords per OTP store"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Number of one-time passwords that are requested and verified")
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument(
+            '--store', action='append', dest='stores',
+            help="Import path of OTP store, can be repeated(default: cache and database stores)"
+        )
+
+    def run_in_threads(self, function, items, concurrency):
+        def run(item):
+            try:
+                return function(item)
+            finally:
+                close_old_connections()
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run, items))
+        return results, time.perf_counter() - start_time
+
+    def benchmark(self, store, options):
+        phones = ['09%09d' % i for i in range(options['requests'])]
+
+        otps, request_elapsed = self.run_in_threads(store.create, phones, options['concurrency'])
+        verified, verify_elapsed = self.run_in_threads(
+            lambda otp: store.verify(otp.id, otp.phone, otp.password), otps, options['concurrency']
+        )
+        replayed, _ = self.run_in_threads(
+            lambda otp: store.verify(otp.id, otp.phone, otp.password), otps, options['concurrency']
+        )
+
+        return {
+            'requests_per_second': round(len(otps) / request_elapsed, 2),
+            'verifications_per_second': round(len(otps) / verify_elapsed, 2),
+            'verified': verified.count(True),
+            'verified_twice': replayed.count(True),
+        }
+
+    def handle(self, *args, **options):
+        stores = options['stores'] or ['core.otp.CacheOTPStore', 'core.otp.DatabaseOTPStore']
+
+        report = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'stores': {import_path: self.benchmark(get_otp_store(import_path), options) for import_path in stores},
+        }
+        self.stdout.write(json.dumps(report, indent=2))
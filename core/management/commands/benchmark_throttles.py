@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from rest_framework.parsers import JSONParser
+from rest_framework.throttling import AnonRateThrottle
+
+import json
+import time
+
+from core.throttles import get_throttle_store, RequestOTPThrottle, VerifyOTPThrottle, LoginIPThrottle, ProductAnonThrottle, ProductUserThrottle, \
+    UserRateThrottle
+
+User = get_user_model()
+
+
+class BaselineAnonRateThrottle(AnonRateThrottle):
+    """
+        DRF throttle on default cache that RequestOTPThrottle was based on
+    """
+    rate = f'{10 ** 9}/min'
+
+
+class Command(BaseCommand):
+    help = "Measure overhead of throttles per request for each algorithm and store"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200000)
+        parser.add_argument('--keys', type=int, default=1000, help="Number of distinct phones/ips the requests are spread over")
+        parser.add_argument(
+            '--store', action='append', dest='stores',
+            help="Import path of throttle store, can be repeated(default: local and cache stores)"
+        )
+
+    def get_requests(self, keys, authenticated=False):
+        factory = APIRequestFactory()
+        requests = []
+
+        for i in range(keys):
+            django_request = factory.post(
+                '/', {'phone': '09%09d' % i}, format='json', REMOTE_ADDR=f'10.0.{i // 256 % 256}.{i % 256}'
+            )
+            request = Request(django_request, parsers=[JSONParser()])
+            request.data
+            # unsaved user is enough for throttles that are keyed by user
+            request.user = User(id=i + 1) if authenticated else None
+            requests.append(request)
+
+        return requests
+
+    def measure(self, throttle, requests, iterations, repeat=5):
+        """
+            return nanoseconds per call of allow_request, best of repeat
+            runs is taken to leave out noise of other processes
+        """
+        allow_request = throttle.allow_request
+        count = len(requests)
+        best = None
+
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            for i in range(iterations):
+                allow_request(requests[i % count], None)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+
+        return round(best / iterations * 10 ** 9)
+
+    def get_throttle(self, throttle_class, store):
+        throttle = throttle_class()
+        throttle.store = store
+        # requests are never throttled, so every call takes the allowing(slower) path
+        throttle.num_requests = 10 ** 9
+        return throttle
+
+    def handle(self, *args, **options):
+        stores = options['stores'] or ['core.throttles.LocalThrottleStore', 'core.throttles.CacheThrottleStore']
+        requests = self.get_requests(options['keys'])
+        user_requests = self.get_requests(options['keys'], authenticated=True)
+        throttle_classes = [RequestOTPThrottle, VerifyOTPThrottle, LoginIPThrottle, ProductAnonThrottle, ProductUserThrottle]
+        iterations = options['iterations']
+
+        report = {'iterations': iterations, 'keys': options['keys'], 'nanoseconds_per_request': {}}
+        for import_path in stores:
+            store = get_throttle_store(import_path)
+            report['nanoseconds_per_request'][import_path] = {
+                f'{throttle_class.__name__}({throttle_class.algorithm})': self.measure(
+                    self.get_throttle(throttle_class, store),
+                    user_requests if issubclass(throttle_class, UserRateThrottle) else requests,
+                    iterations
+                )
+                for throttle_class in throttle_classes
+            }
+            store.clear()
+
+        report['nanoseconds_per_request']['rest_framework.throttling.AnonRateThrottle'] = self.measure(BaselineAnonRateThrottle(), requests, iterations)
+
+        self.stdout.write(json.dumps(report, indent=2))
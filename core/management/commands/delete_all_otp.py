@@ -1,19 +1,29 @@
 from django.core.management import BaseCommand
-from django.db import transaction
 
-from core.models import OTP
+from core.otp import get_otp_store, DatabaseOTPStore
 
 
 class Command(BaseCommand):
-    help = 'Delete all one-time password in database'
+    help = 'Delete all one-time password in database and OTP store'
 
-    @transaction.atomic
-    def handle(self, *args, **options):
-        print('Deleting all one-time passwords...')
+    def add_arguments(self, parser):
+        parser.add_argument('--expired', action='store_true', help="Only delete expired one-time passwords")
 
-        all_otp = OTP.objects.all()
+    def handle(self, *args, **options):
+        stores = [get_otp_store()]
+        # rows of OTP model are left from database store
+        if not isinstance(stores[0], DatabaseOTPStore):
+            stores.append(DatabaseOTPStore())
 
-        for otp in all_otp:
-            otp.delete()
+        if options['expired']:
+            self.stdout.write('Deleting expired one-time passwords...')
+        else:
+            self.stdout.write('Deleting all one-time passwords...')
 
-        print('Done.')
+        for store in stores:
+            deleted = store.purge_expired() if options['expired'] else store.delete_all()
+            if deleted is None:
+                # e.g. cache store, its one-time passwords expire or are dropped at once
+                self.stdout.write(f'{type(store).__name__}: Done.')
+            else:
+                self.stdout.write(f'{type(store).__name__}: Done({deleted} rows deleted).')
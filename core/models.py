@@ -87,7 +87,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
 # default value for expired datetime otp
 def get_expired_datetime():
-    return timezone.now() + timezone.timedelta(seconds=120)
+    return timezone.now() + timezone.timedelta(seconds=settings.OTP_EXPIRE_SECONDS)
         
 
 class OTP(models.Model):
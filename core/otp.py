@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from functools import lru_cache
+
+from .models import OTP
+
+OTP_KEY = 'core:otp:{generation}:{request_id}'
+OTP_GENERATION_KEY = 'core:otp_generation'
+
+
+class BaseOTPStore:
+    """
+        store of one-time passwords, verify must be an atomic get-and-delete
+        so a one-time password can't be used twice by concurrent requests,
+        purge_expired and delete_all return number of deleted one-time
+        passwords or None if store can't count them
+    """
+
+    def create(self, phone):
+        raise NotImplementedError
+
+    def verify(self, request_id, phone, password):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def delete_all(self):
+        raise NotImplementedError
+
+    def _new_otp(self, phone):
+        otp = OTP(phone=phone)
+        otp.generate_password()
+        return otp
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+        one-time passwords are kept in cache with a timeout of OTP_EXPIRE_SECONDS,
+        so they expire without any cleanup, all of them are dropped at once by
+        bumping the generation that is part of every key
+    """
+
+    def _get_generation(self):
+        generation = cache.get(OTP_GENERATION_KEY)
+        if generation is None:
+            cache.add(OTP_GENERATION_KEY, 1, None)
+            generation = cache.get(OTP_GENERATION_KEY, 1)
+        return generation
+
+    def _get_key(self, request_id):
+        return OTP_KEY.format(generation=self._get_generation(), request_id=request_id)
+
+    def create(self, phone):
+        otp = self._new_otp(phone)
+        cache.set(self._get_key(otp.id), (otp.phone, otp.password), settings.OTP_EXPIRE_SECONDS)
+        return otp
+
+    def verify(self, request_id, phone, password):
+        key = self._get_key(request_id)
+        if cache.get(key) != (phone, password):
+            return False
+        # only one of concurrent requests deletes the key
+        return cache.delete(key)
+
+    def purge_expired(self):
+        return None
+
+    def delete_all(self):
+        try:
+            cache.incr(OTP_GENERATION_KEY)
+        except ValueError:
+            cache.add(OTP_GENERATION_KEY, 2, None)
+        return None
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """
+        one-time passwords are kept in OTP model, expired rows are
+        removed by purge_expired(see delete_all_otp command)
+    """
+
+    def create(self, phone):
+        otp = self._new_otp(phone)
+        otp.save()
+        return otp
+
+    def verify(self, request_id, phone, password):
+        deleted, _ = OTP.objects.filter(
+            id=request_id,
+            phone=phone,
+            password=password,
+            expired_datetime__gte=timezone.now(),
+        ).delete()
+        return deleted > 0
+
+    def purge_expired(self):
+        deleted, _ = OTP.objects.filter(expired_datetime__lt=timezone.now()).delete()
+        return deleted
+
+    def delete_all(self):
+        deleted, _ = OTP.objects.all().delete()
+        return deleted
+
+
+@lru_cache
+def get_otp_store(import_path=None):
+    return import_string(import_path or settings.OTP_STORE)()
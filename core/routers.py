@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from contextvars import ContextVar
+import itertools
+import threading
+import time
+
+PRIMARY_DATABASE = 'default'
+PRIMARY_STICKY_COOKIE = 'primary_sticky'
+PRIMARY_STICKY_KEY = 'core:primary_sticky:{user_id}'
+
+_replica_counter = itertools.count()
+_routing_state = ContextVar('routing_state', default=None)
+
+
+class RoutingState:
+    """
+        routing state of a request, reads go to replicas only if view of
+        request allows it and neither request nor its user wrote recently
+    """
+    def __init__(self, request):
+        self.request = request
+        self.read_from_replica = False
+        self.wrote = False
+        self.sticky = PRIMARY_STICKY_COOKIE in request.COOKIES
+        self._user_checked = False
+
+    @property
+    def user(self):
+        # user is available after authentication of rest framework, lazy user of
+        # AuthenticationMiddleware isn't evaluated because it needs a query
+        user = self.request.__dict__.get('user')
+        if user is None or isinstance(user, SimpleLazyObject) or not user.is_authenticated:
+            return None
+        return user
+
+    def is_sticky(self):
+        if not self.sticky and not self._user_checked and (user := self.user) is not None:
+            self._user_checked = True
+            self.sticky = bool(cache.get(PRIMARY_STICKY_KEY.format(user_id=user.id)))
+        return self.sticky
+
+    def use_replica(self):
+        return self.read_from_replica and not self.wrote and not self.is_sticky()
+
+
+def get_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return replicas[next(_replica_counter) % len(replicas)]
+
+
+class ReplicaRouter:
+    """
+        send reads of requests that are allowed by ReplicaRoutingMiddleware to
+        DATABASE_REPLICAS(round robin), everything else(writes, reads inside of
+        transactions, select_for_update and reads out of requests) to primary
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if (
+            not settings.DATABASE_REPLICAS or state is None
+            or connections[PRIMARY_DATABASE].in_atomic_block or not state.use_replica()
+        ):
+            return PRIMARY_DATABASE
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas have the same data as primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaRoutingMiddleware:
+    """
+        reads of safe requests to views with `read_from_replica = True` are
+        sent to replicas, request(by cookie) and user(by cache) that wrote
+        stick to primary for DATABASE_PRIMARY_STICKY_SECONDS, so they read
+        their own writes while replicas are behind
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RoutingState(request)
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        if (user_id := self.stick_to_primary(request, response, state)) is not None:
+            cache.set(PRIMARY_STICKY_KEY.format(user_id=user_id), True, settings.DATABASE_PRIMARY_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        # state is in context of request, sync_to_async runs queries in a copy of it
+        state = RoutingState(request)
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+
+        if (user_id := self.stick_to_primary(request, response, state)) is not None:
+            await cache.aset(PRIMARY_STICKY_KEY.format(user_id=user_id), True, settings.DATABASE_PRIMARY_STICKY_SECONDS)
+        return response
+
+    def stick_to_primary(self, request, response, state):
+        """
+            set sticky cookie on response of request that wrote and return
+            id of its user that must stick to primary too
+        """
+        # writes of safe requests(e.g. view counter) aren't read back by user
+        if not state.wrote or request.method in SAFE_METHODS or not settings.DATABASE_PRIMARY_STICKY_SECONDS:
+            return None
+
+        response.set_cookie(PRIMARY_STICKY_COOKIE, '1', max_age=settings.DATABASE_PRIMARY_STICKY_SECONDS, httponly=True, samesite='Lax')
+        user = state.user
+        return user.id if user is not None else None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing_state.get()
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if state is not None and request.method in SAFE_METHODS:
+            state.read_from_replica = getattr(view_class, 'read_from_replica', False)
+
+
+class DatabaseMetrics:
+    """
+        per database alias query count, error count and time of queries
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, alias, duration, error=False):
+        with self._lock:
+            metric = self._metrics.setdefault(alias, {'queries': 0, 'errors': 0, 'total_time': 0.0, 'max_time': 0.0})
+            metric['queries'] += 1
+            metric['errors'] += int(error)
+            metric['total_time'] += duration
+            metric['max_time'] = max(metric['max_time'], duration)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                alias: {
+                    'queries': metric['queries'],
+                    'errors': metric['errors'],
+                    'total_ms': round(metric['total_time'] * 1000, 2),
+                    'avg_ms': round(metric['total_time'] / metric['queries'] * 1000, 2),
+                    'max_ms': round(metric['max_time'] * 1000, 2),
+                }
+                for alias, metric in self._metrics.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+
+database_metrics = DatabaseMetrics()
+
+
+@receiver(connection_created)
+def record_database_metrics(sender, connection, **kwargs):
+    # connection_created is sent again when a closed connection reconnects
+    if getattr(connection, '_database_metrics', False):
+        return
+    connection._database_metrics = True
+
+    def wrapper(execute, sql, params, many, context):
+        start_time = time.perf_counter()
+        error = False
+        try:
+            return execute(sql, params, many, context)
+        except Exception:
+            error = True
+            raise
+        finally:
+            database_metrics.record(connection.alias, time.perf_counter() - start_time, error)
+
+    # inserted first, so wrappers of execute_wrapper() that are popped on exit stay last
+    connection.execute_wrappers.insert(0, wrapper)
@@ -1,10 +1,12 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, PasswordField
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer, PasswordField
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.utils.translation import gettext as _
 
 from .models import OTP
+from .authentication import ClaimsRefreshToken
+from .otp import get_otp_store
 from store.models import Seller
 
 User = get_user_model()
@@ -21,11 +23,7 @@ class OTPSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        otp = OTP()
-        otp.phone = validated_data.get('phone')
-        otp.generate_password()
-        otp.save()
-        return otp
+        return get_otp_store().create(validated_data.get('phone'))
 
 
 class VerifyOTPSerializer(serializers.ModelSerializer):
@@ -38,6 +36,7 @@ class VerifyOTPSerializer(serializers.ModelSerializer):
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'username'
+    token_class = ClaimsRefreshToken
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -54,6 +53,10 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         
         return data
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
 class SetPasswordSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         max_length=128,
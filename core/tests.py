@@ -1,3 +1,328 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
-# Create your tests here.
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+import time
+
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken
+from .models import OTP
+from .otp import CacheOTPStore, DatabaseOTPStore, get_otp_store
+from .routers import PRIMARY_DATABASE, PRIMARY_STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .throttles import CacheThrottleStore, LocalThrottleStore
+
+User = get_user_model()
+
+
+class OTPStoreTestMixin:
+    """
+        common tests of one-time password stores
+    """
+    store_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.store_class()
+
+    def expire(self, otp):
+        """
+            context manager in which otp is expired
+        """
+        raise NotImplementedError
+
+    def test_verify_once(self):
+        otp = self.store.create('09111111111')
+
+        self.assertFalse(self.store.verify(otp.id, '09111111111', 'pass'))
+        self.assertFalse(self.store.verify(otp.id, '09122222222', otp.password))
+        self.assertTrue(self.store.verify(otp.id, '09111111111', otp.password))
+        self.assertFalse(self.store.verify(otp.id, '09111111111', otp.password))
+
+    def test_expired(self):
+        otp = self.store.create('09111111111')
+
+        with self.expire(otp):
+            self.assertFalse(self.store.verify(otp.id, '09111111111', otp.password))
+
+    def test_delete_all(self):
+        otp = self.store.create('09111111111')
+        self.store.delete_all()
+
+        self.assertFalse(self.store.verify(otp.id, '09111111111', otp.password))
+
+
+class CacheOTPStoreTests(OTPStoreTestMixin, TestCase):
+    store_class = CacheOTPStore
+
+    @contextmanager
+    def expire(self, otp):
+        later = time.time() + settings.OTP_EXPIRE_SECONDS + 1
+        with patch('django.core.cache.backends.locmem.time', SimpleNamespace(time=lambda: later)):
+            yield
+
+    def test_deleted_otps_are_not_counted(self):
+        self.store.create('09111111111')
+
+        self.assertIsNone(self.store.purge_expired())
+        self.assertIsNone(self.store.delete_all())
+
+
+class DatabaseOTPStoreTests(OTPStoreTestMixin, TestCase):
+    store_class = DatabaseOTPStore
+
+    @contextmanager
+    def expire(self, otp):
+        OTP.objects.filter(id=otp.id).update(expired_datetime=timezone.now() - timedelta(seconds=1))
+        yield
+
+    def test_purge_expired(self):
+        otp = self.store.create('09111111111')
+        expired_otp = self.store.create('09122222222')
+
+        with self.expire(expired_otp):
+            self.assertEqual(self.store.purge_expired(), 1)
+        self.assertEqual(list(OTP.objects.values_list('id', flat=True)), [otp.id])
+
+
+@override_settings(OTP_STORE='core.otp.CacheOTPStore')
+class DeleteAllOTPCommandTests(TestCase):
+    """
+        delete_all_otp reports deleted rows of stores that can count them
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_otp_store.cache_clear()
+        self.addCleanup(get_otp_store.cache_clear)
+
+    def test_counts_of_stores(self):
+        cache_otp = CacheOTPStore().create('09111111111')
+        DatabaseOTPStore().create('09122222222')
+
+        stdout = StringIO()
+        call_command('delete_all_otp', stdout=stdout)
+
+        self.assertIn('CacheOTPStore: Done.', stdout.getvalue())
+        self.assertIn('DatabaseOTPStore: Done(1 rows deleted).', stdout.getvalue())
+        self.assertFalse(CacheOTPStore().verify(cache_otp.id, '09111111111', cache_otp.password))
+        self.assertFalse(OTP.objects.exists())
+
+
+class FakeClock:
+    """
+        clock of core.throttles that only moves by advance()
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.elapsed = 0
+
+    def advance(self, seconds):
+        self.elapsed += seconds
+
+    def monotonic(self):
+        return 1000 + self.elapsed
+
+    def time(self):
+        return self.start + self.elapsed
+
+
+class ThrottleStoreTestMixin:
+    """
+        common tests of throttle stores, 3 requests per 60 seconds
+    """
+    store_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.store_class()
+        self.clock = FakeClock()
+        patcher = patch('core.throttles.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def consume_tokens(self, key='key', count=3):
+        return [self.store.consume_token(key, 3, 3 / 60) for _ in range(count)]
+
+    def hit_window(self, key='key', count=3):
+        return [self.store.hit_window(key, 3, 60) for _ in range(count)]
+
+    def test_token_bucket(self):
+        self.assertEqual(self.consume_tokens(), [None] * 3)
+        wait = self.store.consume_token('key', 3, 3 / 60)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 20)
+        self.assertEqual(self.consume_tokens(key='other', count=1), [None])
+
+    def test_token_bucket_refill(self):
+        self.consume_tokens()
+        self.clock.advance(20)
+
+        self.assertIsNone(self.store.consume_token('key', 3, 3 / 60))
+        self.assertIsNotNone(self.store.consume_token('key', 3, 3 / 60))
+
+        self.clock.advance(60)
+        self.assertEqual(self.consume_tokens(), [None] * 3)
+
+    def test_sliding_window(self):
+        self.assertEqual(self.hit_window(), [None] * 3)
+        wait = self.store.hit_window('key', 3, 60)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 60)
+        self.assertEqual(self.hit_window(key='other', count=1), [None])
+
+        self.clock.advance(120)
+        self.assertEqual(self.hit_window(), [None] * 3)
+
+
+class LocalThrottleStoreTests(ThrottleStoreTestMixin, TestCase):
+    store_class = LocalThrottleStore
+
+    def test_full_shard(self):
+        self.store = LocalThrottleStore(shards=1, max_entries_per_shard=2)
+
+        for key in ['first', 'second', 'third']:
+            self.assertIsNone(self.store.consume_token(key, 3, 3 / 60))
+        self.assertLessEqual(len(self.store._shards[0][1]), 2)
+
+
+class CacheThrottleStoreTests(ThrottleStoreTestMixin, TestCase):
+    store_class = CacheThrottleStore
+
+
+# tests run in one process, so its locmem cache is shared like the cache of production
+@override_settings(PROCESS_LOCAL_CACHE_BACKENDS=[])
+class ClaimsJWTAuthenticationTests(TestCase):
+    """
+        claims of access tokens are used until auth version of user is bumped
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone='09111111111', password='password')
+        self.token = ClaimsRefreshToken.for_user(self.user).access_token
+
+    def authenticate(self, token=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def test_claims_of_current_version(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+
+        self.assertEqual((user.id, user.phone, user.is_staff), (self.user.id, '09111111111', False))
+        self.assertEqual(user.role_claims['customer_id'], self.user.customer.id)
+
+    def test_change_of_user(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate().is_staff)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.authenticate().is_staff)
+
+    def test_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deleted_user(self):
+        self.user.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_claims_of_refresh_token_are_renewed(self):
+        refresh_token = ClaimsRefreshToken.for_user(self.user)
+        self.user.is_superuser = True
+        self.user.save()
+
+        self.assertTrue(refresh_token.access_token['is_superuser'])
+
+    @override_settings(PROCESS_LOCAL_CACHE_BACKENDS=['django.core.cache.backends.locmem.LocMemCache'])
+    def test_process_local_cache(self):
+        with self.assertNumQueries(1):
+            user = self.authenticate()
+        self.assertEqual(user.id, self.user.id)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], DATABASE_PRIMARY_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+        reads of replica views go to replicas until request or its user writes
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = SimpleNamespace(id=1, is_authenticated=True)
+
+    def request(self, method='get', read_from_replica=True, user=None, write=False, cookies=None):
+        """
+            send request through ReplicaRoutingMiddleware, database of reads
+            of its view is returned by response.read_database
+        """
+        view = SimpleNamespace(cls=SimpleNamespace(read_from_replica=read_from_replica))
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            if user is not None:
+                request.user = user
+            if write:
+                self.router.db_for_write(User)
+            response = HttpResponse()
+            response.read_database = self.router.db_for_read(User)
+            return response
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        return middleware(request)
+
+    def test_reads_of_replica_views(self):
+        self.assertEqual(self.request().read_database, 'replica_1')
+        self.assertEqual(self.request(read_from_replica=False).read_database, PRIMARY_DATABASE)
+        self.assertEqual(self.router.db_for_read(User), PRIMARY_DATABASE)
+
+    def test_reads_in_transaction(self):
+        with patch.object(connections[PRIMARY_DATABASE], 'in_atomic_block', True):
+            self.assertEqual(self.request().read_database, PRIMARY_DATABASE)
+
+    def test_stick_to_primary_after_write(self):
+        response = self.request(method='post', user=self.user, write=True)
+        self.assertEqual(response.read_database, PRIMARY_DATABASE)
+        self.assertIn(PRIMARY_STICKY_COOKIE, response.cookies)
+
+        # request by cookie and user by cache read their writes from primary
+        self.assertEqual(self.request(cookies={PRIMARY_STICKY_COOKIE: '1'}).read_database, PRIMARY_DATABASE)
+        self.assertEqual(self.request(user=self.user).read_database, PRIMARY_DATABASE)
+        self.assertEqual(self.request(user=SimpleNamespace(id=2, is_authenticated=True)).read_database, 'replica_1')
+        self.assertEqual(self.request().read_database, 'replica_1')
+
+    def test_writes_of_safe_requests_do_not_stick(self):
+        response = self.request(user=self.user, write=True)
+
+        self.assertNotIn(PRIMARY_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.request(user=self.user).read_database, 'replica_1')
+
+    @override_settings(DATABASE_PRIMARY_STICKY_SECONDS=0)
+    def test_stickiness_is_disabled(self):
+        response = self.request(method='post', user=self.user, write=True)
+
+        self.assertNotIn(PRIMARY_STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.request(user=self.user).read_database, 'replica_1')
@@ -1,14 +1,301 @@
-from rest_framework.throttling import AnonRateThrottle
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
 
-import re
+import math
+import threading
+import time
+from collections import deque
+from functools import lru_cache
 
+THROTTLE_KEY = 'core:throttle:{key}'
+THROTTLE_WINDOW_KEY = 'core:throttle:{key}:{window}'
 
-class RequestOTPThrottle(AnonRateThrottle):
-    rate = '1/min'
+TOKEN_BUCKET = 'token_bucket'
+SLIDING_WINDOW = 'sliding_window'
+
+
+@lru_cache
+def parse_rate(rate):
+    """
+        '5/min' -> (5, 60)
+    """
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+class LocalThrottleStore:
+    """
+        in-process store, keys are spread over shards with their own lock so
+        concurrent threads rarely wait on each other, entries that are back
+        to their initial state are dropped when a shard is full
+
+        consume_token and hit_window return None when the request is allowed,
+        otherwise seconds to wait
+
+        a check costs about 1.2-2us per request in benchmark_throttles on the
+        development host, it misses the 1us target, about 600ns of it is lock,
+        clock and arithmetic of the bucket that pure python can't make cheaper
+    """
+
+    def __init__(self, shards=64, max_entries_per_shard=10000):
+        if shards & (shards - 1):
+            raise ValueError('Number of shards must be a power of 2.')
+        # shard: (lock, token buckets, sliding window logs)
+        self._shards = [(threading.Lock(), {}, {}) for _ in range(shards)]
+        self._mask = shards - 1
+        self.max_entries_per_shard = max_entries_per_shard
+
+    def _purge(self, entries, now):
+        for key in [key for key, entry in entries.items() if entry[0] <= now]:
+            del entries[key]
+        while len(entries) >= self.max_entries_per_shard:
+            del entries[next(iter(entries))]
+
+    def consume_token(self, key, capacity, refill_rate):
+        # entry: [time the bucket is full again, tokens, last refill time]
+        now = time.monotonic()
+        lock, buckets, _ = self._shards[hash(key) & self._mask]
+
+        lock.acquire()
+        try:
+            entry = buckets.get(key)
+            if entry is None:
+                if len(buckets) >= self.max_entries_per_shard:
+                    self._purge(buckets, now)
+                buckets[key] = [now + 1 / refill_rate, capacity - 1, now]
+                return None
+
+            tokens = entry[1] + (now - entry[2]) * refill_rate
+            if tokens > capacity:
+                tokens = capacity
+            entry[2] = now
+
+            if tokens >= 1:
+                entry[1] = tokens - 1
+                entry[0] = now + (capacity - tokens + 1) / refill_rate
+                return None
+
+            entry[1] = tokens
+            return (1 - tokens) / refill_rate
+        finally:
+            lock.release()
+
+    def hit_window(self, key, limit, window):
+        # entry: [time the log is empty again, timestamps of allowed requests]
+        now = time.monotonic()
+        lock, _, logs = self._shards[hash(key) & self._mask]
+
+        lock.acquire()
+        try:
+            entry = logs.get(key)
+            if entry is None:
+                if len(logs) >= self.max_entries_per_shard:
+                    self._purge(logs, now)
+                logs[key] = [now + window, deque([now], maxlen=limit)]
+                return None
+
+            log = entry[1]
+            if len(log) < limit or log[0] <= now - window:
+                log.append(now)
+                entry[0] = now + window
+                return None
+            return log[0] + window - now
+        finally:
+            lock.release()
+
+    def clear(self):
+        for lock, buckets, logs in self._shards:
+            with lock:
+                buckets.clear()
+                logs.clear()
+
+
+class CacheThrottleStore:
+    """
+        store on the shared cache, so limits hold across processes, every
+        decision is made by atomic increments(cache.incr) instead of
+        read-modify-write, token bucket is kept as its theoretical arrival
+        time(GCRA) and sliding window is approximated by two fixed windows
+    """
+
+    def consume_token(self, key, capacity, refill_rate):
+        key = THROTTLE_KEY.format(key=key)
+        now = int(time.time() * 1000)
+        interval = max(int(1000 / refill_rate), 1)
+        burst = capacity * interval
+        timeout = math.ceil(burst / 1000) + 1
+
+        if cache.add(key, now + interval, timeout):
+            return None
+
+        try:
+            arrival_time = cache.incr(key, interval)
+        except ValueError:
+            cache.add(key, now + interval, timeout)
+            return None
+
+        if arrival_time - interval < now:
+            # bucket was idle and is full again
+            cache.set(key, now + interval, timeout)
+            return None
+        if arrival_time - now > burst:
+            cache.decr(key, interval)
+            return (arrival_time - now - burst) / 1000
+
+        cache.touch(key, timeout)
+        return None
+
+    def hit_window(self, key, limit, window):
+        now = time.time()
+        current_window = int(now // window)
+        current_key = THROTTLE_WINDOW_KEY.format(key=key, window=current_window)
+        previous_key = THROTTLE_WINDOW_KEY.format(key=key, window=current_window - 1)
+
+        cache.add(current_key, 0, window * 2)
+        count = cache.incr(current_key)
+        previous_count = cache.get(previous_key, 0)
+
+        elapsed = now - current_window * window
+        if previous_count * (1 - elapsed / window) + count <= limit:
+            return None
+
+        cache.decr(current_key)
+        if count > limit or not previous_count:
+            return window - elapsed
+        return max((1 - (limit - count + 1) / previous_count) * window - elapsed, 0)
+
+    def clear(self):
+        pass
+
+
+@lru_cache
+def get_throttle_store(import_path=None):
+    return import_string(import_path or settings.THROTTLE_STORE)()
+
+
+class RateThrottle(BaseThrottle):
+    """
+        throttle with rate of its scope(DEFAULT_THROTTLE_RATES) and
+        token bucket or sliding window algorithm, subclasses define
+        the identity that requests are counted by
+    """
+    scope = None
+    algorithm = TOKEN_BUCKET
+    store = None
+
+    def __init__(self):
+        self.num_requests, self.duration = parse_rate(api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+        self._wait = None
+
+    def get_ident_key(self, request, view):
+        """
+            return identity of request or None to skip throttling
+        """
+        raise NotImplementedError
 
     def allow_request(self, request, view):
-        phone = request.data.get('phone', None)
-        if not phone or (phone and re.search(r"^09[0-9]{9}$", phone) is None):
+        ident = self.get_ident_key(request, view)
+        if ident is None:
             return True
-        
-        return super().allow_request(request, view)
+
+        key = f'{self.scope}:{ident}'
+        store = self.store or get_throttle_store()
+        if self.algorithm == TOKEN_BUCKET:
+            self._wait = store.consume_token(key, self.num_requests, self.num_requests / self.duration)
+        else:
+            self._wait = store.hit_window(key, self.num_requests, self.duration)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+    def get_ident(self, request):
+        # get_ident only reads META, it's read from django request because
+        # DRF request proxies attributes by __getattr__ that is slow
+        return super().get_ident(getattr(request, '_request', request))
+
+
+def is_valid_phone(phone):
+    return isinstance(phone, str) and len(phone) == 11 and phone.startswith('09') and phone.isascii() and phone.isdigit()
+
+
+class PhoneRateThrottle(RateThrottle):
+    phone_field = 'phone'
+
+    def get_ident_key(self, request, view):
+        phone = request.data.get(self.phone_field)
+        return phone if is_valid_phone(phone) else None
+
+
+class UsernameRateThrottle(RateThrottle):
+    """
+        username is phone or email(see CustomAuthBackend)
+    """
+
+    def get_ident_key(self, request, view):
+        username = request.data.get('username')
+        if not isinstance(username, str) or not username or len(username) > 254:
+            return None
+        return username.lower()
+
+
+class IPRateThrottle(RateThrottle):
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+def get_authenticated_user(request):
+    # throttles run after authentication, user that DRF request authenticated
+    # is set on django request too, so it's read without the slow proxy of DRF
+    user = getattr(request, '_request', request).user
+    return user if user is not None and user.is_authenticated else None
+
+
+class UserRateThrottle(RateThrottle):
+
+    def get_ident_key(self, request, view):
+        user = get_authenticated_user(request)
+        return user.pk if user is not None else None
+
+
+class AnonRateThrottle(RateThrottle):
+
+    def get_ident_key(self, request, view):
+        if get_authenticated_user(request) is not None:
+            return None
+        return self.get_ident(request)
+
+
+class RequestOTPThrottle(PhoneRateThrottle):
+    scope = 'otp_request'
+
+
+class RequestOTPIPThrottle(IPRateThrottle):
+    scope = 'otp_request_ip'
+    algorithm = SLIDING_WINDOW
+
+
+class VerifyOTPThrottle(PhoneRateThrottle):
+    scope = 'otp_verify'
+    algorithm = SLIDING_WINDOW
+
+
+class LoginThrottle(UsernameRateThrottle):
+    scope = 'login'
+    algorithm = SLIDING_WINDOW
+
+
+class LoginIPThrottle(IPRateThrottle):
+    scope = 'login_ip'
+
+
+class ProductAnonThrottle(AnonRateThrottle):
+    scope = 'products_anon'
+
+
+class ProductUserThrottle(UserRateThrottle):
+    scope = 'products_user'
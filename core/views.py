@@ -1,9 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.utils import timezone
 from django.utils.translation import gettext as _
 from rest_framework import status, generics
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -13,8 +11,9 @@ from rest_framework.permissions import IsAdminUser
 
 from .serializers import OTPSerializer, VerifyOTPSerializer, CustomTokenObtainPairSerializer, \
                           SetPasswordSerializer, UserSerializer, UserCreateSerializer
-from .models import OTP
-from .throttles import RequestOTPThrottle
+from .otp import get_otp_store
+from .authentication import ClaimsRefreshToken
+from .throttles import RequestOTPThrottle, RequestOTPIPThrottle, VerifyOTPThrottle, LoginThrottle, LoginIPThrottle
 from .paginations import CustomLimitOffsetPagination
 from store.models import Seller
 
@@ -26,7 +25,7 @@ class OTPGenericAPIView(generics.GenericAPIView):
 
     def get_throttles(self):
         if self.request.method == "POST":
-            return [RequestOTPThrottle()]
+            return [RequestOTPThrottle(), RequestOTPIPThrottle()]
         return []
 
     def post(self, request, *args, **kwargs):
@@ -54,6 +53,7 @@ class OTPGenericAPIView(generics.GenericAPIView):
 
 class VerifyOTPGenericAPIView(generics.GenericAPIView):
     serializer_class = VerifyOTPSerializer
+    throttle_classes = [VerifyOTPThrottle]
 
     def post(self, request, *args, **kwargs):
         with transaction.atomic():
@@ -64,37 +64,28 @@ class VerifyOTPGenericAPIView(generics.GenericAPIView):
             password = validated_data.get('password')
             request_id = validated_data.get('id')
 
-            try:
-                otp_obj = OTP.objects.get(
-                    id=request_id,
-                    phone=phone,
-                    password=password,
-                    expired_datetime__gte=timezone.now(),
-                )
-
-                try:
-                    user = User.objects.get(phone=phone)
-                except User.DoesNotExist:
-                    user = User(phone=phone)
-                    user.set_unusable_password()
-                    user.save()
-                
-                otp_obj.delete()
-
-                refresh_token = RefreshToken.for_user(user=user)
-                return Response({
-                        'refresh': str(refresh_token),
-                        'access': str(refresh_token.access_token), 
-                        'user_id': user.id,
-                        'phone': user.phone,
-                    }, status=status.HTTP_200_OK)
-            
-            except OTP.DoesNotExist:
+            if not get_otp_store().verify(request_id, phone, password):
                 return Response({'detail': _('Your one-time password is incorrect or has expired!')}, status=status.HTTP_400_BAD_REQUEST)
 
+            try:
+                user = User.objects.get(phone=phone)
+            except User.DoesNotExist:
+                user = User(phone=phone)
+                user.set_unusable_password()
+                user.save()
+
+            refresh_token = ClaimsRefreshToken.for_user(user=user)
+            return Response({
+                    'refresh': str(refresh_token),
+                    'access': str(refresh_token.access_token), 
+                    'user_id': user.id,
+                    'phone': user.phone,
+                }, status=status.HTTP_200_OK)
+
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [LoginThrottle, LoginIPThrottle]
 
 
 class SetPasswordGenericAPIView(generics.GenericAPIView):
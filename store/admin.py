@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Count, Case, When, Sum, Value
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.http import urlencode
 from django.utils.html import format_html
@@ -9,10 +11,58 @@ from datetime import date
 
 from .models import Customer, IncreaseWalletCredit, Seller, Category, Product, Address, Comment, Cart, CartItem, \
                     Order, OrderItem, Person, ProductImage, CommentLike, CommentDislike, Menu
+from .caches import get_admin_facet_counts
+from .paginations import EstimatedCountPaginator
+
+
+def related_aggregate(queryset, outer_field, aggregate=None):
+    """
+        correlated subquery of aggregate(number of rows by default) of rows of
+        queryset whose outer_field is pk of changelist row, it's computed only
+        for rows of the page instead of joining all related rows of the table
+    """
+    queryset = queryset.filter(**{outer_field: OuterRef('pk')}).order_by().values(outer_field)\
+        .annotate(value=aggregate or Count('pk')).values('value')
+    return Coalesce(Subquery(queryset), Value(0), output_field=IntegerField())
+
+
+class PerformanceModeAdmin(admin.ModelAdmin):
+    """
+        changelist of large tables, rows are counted by table statistics
+        above ADMIN_ESTIMATED_COUNT_THRESHOLD and unfiltered rows aren't
+        counted again next to filtered result
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 # Custom filters
-class GenderFilter(admin.SimpleListFilter):
+class ConditionListFilter(admin.SimpleListFilter):
+    """
+        list filter that each lookup is a Q condition in `conditions`,
+        facet counts of all lookups are computed by one aggregate and
+        cached for ADMIN_FACETS_CACHE_TIMEOUT seconds
+    """
+    conditions = {}
+
+    def queryset(self, request, queryset):
+        if self.value() in self.conditions:
+            return queryset.filter(self.conditions[self.value()])
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {
+            f'{index}__c': Count(pk_attname, filter=self.conditions[lookup])
+            for index, (lookup, _) in enumerate(self.lookup_choices) if lookup in self.conditions
+        }
+
+    def get_facet_queryset(self, changelist):
+        filtered_qs = changelist.get_queryset(self.request, exclude_parameters=self.expected_parameters())
+        return get_admin_facet_counts(
+            filtered_qs, self.parameter_name, self.get_facet_counts(changelist.pk_attname, filtered_qs)
+        )
+
+
+class GenderFilter(ConditionListFilter):
     title = 'gender status'
     parameter_name = 'gender'
 
@@ -20,23 +70,21 @@ class GenderFilter(admin.SimpleListFilter):
     GENDER_FEMALE = 'f'
     GENDER_NOT_DEFINED = 'n'
 
+    conditions = {
+        GENDER_MALE: Q(gender=Person.PERSON_GENDER_MALE),
+        GENDER_FEMALE: Q(gender=Person.PERSON_GENDER_FEMALE),
+        GENDER_NOT_DEFINED: Q(gender=Person.PERSON_GENDER_NOT_DEFINED),
+    }
+
     def lookups(self, request, model_admin):
         return [
             (self.GENDER_MALE, _('Male')),
             (self.GENDER_FEMALE, _('Female')),
             (self.GENDER_NOT_DEFINED, _('Not defined'))
         ]
-    
-    def queryset(self, request, queryset):
-        if self.value() == self.GENDER_MALE:
-            return queryset.filter(gender=Person.PERSON_GENDER_MALE)
-        elif self.value() == self.GENDER_FEMALE:
-            return queryset.filter(gender=Person.PERSON_GENDER_FEMALE)
-        elif self.value() == self.GENDER_NOT_DEFINED:
-            return queryset.filter(gender=Person.PERSON_GENDER_NOT_DEFINED)
 
 
-class InventoryFilter(admin.SimpleListFilter):
+class InventoryFilter(ConditionListFilter):
     title = 'inventory status'  
     parameter_name = 'inventory'
 
@@ -44,45 +92,42 @@ class InventoryFilter(admin.SimpleListFilter):
     INVENTORY_BETWEEN_FIVE_AND_TEN = '5<=10'
     INVENTORY_LOWER_THAN_FIVE = '<5'
 
+    conditions = {
+        INVENTORY_LOWER_THAN_FIVE: Q(inventory__lt=5),
+        INVENTORY_BETWEEN_FIVE_AND_TEN: Q(inventory__range=(5, 10)),
+        INVENTORY_GREATER_THAN_TEN: Q(inventory__gt=10),
+    }
+
     def lookups(self, request, model_admin):
         return [
             (self.INVENTORY_LOWER_THAN_FIVE, _('Low')),
             (self.INVENTORY_BETWEEN_FIVE_AND_TEN, _('Medium')),
             (self.INVENTORY_GREATER_THAN_TEN, _('High'))
         ]
-    
-    def queryset(self, request, queryset):
-        if self.value() == self.INVENTORY_LOWER_THAN_FIVE:
-            return queryset.filter(inventory__lt=5)
-        elif self.value() == self.INVENTORY_BETWEEN_FIVE_AND_TEN:
-            return queryset.filter(inventory__range=(5, 10))
-        elif self.value() == self.INVENTORY_GREATER_THAN_TEN:
-            return queryset.filter(inventory__gt=10)
-        
-
-class IsPaidFilter(admin.SimpleListFilter):
+
+
+class IsPaidFilter(ConditionListFilter):
     title = 'is paid status'
     parameter_name = 'is_paid'
 
     IS_PAID_TRUE = '1'
     IS_PAID_FALSE = '0'
 
+    conditions = {
+        IS_PAID_TRUE: Q(is_paid=True),
+        IS_PAID_FALSE: Q(is_paid=False),
+    }
+
     def lookups(self, request, model_admin):
         return [
             (self.IS_PAID_TRUE, _('True')),
             (self.IS_PAID_FALSE, _('False'))
         ]
-    
-    def queryset(self, request, queryset):
-        if self.value() == self.IS_PAID_TRUE:
-            return queryset.filter(is_paid=True)
-        elif self.value() == self.IS_PAID_FALSE:
-            return queryset.filter(is_paid=False)
 
 
 # Custom admin 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(PerformanceModeAdmin):
     list_display = ['get_phone', 'first_name', 'last_name', 'wallet_amount', 'get_age', 'gender', 'num_of_comments', 'num_of_addresses']
     list_editable = ['gender']
     list_per_page = 15
@@ -92,8 +137,11 @@ class CustomerAdmin(admin.ModelAdmin):
     list_select_related = ['user']
 
     def get_queryset(self, request):
-        return super().get_queryset(request)\
-            .annotate(comments_count=Count('comments', distinct=True), addresses_count=Count('addresses', distinct=True)).prefetch_related('addresses')
+        content_type = ContentType.objects.get_for_model(Customer)
+        return super().get_queryset(request).annotate(
+            comments_count=related_aggregate(Comment.objects.filter(content_type=content_type), 'object_id'),
+            addresses_count=related_aggregate(Address.objects.filter(content_type=content_type), 'object_id')
+        )
             
     @admin.display(description='# comments', ordering='comments_count')
     def num_of_comments(self, customer):
@@ -129,7 +177,7 @@ class CustomerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Seller)
-class SellerAdmin(admin.ModelAdmin):
+class SellerAdmin(PerformanceModeAdmin):
     list_display = ['company_name', 'first_name', 'last_name', 'national_code', 'gender', 'status', 'num_of_addresses', 'num_of_products']
     list_editable = ['gender']
     list_per_page = 10
@@ -138,8 +186,11 @@ class SellerAdmin(admin.ModelAdmin):
     search_fields = ['company_name']
 
     def get_queryset(self, request):
-        return super().get_queryset(request)\
-            .annotate(addresses_count=Count('addresses', distinct=True), products_count=Count('products', distinct=True))
+        content_type = ContentType.objects.get_for_model(Seller)
+        return super().get_queryset(request).annotate(
+            addresses_count=related_aggregate(Address.objects.filter(content_type=content_type), 'object_id'),
+            products_count=related_aggregate(Product.objects.all(), 'seller')
+        )
 
     @admin.display(description='# addresses', ordering='addresses_count')
     def num_of_addresses(self, seller):        
@@ -166,14 +217,16 @@ class SellerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(PerformanceModeAdmin):
     list_display = ['id', 'title', 'sub_category', 'tree_id', 'level', 'lft', 'rght', 'num_of_sub_categories', 'num_of_products']
     search_fields = ['title']
     list_per_page = 15
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('sub_category').prefetch_related('products')\
-            .annotate(sub_categories_count=Count('sub_categories'))
+        return super().get_queryset(request).select_related('sub_category').annotate(
+            sub_categories_count=related_aggregate(Category.objects.all(), 'sub_category'),
+            products_count=related_aggregate(Product.objects.all(), 'category')
+        )
     
     @admin.display(description='# sub_categories', ordering='sub_categories_count')
     def num_of_sub_categories(self, category):
@@ -187,7 +240,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
         return format_html('<a href={}>{}</a>', url, category.sub_categories_count)
     
-    @admin.display(description='# products')
+    @admin.display(description='# products', ordering='products_count')
     def num_of_products(self, category):
         url = (
             reverse('admin:store_product_changelist')
@@ -197,11 +250,11 @@ class CategoryAdmin(admin.ModelAdmin):
             })
         )
 
-        return format_html('<a href={}>{}</a>', url, category.products.count())
+        return format_html('<a href={}>{}</a>', url, category.products_count)
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(PerformanceModeAdmin):
     list_display = ['title', 'slug', 'category', 'seller', 'price', 'inventory', 'num_of_comments', 'num_of_sales', 'viewer', 'created_datetime']
     list_per_page = 15
     list_filter = [InventoryFilter]
@@ -214,11 +267,10 @@ class ProductAdmin(admin.ModelAdmin):
     ordering = ['-created_datetime']
 
     def get_queryset(self, request):
-        return super().get_queryset(request)\
-            .prefetch_related('comments')\
-            .annotate(comments_count=Count('comments', distinct=True),
-                      sales_count=Case(When(order_items__order__status=Order.ORDER_STATUS_PAID, then=Sum('order_items__quantity', distinct=True)),
-                                       default=Value(0)))
+        return super().get_queryset(request).select_related('category', 'seller').annotate(
+            comments_count=related_aggregate(Comment.objects.all(), 'product'),
+            sales_count=related_aggregate(OrderItem.objects.filter(order__status=Order.ORDER_STATUS_PAID), 'product', Sum('quantity'))
+        )
 
     @admin.display(description='# comments', ordering='comments_count')
     def num_of_comments(self, product):
@@ -256,7 +308,7 @@ class AddressAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(PerformanceModeAdmin):
     list_display = ['id', 'title', 'get_content_object', 'product', 'status', 'reply_to', 'num_of_likes', 'num_of_dislikes', 'created_datetime']
     autocomplete_fields = ['product', 'reply_to']
     ordering = ['-created_datetime']
@@ -264,12 +316,14 @@ class CommentAdmin(admin.ModelAdmin):
     list_per_page = 15
     
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('content_object', 'likes', 'dislikes')\
-               .select_related('product', 'reply_to').annotate(likes_count=Count('likes'), dislikes_count=Count('dislikes'))
+        return super().get_queryset(request).select_related('product', 'reply_to').annotate(
+            likes_count=related_aggregate(CommentLike.objects.all(), 'comment'),
+            dislikes_count=related_aggregate(CommentDislike.objects.all(), 'comment')
+        )
 
-    @admin.display(description='user')
-    def get_content_object(self, commnet):
-        return commnet.content_object
+    @admin.display(description='user', ordering='author_name')
+    def get_content_object(self, comment):
+        return comment.author_name
     
     @admin.display(description='# likes', ordering='likes_count')
     def num_of_likes(self, comment):
@@ -318,7 +372,7 @@ class CartItemAdmin(admin.ModelAdmin):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(PerformanceModeAdmin):
     list_display = ['customer', 'status', 'zarinpal_authority', 'zarinpal_ref_id', 'created_datetime', 'delivery_date', 'payment_method', 'num_of_items']
     list_select_related = ['customer']
     search_fields = ['id']
@@ -326,7 +380,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_per_page = 15
 
     def get_queryset(self, request):
-        return super().get_queryset(request).annotate(items_count=Count('items'))
+        return super().get_queryset(request).annotate(items_count=related_aggregate(OrderItem.objects.all(), 'order'))
     
     @admin.display(description='# items', ordering='items_count')
     def num_of_items(self, order):
@@ -388,7 +442,7 @@ class CommentDislikeAdmin(admin.ModelAdmin):
 
 
 @admin.register(IncreaseWalletCredit)
-class IncreaseWalletCreditAdmin(admin.ModelAdmin):
+class IncreaseWalletCreditAdmin(PerformanceModeAdmin):
     list_display = ['customer', 'amount', 'is_paid', 'zarinpal_authority', 'zarinpal_ref_id', 'created_datetime']
     autocomplete_fields = ['customer']
     list_select_related = ['customer']
@@ -0,0 +1,59 @@
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSetMixin
+from rest_framework import generics
+from asgiref.sync import sync_to_async, iscoroutinefunction, markcoroutinefunction
+
+
+class AsyncAPIViewMixin:
+    """
+        dispatch request asynchronously, so under ASGI a handler that is
+        a coroutine(e.g. waiting for payment gateway) doesn't hold a worker
+        thread, authentication, permissions and throttles and sync handlers
+        are run in a thread by sync_to_async
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncAPIViewMixin, APIView):
+    pass
+
+
+class AsyncGenericAPIView(AsyncAPIViewMixin, generics.GenericAPIView):
+    pass
+
+
+class AsyncViewSetMixin(AsyncAPIViewMixin):
+    """
+        view of ViewSetMixin.as_view is a plain function, it's marked as
+        coroutine function so django awaits the response of dispatch
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        return markcoroutinefunction(view)
@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.db.models import F, Max, Min
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from core.authentication import ClaimsRefreshToken
+from core.instrumentation import QueryRecorder
+from .fake_data import FakeDataPlan, generate_fake_data, truncate_store_tables
+from .models import Address, Cart, CartItem, Category, Comment, Customer, Order, OrderItem, Product
+
+
+def get_delivery_date():
+    """
+        first delivery date that OrderSerializer accepts
+    """
+    delivery_date = date.today() + timedelta(days=3)
+    return delivery_date + timedelta(days=1) if delivery_date.weekday() == 4 else delivery_date
+
+
+class Dataset:
+    """
+        rows of benchmark, they're generated by FakeDataPlan like setup_fake_data
+        --bulk, so store tables of database are replaced by the dataset and the
+        same sizes and seed make the same rows
+    """
+
+    def __init__(self, products, orders, comments, seed=0, workers=1):
+        self.plan = FakeDataPlan(products, orders=orders, comments=comments, seed=seed)
+        self.workers = workers
+
+    def as_dict(self):
+        return self.plan.as_dict()
+
+    def exists(self):
+        return (
+            Product.objects.count() == self.plan.products and Order.objects.count() == self.plan.orders
+            and Comment.objects.count() == self.plan.comments
+        )
+
+    def flush(self):
+        truncate_store_tables()
+
+    def load(self, log=print):
+        generate_fake_data(self.plan, workers=self.workers, log=log)
+
+    def locate(self):
+        """
+            find rows that scenarios use, in a loaded or reused dataset
+        """
+        self.product_ids = Product.objects.aggregate(first=Min('id'), last=Max('id'))
+        # first products are hot(see HOT_PRODUCTS of fake_data)
+        self.hot_product_id = self.product_ids['first']
+        # root of the largest tree, filter of products includes its descendants
+        self.category_id = Category.objects.filter(sub_category__isnull=True).order_by(F('lft') - F('rght')).values_list('id', flat=True).first()
+        customer = Customer.objects.select_related('user').filter(addresses__isnull=False).order_by('id').first()
+        self.user = customer.user
+        self.customer_id = customer.id
+        self.cart_id = Cart.objects.values_list('id', flat=True).get(customer_id=self.customer_id)
+        self.address_id = Address.objects.owned_by(Customer, self.customer_id).values_list('id', flat=True).first()
+        self.comment_id = Comment.objects.filter(
+            product_id=self.hot_product_id, reply_to__isnull=True, status=Comment.COMMENT_STATUS_APPROVED
+        ).values_list('id', flat=True).first()
+
+    def random_product_id(self, rand):
+        return rand.randint(self.product_ids['first'], self.product_ids['last'])
+
+
+class Scenario:
+    """
+        request of an endpoint, path and data are callables of (dataset, rand)
+        so every request can target another row, prepare is called before
+        each request and isn't measured
+    """
+
+    def __init__(self, name, path, method='get', data=None, customer=False, prepare=None, finish=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.customer = customer
+        self.prepare = prepare
+        self.finish = finish
+
+    def request(self, client, dataset, rand):
+        path = self.path(dataset, rand)
+        data = self.data(dataset, rand) if self.data else None
+        return getattr(client, self.method)(path, data, format='json')
+
+
+def add_random_cart_item(dataset, rand):
+    CartItem.objects.filter(cart_id=dataset.cart_id).delete()
+    CartItem.objects.create(cart_id=dataset.cart_id, product_id=dataset.random_product_id(rand), quantity=1)
+
+
+def delete_benchmark_orders(dataset, responses):
+    order_ids = [response.data['id'] for response in responses if response.status_code == 201]
+    OrderItem.objects.filter(order_id__in=order_ids).delete()
+    Order.objects.filter(id__in=order_ids).delete()
+
+
+SCENARIOS = [
+    Scenario('product-list', lambda dataset, rand: '/store/products/'),
+    Scenario('product-list-category', lambda dataset, rand: f'/store/products/?category={dataset.category_id}'),
+    Scenario('product-list-price', lambda dataset, rand: '/store/products/?price_min=100000&price_max=500000&has_inventory=true'),
+    Scenario('product-list-ordering-price', lambda dataset, rand: '/store/products/?ordering=price-desc'),
+    Scenario('product-list-ordering-sales', lambda dataset, rand: '/store/products/?ordering=sales_count-desc'),
+    Scenario('product-list-picker', lambda dataset, rand: '/store/products/?fields=id,title,price'),
+    Scenario('product-detail', lambda dataset, rand: f'/store/products/{dataset.random_product_id(rand)}/'),
+    Scenario(
+        'product-batch',
+        lambda dataset, rand: '/store/products/batch/?ids=' + ','.join(str(dataset.random_product_id(rand)) for _ in range(20))
+    ),
+    Scenario('category-list', lambda dataset, rand: '/store/categories/'),
+    Scenario('cart-me', lambda dataset, rand: '/store/carts/me/', customer=True),
+    Scenario(
+        'order-create', lambda dataset, rand: '/store/orders/', method='post', customer=True,
+        data=lambda dataset, rand: {'address': dataset.address_id, 'delivery_date': get_delivery_date().isoformat()},
+        prepare=add_random_cart_item, finish=delete_benchmark_orders
+    ),
+    Scenario('comment-list', lambda dataset, rand: f'/store/products/{dataset.hot_product_id}/comments/'),
+    Scenario(
+        'comment-like-toggle', lambda dataset, rand: f'/store/products/{dataset.hot_product_id}/comments/{dataset.comment_id}/like/',
+        method='post', customer=True
+    ),
+]
+
+
+def summarize(latencies, query_counts, statuses):
+    """
+        latency percentiles(ms), throughput of one client and query counts of a scenario
+    """
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies) * 1000, 3),
+            'p50': round(percentiles[49] * 1000, 3),
+            'p90': round(percentiles[89] * 1000, 3),
+            'p95': round(percentiles[94] * 1000, 3),
+            'p99': round(percentiles[98] * 1000, 3),
+            'max': round(max(latencies) * 1000, 3),
+        },
+        'requests_per_second': round(len(latencies) / sum(latencies), 2),
+        'queries': {
+            'mean': round(statistics.fmean(query_counts), 2),
+            'max': max(query_counts),
+        },
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def run_scenarios(dataset, scenarios, requests, warmup=5, seed=0):
+    """
+        run each scenario by test client in process(whole middleware stack
+        without network) and return summary of each scenario
+    """
+    dataset.locate()
+    # errors of endpoints are reported as status 500 instead of stopping benchmark
+    anon_client = APIClient(raise_request_exception=False)
+    customer_client = APIClient(raise_request_exception=False)
+    customer_client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(dataset.user).access_token}')
+
+    # cart of customer has a few items for cart-me, order-create replaces them
+    CartItem.objects.filter(cart_id=dataset.cart_id).delete()
+    rand = random.Random(seed)
+    CartItem.objects.bulk_create([
+        CartItem(cart_id=dataset.cart_id, product_id=product_id, quantity=1)
+        for product_id in {dataset.random_product_id(rand) for _ in range(3)}
+    ])
+
+    rest_framework = {
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {scope: '1000000/s' for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']},
+    }
+    results = {}
+
+    with override_settings(ALLOWED_HOSTS=['testserver'], REST_FRAMEWORK=rest_framework):
+        for scenario in scenarios:
+            rand = random.Random(seed)
+            client = customer_client if scenario.customer else anon_client
+            latencies, query_counts, statuses, responses = [], [], Counter(), []
+
+            for number in range(warmup + requests):
+                if scenario.prepare:
+                    scenario.prepare(dataset, rand)
+
+                with QueryRecorder() as recorder:
+                    start_time = time.perf_counter()
+                    response = scenario.request(client, dataset, rand)
+                    latency = time.perf_counter() - start_time
+
+                responses.append(response)
+                if number >= warmup:
+                    latencies.append(latency)
+                    query_counts.append(recorder.count)
+                    statuses[response.status_code] += 1
+
+            if scenario.finish:
+                scenario.finish(dataset, responses)
+            results[scenario.name] = summarize(latencies, query_counts, statuses)
+
+    return results
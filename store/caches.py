@@ -0,0 +1,199 @@
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.conf import settings
+
+from hashlib import md5
+from uuid import uuid4
+
+from core.caches import NAMESPACE_CARTS, NAMESPACE_CATEGORIES, NAMESPACE_PRODUCTS, get_tiered_cache
+from core.routers import PRIMARY_DATABASE
+from .models import Cart, CartItem, Category, Order, Product
+
+
+CART_SNAPSHOT_KEY = 'store:cart_snapshot:{customer_id}'
+CART_SNAPSHOT_VERSION_KEY = 'store:cart_snapshot_version:{customer_id}'
+CART_CUSTOMER_KEY = 'store:cart_customer:{cart_id}'
+PRODUCT_VERSION_KEY = 'store:product_version:{product_id}'
+PRODUCT_SELLER_KEY = 'store:product_seller:{product_id}'
+ADMIN_FACETS_KEY = 'store:admin_facets:{model}:{parameter}:{query_hash}'
+CATEGORY_TREES_KEY = 'store:category_trees'
+
+
+def get_cart_snapshot_versions(customer_id):
+    """
+        version of cart of customer and version of each product in the cart,
+        they must be read before building data so a change while building
+        the cart makes the snapshot stale, products that have no version yet
+        get one(overwriting a concurrent change only makes snapshots stale)
+    """
+    version = cache.get(CART_SNAPSHOT_VERSION_KEY.format(customer_id=customer_id), 0)
+    product_ids = CartItem.objects.filter(cart__customer_id=customer_id).values_list('product_id', flat=True)
+    product_versions = get_product_versions(product_ids)
+
+    missing_versions = {product_id: uuid4().hex for product_id, product_version in product_versions.items() if product_version is None}
+    if missing_versions:
+        cache.set_many({PRODUCT_VERSION_KEY.format(product_id=product_id): product_version for product_id, product_version in missing_versions.items()}, None)
+        product_versions.update(missing_versions)
+
+    return {'version': version, 'products': product_versions}
+
+
+def get_product_versions(product_ids):
+    product_version_keys = {product_id: PRODUCT_VERSION_KEY.format(product_id=product_id) for product_id in product_ids}
+    values = cache.get_many(product_version_keys.values())
+    return {product_id: values.get(product_version_key) for product_id, product_version_key in product_version_keys.items()}
+
+
+def get_cart_snapshot(customer_id):
+    """
+        return serialized cart of customer if there is a snapshot that built
+        on the current version of cart and its products, otherwise return None
+    """
+    snapshot_key = CART_SNAPSHOT_KEY.format(customer_id=customer_id)
+    version_key = CART_SNAPSHOT_VERSION_KEY.format(customer_id=customer_id)
+
+    values = cache.get_many([snapshot_key, version_key])
+    snapshot = values.get(snapshot_key)
+
+    if snapshot is None or snapshot['version'] != values.get(version_key, 0) or 'products' not in snapshot:
+        return None
+    if snapshot['products'] and get_product_versions(snapshot['products']) != snapshot['products']:
+        return None
+    return snapshot['data']
+
+
+def set_cart_snapshot(customer_id, versions, data):
+    """
+        store serialized cart of customer with versions that are read
+        by get_cart_snapshot_versions() before building data
+    """
+    cache.set(
+        CART_SNAPSHOT_KEY.format(customer_id=customer_id),
+        {**versions, 'data': data},
+        settings.CART_SNAPSHOT_TIMEOUT
+    )
+
+
+def invalidate_cart_snapshot(customer_id):
+    version_key = CART_SNAPSHOT_VERSION_KEY.format(customer_id=customer_id)
+
+    if not cache.add(version_key, 1, None):
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.set(version_key, 1, None)
+    cache.delete(CART_SNAPSHOT_KEY.format(customer_id=customer_id))
+
+
+def invalidate_cart_snapshots_of_products(product_ids):
+    """
+        invalidate snapshot of carts that contain one of products by
+        giving the products new versions, in one call of the cache
+    """
+    cache.set_many({PRODUCT_VERSION_KEY.format(product_id=product_id): uuid4().hex for product_id in product_ids}, None)
+
+
+def get_customer_id_of_cart(cart_id):
+    """
+        cart of customer never change, so the mapping of cart to
+        customer is cached in tiered cache without timeout
+    """
+    return get_tiered_cache().get_or_set(
+        NAMESPACE_CARTS,
+        CART_CUSTOMER_KEY.format(cart_id=cart_id),
+        lambda: Cart.objects.filter(id=cart_id).values_list('customer_id', flat=True).first(),
+        None
+    )
+
+
+def build_category_trees():
+    """
+        dict of id of each category to its subtree(same as CategorySerializer),
+        built from one query in tree order, read from primary so lag of
+        replicas isn't kept in the cache
+    """
+    nodes = {}
+    categories = Category.objects.using(PRIMARY_DATABASE).order_by('tree_id', 'lft').values_list('id', 'title', 'sub_category_id')
+
+    for category_id, title, sub_category_id in categories:
+        node = nodes[category_id] = {'id': category_id, 'title': title, 'sub_categories': []}
+        if sub_category_id is not None:
+            nodes[sub_category_id]['sub_categories'].append(node)
+    return nodes
+
+
+def get_category_trees():
+    """
+        subtrees of categories in tiered cache until a category is changed,
+        they're shared between requests so they must not be modified
+    """
+    return get_tiered_cache().get_or_set(NAMESPACE_CATEGORIES, CATEGORY_TREES_KEY, build_category_trees, None)
+
+
+def get_request_cache(request, name):
+    """
+        dict that lives as long as the django request, DRF request
+        and django request of a view share it
+    """
+    django_request = getattr(request, '_request', request)
+    request_caches = django_request.__dict__.setdefault('_object_caches', {})
+    return request_caches.setdefault(name, {})
+
+
+def get_seller_id_of_product(product_id, request=None):
+    """
+        return seller id of product or None if product doesn't exist,
+        memoized on request and cached in tiered cache for
+        PRODUCT_SELLER_CACHE_TIMEOUT seconds(0 disables the cache)
+    """
+    request_cache = get_request_cache(request, 'product_seller') if request is not None else {}
+    if product_id in request_cache:
+        return request_cache[product_id]
+
+    timeout = settings.PRODUCT_SELLER_CACHE_TIMEOUT
+
+    def get_seller_id():
+        return Product.objects.filter(id=product_id).values_list('seller_id', flat=True).first()
+
+    if timeout:
+        seller_id = get_tiered_cache().get_or_set(
+            NAMESPACE_PRODUCTS, PRODUCT_SELLER_KEY.format(product_id=product_id), get_seller_id, timeout
+        )
+    else:
+        seller_id = get_seller_id()
+
+    request_cache[product_id] = seller_id
+    return seller_id
+
+
+def invalidate_seller_id_of_product(product_id):
+    get_tiered_cache().delete(NAMESPACE_PRODUCTS, PRODUCT_SELLER_KEY.format(product_id=product_id))
+
+
+def get_customer_id_of_order(order_id, request=None):
+    """
+        return customer id of order or None if order doesn't exist,
+        memoized on request only
+    """
+    request_cache = get_request_cache(request, 'order_customer') if request is not None else {}
+    if order_id not in request_cache:
+        request_cache[order_id] = Order.objects.filter(id=order_id).values_list('customer_id', flat=True).first()
+    return request_cache[order_id]
+
+
+def get_admin_facet_counts(queryset, parameter, counts):
+    """
+        aggregate facet counts of an admin list filter on queryset, result is
+        cached for ADMIN_FACETS_CACHE_TIMEOUT seconds per filtered query
+    """
+    timeout = settings.ADMIN_FACETS_CACHE_TIMEOUT
+    try:
+        query_hash = md5(str(queryset.query).encode()).hexdigest()
+    except EmptyResultSet:
+        timeout = 0
+
+    if not timeout:
+        return queryset.aggregate(**counts)
+
+    facets_key = ADMIN_FACETS_KEY.format(model=queryset.model._meta.label_lower, parameter=parameter, query_hash=query_hash)
+    return cache.get_or_set(facets_key, lambda: queryset.aggregate(**counts), timeout)
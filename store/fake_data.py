@@ -0,0 +1,379 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+
+import django
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from faker import Faker
+
+from core.caches import get_tiered_cache
+from .models import Address, Cart, CartItem, Category, Comment, Customer, Menu, Order, OrderItem, Person, Product, Seller
+
+User = get_user_model()
+
+# number of products(and comments and orders by default) of each scale
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+# rows that a task of a worker generates and inserts
+CHUNK_SIZE = 10_000
+
+# half of comments belong to these first products, like popular products of a shop
+HOT_PRODUCTS = 100
+
+# number of addresses of a person is 1 + index % MAX_ADDRESSES_PER_PERSON, so ids
+# of addresses of a person are known without reading them back
+MAX_ADDRESSES_PER_PERSON = 3
+
+GENDERS = [Person.PERSON_GENDER_MALE, Person.PERSON_GENDER_FEMALE]
+COMMENT_STATUSES = [Comment.COMMENT_STATUS_WAITING, Comment.COMMENT_STATUS_APPROVED, Comment.COMMENT_STATUS_NOT_APPROVED]
+COMMENT_RATINGS = [rating for rating, _ in Comment.COMMENT_RATING]
+ORDER_STATUSES = [Order.ORDER_STATUS_PAID, Order.ORDER_STATUS_UNPAID]
+
+
+class FakeDataPlan:
+    """
+        sizes, first ids and text pools of bulk fake data, it's passed to
+        workers so every chunk is generated the same for the same seed,
+        whatever the number of workers is
+    """
+
+    def __init__(self, products, orders=None, comments=None, seed=0, batch_size=5000):
+        self.products = products
+        self.customers = max(products // 10, 40)
+        self.sellers = max(products // 100, 10)
+        self.categories = min(max(products // 1000, 15), 1000)
+        self.orders = products if orders is None else orders
+        self.comments = products if comments is None else comments
+        self.seed = seed
+        self.batch_size = batch_size
+
+    def as_dict(self):
+        return {
+            'customers': self.customers,
+            'sellers': self.sellers,
+            'categories': self.categories,
+            'products': self.products,
+            'comments': self.comments,
+            'orders': self.orders,
+            'seed': self.seed,
+        }
+
+    def prepare(self):
+        """
+            read first ids and content types and build text pools by Faker,
+            call it after truncating tables
+        """
+        fake = Faker()
+        fake.seed_instance(self.seed)
+
+        self.first_names = [fake.first_name() for _ in range(500)]
+        self.last_names = [fake.last_name() for _ in range(500)]
+        self.sentences = [fake.sentence(nb_words=5, variable_nb_words=True) for _ in range(1000)]
+        self.paragraphs = [fake.paragraph(nb_sentences=5, variable_nb_sentences=True) for _ in range(200)]
+        self.cities = [fake.city() for _ in range(200)]
+        self.words = [fake.word() for _ in range(200)]
+
+        # users aren't truncated, new users come after the latest phone like CustomUserFactory
+        latest_phone = User.objects.filter(phone__startswith='09').order_by('-phone').values_list('phone', flat=True).first()
+        self.first_phone = int(latest_phone[2:]) + 1 if latest_phone else 1
+        self.first_user_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        self.password = make_password(None)
+
+        self.customer_content_type_id = ContentType.objects.get_for_model(Customer).id
+        self.seller_content_type_id = ContentType.objects.get_for_model(Seller).id
+
+    def person_name(self, index):
+        return self.first_names[index % len(self.first_names)], self.last_names[index // len(self.first_names) % len(self.last_names)]
+
+    def address_ids(self, person_index):
+        first_address_id = person_index * MAX_ADDRESSES_PER_PERSON + 1
+        return range(first_address_id, first_address_id + 1 + person_index % MAX_ADDRESSES_PER_PERSON)
+
+    def product_price(self, product_id):
+        rand = random.Random(self.seed * 1_000_000_007 + product_id)
+        return rand.randint(10000, 99999900) * 10 if rand.random() >= 0.7 else rand.randint(10000, 49999900) * 10
+
+
+def random_datetime(rand):
+    return datetime(year=rand.randrange(2019, 2023), month=rand.randint(1, 12), day=rand.randint(1, 28), tzinfo=timezone.utc)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+        let bulk_create keep created/modified datetimes of instances
+        instead of setting them to now(auto_now, auto_now_add)
+    """
+    fields = [field for model in models for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkWriter:
+    """
+        buffer instances per model and insert them by bulk_create, buffers are
+        flushed in order of models, so parents are inserted before their rows
+    """
+
+    def __init__(self, models, batch_size):
+        self.buffers = {model: [] for model in models}
+        self.batch_size = batch_size
+
+    def add(self, instance):
+        buffer = self.buffers[type(instance)]
+        buffer.append(instance)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            for model, buffer in self.buffers.items():
+                if buffer:
+                    model.objects.bulk_create(buffer)
+                    buffer.clear()
+
+
+def generate_people(plan, rand, start, stop):
+    """
+        user, customer, cart and addresses of each person, the last
+        plan.sellers people are sellers too(like setup_fake_data)
+    """
+    first_seller_index = plan.customers - plan.sellers
+
+    for index in range(start, stop):
+        first_name, last_name = plan.person_name(index)
+        birth_date = (random_datetime(rand) - timedelta(days=365 * rand.randint(10, 40))).date() if rand.random() > 0.3 else None
+        gender = rand.choice(GENDERS)
+
+        yield User(id=plan.first_user_id + index, phone=f'09{plan.first_phone + index:09d}', password=plan.password)
+        yield Customer(
+            id=index + 1, user_id=plan.first_user_id + index, first_name=first_name, last_name=last_name,
+            birth_date=birth_date, gender=gender, wallet_amount=rand.randint(100, 99999900) * 10
+        )
+
+        created_datetime = random_datetime(rand)
+        yield Cart(id=index + 1, customer_id=index + 1, created_datetime=created_datetime, modified_datetime=created_datetime + timedelta(hours=rand.randint(1, 500)))
+
+        content_types = [(plan.customer_content_type_id, index, index + 1)]
+        if index >= first_seller_index:
+            seller_index = index - first_seller_index
+            yield Seller(
+                id=seller_index + 1, user_id=plan.first_user_id + index, first_name=first_name, last_name=last_name,
+                birth_date=birth_date, gender=gender, company_name=rand.choice(plan.sentences)[:-1][:100],
+                national_code=f'1{seller_index:09d}', status=Seller.SELLER_STATUS_ACCEPTED
+            )
+            content_types.append((plan.seller_content_type_id, plan.customers + seller_index, seller_index + 1))
+
+        for content_type_id, person_index, object_id in content_types:
+            for address_id in plan.address_ids(person_index):
+                yield Address(
+                    id=address_id, content_type_id=content_type_id, object_id=object_id,
+                    province=rand.choice(plan.words), city=rand.choice(plan.cities),
+                    plaque=rand.randint(1, 32767), postal_code=rand.randint(1000000000, 9999999999)
+                )
+
+
+def generate_products(plan, rand, start, stop):
+    for index in range(start, stop):
+        title = ' '.join(word.capitalize() for word in rand.sample(plan.words, 4))
+        created_datetime = random_datetime(rand)
+        yield Product(
+            id=index + 1, title=title, slug='-'.join(title.split(' ')).lower(), description=rand.choice(plan.paragraphs),
+            seller_id=rand.randint(1, plan.sellers), category_id=rand.randint(1, plan.categories),
+            price=plan.product_price(index + 1), inventory=rand.randint(1, 100),
+            created_datetime=created_datetime, modified_datetime=created_datetime + timedelta(hours=rand.randint(1, 500))
+        )
+
+
+def generate_comments(plan, rand, start, stop):
+    """
+        comments of a chunk with their replies, a reply gets path of its
+        parent in the same pass, so threads need no rebuild
+    """
+    chunk_comments = []
+
+    for index in range(start, stop):
+        customer_index = rand.randrange(plan.customers)
+        created_datetime = random_datetime(rand)
+        comment = Comment(
+            id=index + 1, content_type_id=plan.customer_content_type_id, object_id=customer_index + 1,
+            author_name=' '.join(plan.person_name(customer_index)), title=rand.choice(plan.sentences),
+            body=rand.choice(plan.paragraphs), status=rand.choice(COMMENT_STATUSES),
+            created_datetime=created_datetime, modified_datetime=created_datetime + timedelta(hours=rand.randint(1, 500))
+        )
+
+        parent = rand.choice(chunk_comments) if chunk_comments and rand.random() <= 0.2 else None
+        if parent is not None and len(parent.descendants_path) <= Comment.PATH_MAX_LENGTH:
+            comment.product_id = parent.product_id
+            comment.reply_to_id = parent.id
+            comment.path = parent.descendants_path
+        else:
+            hot_products = HOT_PRODUCTS if rand.random() < 0.5 else plan.products
+            comment.product_id = rand.randint(1, min(hot_products, plan.products))
+            comment.rating = rand.choice(COMMENT_RATINGS)
+
+        chunk_comments.append(comment)
+        yield comment
+
+
+def generate_cart_items(plan, rand, start, stop):
+    for index in range(start, stop):
+        if rand.random() <= 0.4:
+            for product_id in rand.sample(range(1, plan.products + 1), min(rand.randint(1, 3), plan.products)):
+                yield CartItem(cart_id=index + 1, product_id=product_id, quantity=1)
+
+
+def generate_orders(plan, rand, start, stop):
+    for index in range(start, stop):
+        customer_index = rand.randrange(plan.customers)
+        created_datetime = random_datetime(rand)
+        order = Order(
+            id=index + 1, customer_id=customer_index + 1, address_id=rand.choice(plan.address_ids(customer_index)),
+            status=rand.choice(ORDER_STATUSES), created_datetime=created_datetime,
+            delivery_date=created_datetime.date() + timedelta(days=rand.choice([3, 4, 5]))
+        )
+        if order.status == Order.ORDER_STATUS_PAID:
+            order.payment_method = Order.ORDER_PAYMENT_METHOD_WALLET
+        yield order
+
+        for product_id in rand.sample(range(1, plan.products + 1), min(rand.randint(1, 10), plan.products)):
+            yield OrderItem(
+                order_id=order.id, product_id=product_id, quantity=rand.randint(1, 20),
+                price=plan.product_price(product_id) if order.status == Order.ORDER_STATUS_PAID else None
+            )
+
+
+GENERATORS = {
+    'people': (generate_people, [User, Customer, Cart, Seller, Address]),
+    'products': (generate_products, [Product]),
+    'comments': (generate_comments, [Comment]),
+    'cart_items': (generate_cart_items, [CartItem]),
+    'orders': (generate_orders, [Order, OrderItem]),
+}
+
+
+def insert_chunk(plan, kind, start, stop):
+    """
+        generate and insert rows of kind with indexes in [start, stop),
+        random generator is seeded by seed, kind and start of chunk
+    """
+    generate, models = GENERATORS[kind]
+    rand = random.Random(f'{plan.seed}:{kind}:{start}')
+    writer = BulkWriter(models, plan.batch_size)
+
+    with explicit_timestamps(*models):
+        for instance in generate(plan, rand, start, stop):
+            writer.add(instance)
+        writer.flush()
+    return stop - start
+
+
+def insert_categories(plan):
+    """
+        build category tree in memory and insert it with its mptt fields(lft,
+        rght, tree_id and level) by one bulk_create, instead of rebuild()
+    """
+    rand = random.Random(f'{plan.seed}:categories')
+    titles = [rand.choice(plan.sentences)[:-1] for _ in range(plan.categories)]
+    parents = [rand.randrange(index) if index and rand.random() <= 0.7 else None for index in range(plan.categories)]
+
+    children = {index: [] for index in range(plan.categories)}
+    roots = []
+    for index, parent in enumerate(parents):
+        (roots if parent is None else children[parent]).append(index)
+
+    # siblings are ordered by title like order_insertion_by of Category
+    categories = []
+    for tree_id, root in enumerate(sorted(roots, key=titles.__getitem__), start=1):
+        counter = 1
+        stack = [(root, 0, False)]
+        lefts = {}
+        while stack:
+            index, level, visited = stack.pop()
+            if visited:
+                categories.append(Category(
+                    id=index + 1, title=titles[index], sub_category_id=parents[index] + 1 if parents[index] is not None else None,
+                    lft=lefts[index], rght=counter, tree_id=tree_id, level=level
+                ))
+                counter += 1
+                continue
+            lefts[index] = counter
+            counter += 1
+            stack.append((index, level, True))
+            stack += [(child, level + 1, False) for child in sorted(children[index], key=titles.__getitem__, reverse=True)]
+
+    Category.objects.bulk_create(categories, batch_size=plan.batch_size)
+
+
+def truncate_store_tables():
+    """
+        empty tables of store(except menus) by TRUNCATE(DELETE on sqlite) and
+        reset their sequences, instead of deleting rows by the ORM
+    """
+    tables = [
+        model._meta.db_table for model in apps.get_app_config('store').get_models(include_auto_created=True)
+        if model is not Menu
+    ]
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+    # cached carts, roles of tokens and owners of products point to removed rows
+    cache.clear()
+    get_tiered_cache().clear_local()
+
+
+def run_chunks(plan, tasks, workers):
+    """
+        run tasks(kind, start, stop) in a process pool of workers, or in
+        this process when workers is 1
+    """
+    if workers <= 1:
+        return sum(insert_chunk(plan, *task) for task in tasks)
+
+    # forked workers must open their own database connections
+    connections.close_all()
+    kinds, starts, stops = zip(*tasks)
+    with ProcessPoolExecutor(workers, initializer=django.setup) as executor:
+        return sum(executor.map(insert_chunk, [plan] * len(tasks), kinds, starts, stops))
+
+
+def chunks(kind, count):
+    return [(kind, start, min(start + CHUNK_SIZE, count)) for start in range(0, count, CHUNK_SIZE)]
+
+
+def generate_fake_data(plan, workers=1, log=print):
+    truncate_store_tables()
+    plan.prepare()
+
+    log(f"Adding {plan.customers} customers and {plan.sellers} sellers...")
+    run_chunks(plan, chunks('people', plan.customers), workers)
+
+    log(f"Adding {plan.categories} categories...")
+    insert_categories(plan)
+
+    log(f"Adding {plan.products} products...")
+    run_chunks(plan, chunks('products', plan.products), workers)
+
+    log(f"Adding {plan.comments} comments, cart items and {plan.orders} orders...")
+    run_chunks(plan, chunks('comments', plan.comments) + chunks('cart_items', plan.customers) + chunks('orders', plan.orders), workers)
+
+    # rows are inserted with explicit ids, sequences of postgresql must be moved after them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User, Customer, Seller, Address, Cart, Category, Product, Comment, Order]):
+            cursor.execute(sql)
@@ -0,0 +1,239 @@
+from django.utils import timezone
+
+from datetime import date
+from operator import itemgetter
+
+from .caches import get_category_trees
+from .models import Customer, Order, Person, ProductImage
+
+# format of created_datetime of serializers
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class Field:
+    """
+        output field of FastSerializer, columns are names of values_list()
+        and bind returns function of a row to value of the field
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def bind(self, serializer, indexes, rows):
+        raise NotImplementedError
+
+
+class Column(Field):
+    """
+        value of a column as it is
+    """
+
+    def bind(self, serializer, indexes, rows):
+        return itemgetter(indexes[0])
+
+
+class ChoiceLabel(Field):
+    """
+        label of choice in active language, same as get_FOO_display()
+    """
+
+    def __init__(self, column, choices):
+        super().__init__(column)
+        self.choices = choices
+
+    def bind(self, serializer, indexes, rows):
+        index = indexes[0]
+        labels = {value: str(label) for value, label in self.choices}
+        return lambda row: labels.get(row[index], row[index])
+
+
+class DateTimeFormat(Field):
+    """
+        datetime in current timezone, same as DateTimeField(format=...)
+    """
+
+    def __init__(self, column, format):
+        super().__init__(column)
+        self.format = format
+
+    def bind(self, serializer, indexes, rows):
+        index, output_format = indexes[0], self.format
+        current_timezone = timezone.get_current_timezone()
+        return lambda row: row[index].astimezone(current_timezone).strftime(output_format) if row[index] else None
+
+
+class FileURL(Field):
+    """
+        absolute url of file, same as ImageField of serializers
+    """
+
+    def __init__(self, column, storage):
+        super().__init__(column)
+        self.storage = storage
+
+    def bind(self, serializer, indexes, rows):
+        index = indexes[0]
+        build_absolute_uri = serializer.context['request'].build_absolute_uri
+        return lambda row: build_absolute_uri(self.storage.url(row[index])) if row[index] else None
+
+
+class Age(Field):
+    """
+        age in years of birth date
+    """
+
+    def bind(self, serializer, indexes, rows):
+        index, today = indexes[0], date.today()
+        return lambda row: (today - row[index]).days // 365 if row[index] else None
+
+
+class Nested(Field):
+    """
+        dict of fields of a relation(e.g. customer of wallet credit)
+    """
+
+    def __init__(self, **fields):
+        super().__init__(*dict.fromkeys(column for field in fields.values() for column in field.columns))
+        self.fields = fields
+
+    def bind(self, serializer, indexes, rows):
+        column_indexes = dict(zip(self.columns, indexes))
+        getters = [
+            (name, field.bind(serializer, [column_indexes[column] for column in field.columns], rows))
+            for name, field in self.fields.items()
+        ]
+        return lambda row: {name: getter(row) for name, getter in getters}
+
+
+class FastSerializer:
+    """
+        read only serializer of list endpoints on values_list() rows instead of
+        model instances, each field is bound once per page and rows are built
+        in one loop, output must be identical to the model serializer of view,
+        fields can be narrowed by `sparse_fields` of context
+    """
+    fields = {}
+
+    def __init__(self, context):
+        self.context = context
+        sparse_fields = context.get('sparse_fields')
+        self.field_names = [name for name in self.fields if sparse_fields is None or name in sparse_fields]
+        self.columns = list(dict.fromkeys(column for name in self.field_names for column in self.fields[name].columns))
+
+    def get_rows(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values_list(*self.columns)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        column_indexes = {column: index for index, column in enumerate(self.columns)}
+        getters = [
+            (name, self.fields[name].bind(self, [column_indexes[column] for column in self.fields[name].columns], rows))
+            for name in self.field_names
+        ]
+        return [{name: getter(row) for name, getter in getters} for row in rows]
+
+
+class ProductCategory(Field):
+    """
+        category with its subtree, from cached category trees
+    """
+
+    def bind(self, serializer, indexes, rows):
+        index, trees = indexes[0], get_category_trees()
+        return lambda row: trees.get(row[index])
+
+
+class ProductThumbnail(Field):
+    """
+        first image of each product of page, by one query
+    """
+
+    def bind(self, serializer, indexes, rows):
+        index = indexes[0]
+        build_absolute_uri = serializer.context['request'].build_absolute_uri
+        storage = ProductImage._meta.get_field('image').storage
+        thumbnails = {}
+
+        images = ProductImage.objects.filter(product_id__in={row[index] for row in rows}).values_list('product_id', 'id', 'image', 'name')
+        for product_id, image_id, image, name in images:
+            if product_id not in thumbnails:
+                thumbnails[product_id] = {'id': image_id, 'image': build_absolute_uri(storage.url(image)), 'name': name}
+        return lambda row: thumbnails.get(row[index])
+
+
+class ProductStatus(Field):
+    """
+        availability of product by its inventory
+    """
+
+    def bind(self, serializer, indexes, rows):
+        index = indexes[0]
+        return lambda row: 'Available' if row[index] > 0 else 'Unavailable'
+
+
+class ProductFastSerializer(FastSerializer):
+    """
+        fast path of ProductSerializer
+    """
+    fields = {
+        'id': Column('id'),
+        'title': Column('title'),
+        'slug': Column('slug'),
+        'category': ProductCategory('category_id'),
+        'thumbnail': ProductThumbnail('id'),
+        'seller': Column('seller__company_name'),
+        'price': Column('price'),
+        'viewer': Column('viewer'),
+        'status': ProductStatus('inventory'),
+    }
+
+
+class ProductCardFastSerializer(FastSerializer):
+    """
+        fast path of ProductCardSerializer
+    """
+    fields = {name: ProductFastSerializer.fields[name] for name in ['id', 'title', 'slug', 'thumbnail', 'seller', 'price', 'status']}
+
+
+class CustomerFastSerializer(FastSerializer):
+    """
+        fast path of CustomerSerializer
+    """
+    fields = {
+        'id': Column('id'),
+        'user': Column('user__phone'),
+        'first_name': Column('first_name'),
+        'last_name': Column('last_name'),
+        'profile_image': FileURL('profile_image', Customer._meta.get_field('profile_image').storage),
+        'gender': ChoiceLabel('gender', Person.PERSON_GENDER),
+        'age': Age('birth_date'),
+    }
+
+
+class OrderMeFastSerializer(FastSerializer):
+    """
+        fast path of OrderMeSerializer
+    """
+    fields = {
+        'id': Column('id'),
+        'status': ChoiceLabel('status', Order.ORDER_STATUS),
+        'created_datetime': DateTimeFormat('created_datetime', DATETIME_FORMAT),
+    }
+
+
+class IncreaseWalletCreditFastSerializer(FastSerializer):
+    """
+        fast path of IncreaseWalletCreditSerializer
+    """
+    fields = {
+        'id': Column('id'),
+        'customer': Nested(
+            id=Column('customer_id'),
+            user=Column('customer__user__phone'),
+            first_name=Column('customer__first_name'),
+            last_name=Column('customer__last_name'),
+        ),
+        'amount': Column('amount'),
+        'is_paid': Column('is_paid'),
+        'created_datetime': DateTimeFormat('created_datetime', DATETIME_FORMAT),
+    }
@@ -4,7 +4,7 @@ from django.shortcuts import get_object_or_404
 
 from datetime import date, timedelta
 
-from .models import Category, Customer, Order, Product, Seller, IncreaseWalletCredit
+from .models import Category, Comment, Customer, Order, Product, Seller, IncreaseWalletCredit
 
 
 class CustomerFilter(django_filters.FilterSet):
@@ -162,3 +162,21 @@ class IncreaseWalletCreditFilter(django_filters.FilterSet):
     class Meta:
         model = IncreaseWalletCredit
         fields = []
+
+
+class CommentWaitingFilter(django_filters.FilterSet):
+    USER_TYPE_CUSTOMER = 'customer'
+    USER_TYPE_SELLER = 'seller'
+
+    USER_TYPE = [
+        (USER_TYPE_CUSTOMER, _('Customer')),
+        (USER_TYPE_SELLER, _('Seller'))
+    ]
+
+    product = django_filters.NumberFilter(field_name='product', lookup_expr='exact', label='product')
+    user_type = django_filters.ChoiceFilter(field_name='content_type__model', choices=USER_TYPE, label='user_type')
+    created_datetime = django_filters.DateTimeFromToRangeFilter(field_name='created_datetime', label='created_datetime')
+
+    class Meta:
+        model = Comment
+        fields = []
@@ -0,0 +1,185 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.translation import gettext as _
+from rest_framework.response import Response
+from rest_framework import status as status_code
+
+import hashlib
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async, iscoroutinefunction
+from functools import wraps
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_RESPONSE_KEY = 'store:idempotency:response:{scope}'
+IDEMPOTENCY_LOCK_KEY = 'store:idempotency:lock:{scope}'
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+
+_in_flight_events = {}
+_in_flight_events_lock = threading.Lock()
+
+
+def get_request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_idempotency_scope(request, idempotency_key):
+    scope = f'{request.user.pk}:{request.method}:{request.path}:{idempotency_key}'
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def dump_response(response, fingerprint):
+    if isinstance(response, Response):
+        return {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'data': response.data,
+            'headers': dict(response.items())
+        }
+    return {
+        'fingerprint': fingerprint,
+        'status': response.status_code,
+        'content': response.content,
+        'headers': dict(response.items())
+    }
+
+
+def load_response(stored_response):
+    headers = {**stored_response['headers'], IDEMPOTENCY_REPLAYED_HEADER: 'true'}
+
+    if 'data' in stored_response:
+        return Response(stored_response['data'], status=stored_response['status'], headers=headers)
+    return HttpResponse(stored_response['content'], status=stored_response['status'], headers=headers)
+
+
+def register_in_flight_event(scope):
+    with _in_flight_events_lock:
+        _in_flight_events[scope] = threading.Event()
+
+
+def release_in_flight_event(scope):
+    with _in_flight_events_lock:
+        event = _in_flight_events.pop(scope, None)
+    if event is not None:
+        event.set()
+
+
+def wait_for_stored_response(scope):
+    """
+        wait until request that is in flight with the same scope stores its
+        response, waiters in the same process are woken up by an event and
+        waiters in other processes notice the response by polling the cache
+    """
+    response_key = IDEMPOTENCY_RESPONSE_KEY.format(scope=scope)
+    lock_key = IDEMPOTENCY_LOCK_KEY.format(scope=scope)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+    while time.monotonic() < deadline:
+        stored_response = cache.get(response_key)
+        if stored_response is not None:
+            return stored_response
+        if cache.get(lock_key) is None:
+            return cache.get(response_key)
+
+        event = _in_flight_events.get(scope)
+        if event is not None:
+            event.wait(IDEMPOTENCY_POLL_INTERVAL)
+        else:
+            time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+    return None
+
+
+def acquire_idempotency_key(request, idempotency_key):
+    """
+        return (scope, fingerprint, response), when response isn't None it
+        must be returned without executing the handler, otherwise the lock
+        of scope is acquired and must be released by release_idempotency_key
+    """
+    if len(idempotency_key) > 255:
+        return None, None, Response({'detail': _('Idempotency-Key must be at most 255 characters.')}, status=status_code.HTTP_400_BAD_REQUEST)
+
+    scope = get_idempotency_scope(request, idempotency_key)
+    fingerprint = get_request_fingerprint(request)
+    response_key = IDEMPOTENCY_RESPONSE_KEY.format(scope=scope)
+    lock_key = IDEMPOTENCY_LOCK_KEY.format(scope=scope)
+
+    while True:
+        stored_response = cache.get(response_key)
+
+        if stored_response is None and not cache.add(lock_key, fingerprint, settings.IDEMPOTENCY_WAIT_TIMEOUT):
+            stored_response = wait_for_stored_response(scope)
+            if stored_response is None:
+                if cache.get(lock_key) is not None:
+                    return scope, fingerprint, Response({'detail': _('A request with this Idempotency-Key is already in progress.')}, status=status_code.HTTP_409_CONFLICT)
+                continue
+
+        if stored_response is not None:
+            if stored_response['fingerprint'] != fingerprint:
+                return scope, fingerprint, Response({'detail': _('This Idempotency-Key has already been used with another request.')}, status=status_code.HTTP_422_UNPROCESSABLE_ENTITY)
+            return scope, fingerprint, load_response(stored_response)
+        break
+
+    register_in_flight_event(scope)
+    return scope, fingerprint, None
+
+
+def release_idempotency_key(scope, fingerprint, response):
+    try:
+        if response is not None and response.status_code < 500:
+            cache.set(IDEMPOTENCY_RESPONSE_KEY.format(scope=scope), dump_response(response, fingerprint), settings.IDEMPOTENCY_KEY_TIMEOUT)
+    finally:
+        cache.delete(IDEMPOTENCY_LOCK_KEY.format(scope=scope))
+        release_in_flight_event(scope)
+
+
+def idempotent(handler):
+    """
+        make a view handler idempotent per user by Idempotency-Key header,
+        a retry with the same key replays the stored response instead of
+        executing the handler again and a concurrent duplicate waits on
+        the in-flight request, responses of server errors aren't stored,
+        coroutine handlers of async views are supported too
+    """
+    if iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(self, request, *args, **kwargs):
+            idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+
+            if not idempotency_key:
+                return await handler(self, request, *args, **kwargs)
+
+            scope, fingerprint, response = await sync_to_async(acquire_idempotency_key, thread_sensitive=False)(request, idempotency_key)
+            if response is not None:
+                return response
+
+            try:
+                response = await handler(self, request, *args, **kwargs)
+                return response
+            finally:
+                await sync_to_async(release_idempotency_key, thread_sensitive=False)(scope, fingerprint, response)
+
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+
+        if not idempotency_key:
+            return handler(self, request, *args, **kwargs)
+
+        scope, fingerprint, response = acquire_idempotency_key(request, idempotency_key)
+        if response is not None:
+            return response
+
+        try:
+            response = handler(self, request, *args, **kwargs)
+            return response
+        finally:
+            release_idempotency_key(scope, fingerprint, response)
+
+    return wrapper
@@ -0,0 +1,81 @@
+from django.core.management import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+import json
+import random
+import time
+
+from store.models import Category, Comment, Product, Seller
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Measure write throughput of comment threads(reply inserts and deletes) and reading a thread"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replies', type=int, default=2000, help="Number of replies inserted into one thread")
+        parser.add_argument('--deletes', type=int, default=200, help="Number of replies deleted from the thread")
+        parser.add_argument('--phone', default='09000000001', help="Phone of temporary user that writes the comments")
+
+    def measure(self, function, items):
+        """
+            return elapsed seconds and number of queries of calling function for each item
+        """
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start_time = time.perf_counter()
+            for item in items:
+                function(item)
+            elapsed = time.perf_counter() - start_time
+        return elapsed, len(queries)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        user = User.objects.create_user(phone=options['phone'])
+        seller = Seller.objects.create(user=user, company_name='Benchmark', status=Seller.SELLER_STATUS_ACCEPTED)
+        category = Category.objects.create(title='Benchmark')
+        product = Product.objects.create(title='Benchmark', slug='benchmark', seller=seller, category=category, description='-', price=10000, inventory=1)
+
+        try:
+            root = Comment.objects.create(content_object=seller, product=product, title='root', body='-', rating=Comment.COMMENT_RATING_GOOD)
+            comment_ids = [root.id]
+
+            def insert(number):
+                # parent is loaded from database like a reply request does
+                comment_ids.append(Comment.objects.create(
+                    content_object=seller, product=product, title=f'reply {number}', body='-', reply_to_id=random.choice(comment_ids)
+                ).id)
+
+            insert_elapsed, insert_queries = self.measure(insert, range(options['replies']))
+
+            root.refresh_from_db()
+            read_start_time = time.perf_counter()
+            thread_size = len(root.get_descendants(include_self=False))
+            read_elapsed = time.perf_counter() - read_start_time
+
+            # leaves are deleted, so every delete removes exactly one comment
+            leaves = list(Comment.objects.filter(product=product, replies__isnull=True).exclude(id=root.id)[:options['deletes']])
+            delete_elapsed, delete_queries = self.measure(lambda comment: comment.delete(), leaves)
+        finally:
+            product.delete()
+            category.delete()
+            seller.delete()
+            user.delete()
+
+        report = {
+            'replies': options['replies'],
+            'thread_size': thread_size,
+            'inserts_per_second': round(options['replies'] / insert_elapsed, 2),
+            'queries_per_insert': round(insert_queries / options['replies'], 2),
+            'deletes_per_second': round(len(leaves) / delete_elapsed, 2) if leaves else None,
+            'queries_per_delete': round(delete_queries / len(leaves), 2) if leaves else None,
+            'read_thread_ms': round(read_elapsed * 1000, 2),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
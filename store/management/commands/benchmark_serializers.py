@@ -0,0 +1,98 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+import json
+import time
+
+from store import serializers
+from store.fast_serializers import CustomerFastSerializer, IncreaseWalletCreditFastSerializer, OrderMeFastSerializer, ProductFastSerializer
+from store.models import Customer, IncreaseWalletCredit, Order, Product
+
+# name: (queryset of list view, serializer of list view, fast serializer)
+CASES = {
+    'product': (
+        lambda: Product.objects.select_related('seller', 'category').prefetch_related(
+            Prefetch('images', to_attr='product_images')
+        ).order_by('-created_datetime'),
+        serializers.ProductSerializer, ProductFastSerializer
+    ),
+    'order-me': (lambda: Order.objects.order_by('-created_datetime'), serializers.OrderMeSerializer, OrderMeFastSerializer),
+    'customer': (lambda: Customer.objects.select_related('user').order_by('-id'), serializers.CustomerSerializer, CustomerFastSerializer),
+    'wallet-credit': (
+        lambda: IncreaseWalletCredit.objects.select_related('customer__user').order_by('-created_datetime'),
+        serializers.IncreaseWalletCreditSerializer, IncreaseWalletCreditFastSerializer
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of model serializers and fast serializers(values_list) of list endpoints on existing rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Number of rows serialized in each run")
+        parser.add_argument('--repeat', type=int, default=5, help="Number of runs of each path, best run is reported")
+        parser.add_argument('--cases', nargs='+', choices=list(CASES), help="Cases to run(all by default)")
+
+    def run(self, fetch, serialize):
+        """
+            best fetch and serialize seconds of runs and output of the last run
+        """
+        fetch_times, serialize_times = [], []
+        for _ in range(self.repeat):
+            start_time = time.perf_counter()
+            rows = fetch()
+            fetched_time = time.perf_counter()
+            data = serialize(rows)
+            fetch_times.append(fetched_time - start_time)
+            serialize_times.append(time.perf_counter() - fetched_time)
+        return min(fetch_times), min(serialize_times), data
+
+    def summarize(self, rows, fetch_seconds, serialize_seconds):
+        return {
+            'fetch_ms': round(fetch_seconds * 1000, 2),
+            'serialize_ms': round(serialize_seconds * 1000, 2),
+            'rows_per_second': round(rows / (fetch_seconds + serialize_seconds), 2),
+            'serialized_rows_per_second': round(rows / serialize_seconds, 2),
+        }
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        limit = options['rows']
+        context = {'request': Request(APIRequestFactory().get('/'))}
+        renderer = JSONRenderer()
+        report = {'database': connection.vendor, 'rows': limit, 'repeat': self.repeat, 'cases': {}}
+
+        for name in options['cases'] or CASES:
+            get_queryset, serializer_class, fast_serializer_class = CASES[name]
+            if not get_queryset().exists():
+                self.stderr.write(f"There is no row for {name}, run setup_fake_data first.")
+                continue
+
+            fast_serializer = fast_serializer_class(context)
+            model_result = self.run(
+                lambda: list(get_queryset()[:limit]),
+                lambda instances: serializer_class(instances, many=True, context=context).data
+            )
+            fast_result = self.run(
+                lambda: list(fast_serializer.get_rows(get_queryset())[:limit]),
+                fast_serializer.serialize
+            )
+
+            rows = len(fast_result[2])
+            model_summary = self.summarize(rows, *model_result[:2])
+            fast_summary = self.summarize(rows, *fast_result[:2])
+            report['cases'][name] = {
+                'rows': rows,
+                'identical': renderer.render(model_result[2]) == renderer.render(fast_result[2]),
+                'model_serializer': model_summary,
+                'fast_serializer': fast_summary,
+                'speedup': round(fast_summary['rows_per_second'] / model_summary['rows_per_second'], 2),
+            }
+
+        if not report['cases']:
+            raise CommandError("No case has rows to serialize.")
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,86 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+import json
+import subprocess
+import time
+from pathlib import Path
+
+from core.caches import cache_metrics
+from core.routers import database_metrics
+from store.benchmark import SCENARIOS, Dataset, run_scenarios
+from store.fake_data import SCALES
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark hot store endpoints(latency percentiles, throughput and queries) on the dataset of "
+        "setup_fake_data --bulk, store tables are replaced so run it on a database of its own"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='10k', help="Number of products, orders and comments of dataset")
+        parser.add_argument('--products', type=int, help="Number of products(overrides scale)")
+        parser.add_argument('--orders', type=int, help="Number of orders(overrides scale)")
+        parser.add_argument('--comments', type=int, help="Number of comments(overrides scale)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of dataset and of requests")
+        parser.add_argument('--workers', type=int, default=1, help="Number of processes that load dataset")
+        parser.add_argument('--requests', type=int, default=100, help="Number of measured requests per scenario")
+        parser.add_argument('--warmup', type=int, default=5, help="Number of requests per scenario before measuring")
+        parser.add_argument('--scenarios', nargs='+', choices=[scenario.name for scenario in SCENARIOS], help="Scenarios to run(all by default)")
+        parser.add_argument('--reload', action='store_true', help="Load dataset again even if a dataset of the same size exists")
+        parser.add_argument('--flush', action='store_true', help="Empty store tables after benchmark")
+        parser.add_argument('--output', help="Path of JSON report(printed to stdout by default)")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError("--requests must be at least 1.")
+
+        size = SCALES[options['scale']]
+        dataset = Dataset(
+            products=options['products'] or size,
+            orders=options['orders'] if options['orders'] is not None else size,
+            comments=options['comments'] if options['comments'] is not None else size,
+            seed=options['seed'],
+            workers=options['workers'],
+        )
+        scenarios = [scenario for scenario in SCENARIOS if not options['scenarios'] or scenario.name in options['scenarios']]
+
+        load_seconds = None
+        if options['reload'] or not dataset.exists():
+            self.stderr.write(f"Loading dataset {dataset.as_dict()}...")
+            start_time = time.perf_counter()
+            dataset.load(log=self.stderr.write)
+            load_seconds = round(time.perf_counter() - start_time, 2)
+
+        database_metrics.reset()
+        cache_metrics.reset()
+        try:
+            results = run_scenarios(dataset, scenarios, options['requests'], options['warmup'], options['seed'])
+        finally:
+            if options['flush']:
+                dataset.flush()
+
+        report = {
+            'commit': get_commit(),
+            'database': connection.vendor,
+            'dataset': {**dataset.as_dict(), 'load_seconds': load_seconds},
+            'warmup': options['warmup'],
+            'scenarios': results,
+            'database_aliases': database_metrics.snapshot(),
+            'cache': cache_metrics.snapshot(),
+        }
+        output = json.dumps(report, indent=2)
+
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+            self.stderr.write(f"Report is written to {options['output']}")
+        else:
+            self.stdout.write(output)
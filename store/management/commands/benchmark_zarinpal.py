@@ -0,0 +1,64 @@
+from django.core.management import BaseCommand
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from store.payment import ZarinpalSandbox, PaymentGatewayError, PaymentGatewayUnavailable, circuit_breaker, payment_metrics
+from store.zarinpal_stub import start_stub_server
+
+
+class Command(BaseCommand):
+    help = "Measure throughput and failure behaviour of zarinpal client against the local stub"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Number of payments(request + verify)")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0, help="Seconds of latency injected by the stub")
+        parser.add_argument('--failure-rate', type=float, default=0, help="Ratio of stub calls that fail with status 503")
+        parser.add_argument('--url', help="Url of a running stub, by default a stub is started in process")
+
+    def pay(self, zarinpal):
+        try:
+            data = zarinpal.payment_request(rial_total_price=100000, description='benchmark', callback_url='http://localhost/')
+            data = zarinpal.payment_verify(rial_total_price=100000, authority=data['Authority'])
+        except PaymentGatewayUnavailable:
+            return 'rejected'
+        except PaymentGatewayError:
+            return 'failed'
+        return 'paid' if data['Status'] == 100 else 'failed'
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if not url:
+            server = start_stub_server(latency=options['latency'], failure_rate=options['failure_rate'])
+            url = server.url
+
+        zarinpal = ZarinpalSandbox(merchant_id='benchmark', base_url=url)
+        logging.getLogger('store.payment').setLevel(logging.ERROR)
+        circuit_breaker.reset()
+        payment_metrics.reset()
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(lambda _: self.pay(zarinpal), range(options['requests'])))
+        elapsed = time.perf_counter() - start_time
+
+        if server:
+            server.shutdown()
+            server.server_close()
+
+        report = {
+            'payments': options['requests'],
+            'concurrency': options['concurrency'],
+            'elapsed_seconds': round(elapsed, 3),
+            'payments_per_second': round(options['requests'] / elapsed, 2),
+            'paid': results.count('paid'),
+            'failed': results.count('failed'),
+            'rejected_by_circuit_breaker': results.count('rejected'),
+            'circuit_breaker_state': circuit_breaker.state,
+            'calls': payment_metrics.snapshot(),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,77 @@
+from django.core.management import BaseCommand
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+import asyncio
+import json
+import logging
+import time
+import httpx
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.asgi import application
+from store.models import IncreaseWalletCredit
+from store.payment import circuit_breaker, payment_metrics
+from store.zarinpal_stub import start_stub_server
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Load test async wallet payment(create + callback) on ASGI application against the local zarinpal stub"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=200, help="Number of wallet payments")
+        parser.add_argument('--concurrency', type=int, default=200, help="Number of payments in flight at the same time")
+        parser.add_argument('--latency', type=float, default=0.5, help="Seconds of latency injected by the stub to every gateway call")
+        parser.add_argument('--phone', default='09000000000', help="Phone of temporary user that makes the payments")
+
+    async def pay(self, client, semaphore, headers):
+        async with semaphore:
+            response = await client.post('/store/wallet-credits/', json={'amount': 10000}, headers=headers)
+            if response.status_code != 302:
+                return 'failed'
+
+            authority = response.headers['Location'].rsplit('/', 1)[1]
+            response = await client.get('/store/wallet-credits/callback/', params={'Status': 'OK', 'Authority': authority}, headers=headers)
+            return 'paid' if response.status_code == 200 else 'failed'
+
+    async def run(self, options, headers):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        transport = httpx.ASGITransport(app=application)
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://localhost', timeout=None) as client:
+            return await asyncio.gather(*[self.pay(client, semaphore, headers) for _ in range(options['payments'])])
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(phone=options['phone'])
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        server = start_stub_server(latency=options['latency'])
+
+        logging.getLogger('store.payment').setLevel(logging.ERROR)
+        circuit_breaker.reset()
+        payment_metrics.reset()
+
+        try:
+            with override_settings(ZARINPAL_BASE_URL=server.url):
+                start_time = time.perf_counter()
+                results = asyncio.run(self.run(options, headers))
+                elapsed = time.perf_counter() - start_time
+        finally:
+            server.shutdown()
+            server.server_close()
+            IncreaseWalletCredit.objects.filter(customer__user=user).delete()
+            user.delete()
+
+        report = {
+            'payments': options['payments'],
+            'concurrency': options['concurrency'],
+            'gateway_latency_seconds': options['latency'],
+            'elapsed_seconds': round(elapsed, 3),
+            'payments_per_second': round(options['payments'] / elapsed, 2),
+            'serial_elapsed_seconds': round(options['payments'] * options['latency'] * 2, 3),
+            'paid': results.count('paid'),
+            'failed': results.count('failed'),
+            'calls': payment_metrics.snapshot(),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
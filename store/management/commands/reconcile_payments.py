@@ -0,0 +1,150 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, F
+from django.utils import timezone
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from store.models import Order, IncreaseWalletCredit
+from store.payment import ZarinpalSandbox, PaymentGatewayError
+
+
+class Command(BaseCommand):
+    help = "Verify pending zarinpal authorities of orders and wallet credits that never got a callback"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of authorities that are verified and applied in one transaction")
+        parser.add_argument('--workers', type=int, default=10, help="Number of concurrent verifications")
+        parser.add_argument('--older-than', type=int, default=30, help="Only authorities created more than this many minutes ago")
+        parser.add_argument('--url', help="Base url of the gateway, e.g. a local stub(run_zarinpal_stub)")
+
+    def iterate_pages(self, queryset, batch_size):
+        """
+            keyset pagination on id, so rows that are applied or removed
+            from pending ones don't shift the next pages
+        """
+        last_id = 0
+
+        while True:
+            page = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not page:
+                return
+            yield page
+            last_id = page[-1].id
+
+    def verify(self, zarinpal, rial_total_price, authority):
+        try:
+            data = zarinpal.payment_verify(rial_total_price=rial_total_price, authority=authority)
+        except PaymentGatewayError:
+            return None, None
+        return data['Status'], data.get('RefID')
+
+    def verify_page(self, executor, zarinpal, page, get_rial_total_price):
+        return list(executor.map(
+            lambda instance: self.verify(zarinpal, get_rial_total_price(instance), instance.zarinpal_authority),
+            page
+        ))
+
+    def count_results(self, report, results):
+        for payment_status, _ in results:
+            if payment_status is None:
+                report['errors'] += 1
+            elif payment_status in [100, 101]:
+                report['paid'] += 1
+            else:
+                report['unsuccessful'] += 1
+        report['verified'] += len(results)
+
+    @transaction.atomic
+    def apply_orders(self, page, results):
+        orders = Order.objects.select_for_update().filter(
+            id__in=[order.id for order in page], status=Order.ORDER_STATUS_UNPAID
+        ).in_bulk()
+        unsuccessful_order_ids = []
+
+        for pending_order, (payment_status, ref_id) in zip(page, results):
+            order = orders.get(pending_order.id)
+            if order is None or order.zarinpal_authority != pending_order.zarinpal_authority:
+                continue
+
+            if payment_status in [100, 101]:
+                order.status = Order.ORDER_STATUS_PAID
+                order.zarinpal_ref_id = ref_id
+                order.save(update_fields=['status', 'zarinpal_ref_id'])
+            elif payment_status is not None:
+                unsuccessful_order_ids.append(order.id)
+
+        Order.objects.filter(id__in=unsuccessful_order_ids).update(zarinpal_authority='')
+
+    @transaction.atomic
+    def apply_wallet_credits(self, page, results):
+        increase_wallet_credits = IncreaseWalletCredit.objects.select_for_update().filter(
+            id__in=[increase_wallet_credit.id for increase_wallet_credit in page], is_paid=False
+        ).in_bulk()
+        unsuccessful_increase_wallet_credit_ids = []
+
+        for pending_increase_wallet_credit, (payment_status, ref_id) in zip(page, results):
+            increase_wallet_credit = increase_wallet_credits.get(pending_increase_wallet_credit.id)
+            if increase_wallet_credit is None or increase_wallet_credit.zarinpal_authority != pending_increase_wallet_credit.zarinpal_authority:
+                continue
+
+            if payment_status in [100, 101]:
+                increase_wallet_credit.is_paid = True
+                increase_wallet_credit.zarinpal_ref_id = ref_id
+                increase_wallet_credit.save(update_fields=['is_paid', 'zarinpal_ref_id'])
+            elif payment_status is not None:
+                unsuccessful_increase_wallet_credit_ids.append(increase_wallet_credit.id)
+
+        IncreaseWalletCredit.objects.filter(id__in=unsuccessful_increase_wallet_credit_ids).delete()
+
+    def reconcile(self, executor, zarinpal, queryset, get_rial_total_price, apply_results, batch_size):
+        report = {'verified': 0, 'paid': 0, 'unsuccessful': 0, 'errors': 0}
+
+        for page in self.iterate_pages(queryset, batch_size):
+            results = self.verify_page(executor, zarinpal, page, get_rial_total_price)
+            apply_results(page, results)
+            self.count_results(report, results)
+
+        return report
+
+    def handle(self, *args, **options):
+        created_before = timezone.now() - timedelta(minutes=options['older_than'])
+
+        pending_orders = Order.objects.filter(
+            status=Order.ORDER_STATUS_UNPAID, created_datetime__lt=created_before
+        ).exclude(zarinpal_authority='').annotate(
+            rial_total_price=Sum(F('items__product__price') * F('items__quantity'))
+        ).only('id', 'zarinpal_authority')
+
+        pending_increase_wallet_credits = IncreaseWalletCredit.objects.filter(
+            is_paid=False, created_datetime__lt=created_before
+        ).exclude(zarinpal_authority='').only('id', 'amount', 'zarinpal_authority')
+
+        zarinpal = ZarinpalSandbox(base_url=options['url'])
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            orders_report = self.reconcile(
+                executor, zarinpal, pending_orders,
+                lambda order: order.rial_total_price or 0,
+                self.apply_orders, options['batch_size']
+            )
+            increase_wallet_credits_report = self.reconcile(
+                executor, zarinpal, pending_increase_wallet_credits,
+                lambda increase_wallet_credit: increase_wallet_credit.amount,
+                self.apply_wallet_credits, options['batch_size']
+            )
+
+        elapsed = time.perf_counter() - start_time
+
+        verified = orders_report['verified'] + increase_wallet_credits_report['verified']
+        report = {
+            'orders': orders_report,
+            'wallet_credits': increase_wallet_credits_report,
+            'elapsed_seconds': round(elapsed, 3),
+            'verifications_per_second': round(verified / elapsed, 2) if elapsed else 0,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
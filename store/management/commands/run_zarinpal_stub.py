@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+from store.zarinpal_stub import ZarinpalStubServer
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in of zarinpal sandbox, set DJANGO_ZARINPAL_BASE_URL to its url"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0, help="Seconds of latency injected to every call")
+        parser.add_argument('--failure-rate', type=float, default=0, help="Ratio of calls that fail with status 503")
+
+    def handle(self, *args, **options):
+        server = ZarinpalStubServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            failure_rate=options['failure_rate']
+        )
+        self.stdout.write(f"Zarinpal stub is running at {server.url}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("\nStopped.")
+        finally:
+            server.server_close()
@@ -2,9 +2,11 @@ from django.core.management import BaseCommand
 from django.db import transaction
 
 import random
+import time
 from faker import Faker
 from datetime import datetime, timedelta, timezone
 
+from store.fake_data import SCALES, FakeDataPlan, generate_fake_data
 from store.models import Address, Customer, Category, Product, Comment, Seller, Cart, CartItem, Order, OrderItem
 from store.factories import (
     AddressFactory,
@@ -33,8 +35,30 @@ NUM_ORDERS = 30
 class Command(BaseCommand):
     help = "Generate fake data"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', action='store_true', help="Generate rows in memory and insert them by bulk_create(high volume)")
+        parser.add_argument('--scale', choices=SCALES, default='10k', help="Number of products, comments and orders of bulk mode")
+        parser.add_argument('--products', type=int, help="Number of products of bulk mode(overrides scale)")
+        parser.add_argument('--workers', type=int, default=1, help="Number of processes that generate and insert rows in bulk mode")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of bulk mode")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Number of rows per INSERT in bulk mode")
+
+    def handle(self, *args, **options):
+        if options['bulk']:
+            self.handle_bulk(**options)
+        else:
+            self.handle_factories()
+
+    def handle_bulk(self, **options):
+        plan = FakeDataPlan(products=options['products'] or SCALES[options['scale']], seed=options['seed'], batch_size=options['batch_size'])
+        self.stdout.write(f"Truncating tables and creating {plan.as_dict()}...")
+
+        start_time = time.perf_counter()
+        generate_fake_data(plan, workers=options['workers'], log=self.stdout.write)
+        self.stdout.write(f"DONE in {time.perf_counter() - start_time:.1f} seconds")
+
     @transaction.atomic
-    def handle(self, *args, **kwargs):
+    def handle_factories(self):
         self.stdout.write("Deleting old data...")
         
         models = list_of_models
@@ -154,8 +178,6 @@ class Command(BaseCommand):
                     comment.save()
                     all_comments.append(comment)
 
-        Comment.objects.rebuild()
-
         print("DONE")
 
         # cart items data
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.renderers import JSONRenderer
+
+import threading
+from hashlib import md5
+
+from core.caches import NAMESPACE_MENUS, get_tiered_cache
+from core.routers import PRIMARY_DATABASE
+from .models import Menu
+from .paginations import CustomLimitOffsetPagination
+
+MENU_TREE_KEY = 'store:menu_tree'
+MAX_PAGES = 100
+
+# placeholder of results in rendered envelope of a page
+RESULTS_PLACEHOLDER = '__results__'
+
+
+def build_menu_tree():
+    """
+        json of each root menu with its sub menus(same as MenuSerializer),
+        built from one query in tree order, roots are newest first like
+        queryset of MenuViewset, it's read from primary so lag of replicas
+        isn't kept in the cache
+    """
+    nodes = {}
+    roots = []
+    renderer = JSONRenderer()
+
+    menus = Menu.objects.using(PRIMARY_DATABASE).order_by('tree_id', 'lft').values_list('id', 'title', 'url', 'sub_menu_id')
+    for menu_id, title, url, sub_menu_id in menus:
+        node = nodes[menu_id] = {'id': menu_id, 'title': title, 'url': url, 'sub_menus': []}
+        if sub_menu_id is None:
+            roots.append(node)
+        else:
+            nodes[sub_menu_id]['sub_menus'].append(node)
+
+    roots.sort(key=lambda node: node['id'], reverse=True)
+    return [renderer.render(root) for root in roots]
+
+
+class CompiledMenu:
+    """
+        json of root menus of a version of menus namespace, with rendered
+        pages(body and etag) per url that are built on first request
+    """
+
+    def __init__(self, version, roots):
+        self.version = version
+        self.roots = roots
+        self.pages = {}
+
+    def render_page(self, request, view):
+        paginator = CustomLimitOffsetPagination()
+        roots = paginator.paginate_queryset(self.roots, request, view)
+        envelope = paginator.get_paginated_response(RESULTS_PLACEHOLDER).data
+        envelope['count_items_current_page'] = len(roots)
+
+        head, tail = JSONRenderer().render(envelope).split(f'"{RESULTS_PLACEHOLDER}"'.encode())
+        body = head + b'[' + b','.join(roots) + b']' + tail
+        return body, f'"{md5(body).hexdigest()}"'
+
+    def get_page(self, request, view):
+        url = request.build_absolute_uri()
+        page = self.pages.get(url)
+        if page is None:
+            page = self.render_page(request, view)
+            if len(self.pages) >= MAX_PAGES:
+                self.pages.clear()
+            self.pages[url] = page
+        return page
+
+
+_compiled_menu = None
+_compiled_menu_lock = threading.Lock()
+
+
+def get_compiled_menu():
+    """
+        compiled menu of this process, rebuilt when version of menus namespace
+        is changed(signals of Menu), json of roots is shared between processes
+        by tiered cache so a change is built from database once
+    """
+    global _compiled_menu
+
+    tiered_cache = get_tiered_cache()
+    version = tiered_cache.get_version(NAMESPACE_MENUS)
+    compiled_menu = _compiled_menu
+
+    if compiled_menu is None or compiled_menu.version != version:
+        with _compiled_menu_lock:
+            compiled_menu = _compiled_menu
+            if compiled_menu is None or compiled_menu.version != version:
+                roots = tiered_cache.get_or_set(NAMESPACE_MENUS, MENU_TREE_KEY, build_menu_tree, None)
+                compiled_menu = _compiled_menu = CompiledMenu(version, roots)
+    return compiled_menu
+
+
+def get_menu_response(request, view):
+    """
+        precompiled page of menus with strong etag, 304 when client
+        has the same page, no query and no serialization in steady state
+    """
+    body, etag = get_compiled_menu().get_page(request, view)
+
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.MENU_CACHE_MAX_AGE)
+    return get_conditional_response(request, etag=etag, response=response)
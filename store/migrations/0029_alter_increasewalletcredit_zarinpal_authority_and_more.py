@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-19 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0028_menu'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='increasewalletcredit',
+            name='zarinpal_authority',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Zarinpal authority'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='zarinpal_authority',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Zarinpal authority'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.4 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('store', '0029_alter_increasewalletcredit_zarinpal_authority_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='author_name',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Author name'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['content_type', 'object_id'], name='store_addre_content_cc982b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['content_type', 'object_id'], name='store_comme_content_1b4f44_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commentdislike',
+            index=models.Index(fields=['content_type', 'object_id', 'comment'], name='store_comme_content_a215a9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commentlike',
+            index=models.Index(fields=['content_type', 'object_id', 'comment'], name='store_comme_content_edb573_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_comment_author_name(apps, schema_editor):
+    """
+        set author_name of existing comments in batches of BATCH_SIZE,
+        authors of each batch are loaded by one query per author model
+    """
+    Comment = apps.get_model('store', 'Comment')
+    Customer = apps.get_model('store', 'Customer')
+    Seller = apps.get_model('store', 'Seller')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type_ids = dict(ContentType.objects.filter(app_label='store', model__in=['customer', 'seller']).values_list('model', 'id'))
+    customer_content_type_id = content_type_ids.get('customer')
+    seller_content_type_id = content_type_ids.get('seller')
+
+    last_id = 0
+    while True:
+        comments = list(Comment.objects.filter(id__gt=last_id).order_by('id').only('id', 'content_type_id', 'object_id')[:BATCH_SIZE])
+        if not comments:
+            break
+        last_id = comments[-1].id
+
+        customer_ids = {comment.object_id for comment in comments if comment.content_type_id == customer_content_type_id}
+        seller_ids = {comment.object_id for comment in comments if comment.content_type_id == seller_content_type_id}
+        customer_names = {
+            customer_id: f'{first_name} {last_name}'.strip() or 'Unknown'
+            for customer_id, first_name, last_name in Customer.objects.filter(id__in=customer_ids).values_list('id', 'first_name', 'last_name')
+        }
+        seller_names = dict(Seller.objects.filter(id__in=seller_ids).values_list('id', 'company_name'))
+
+        for comment in comments:
+            names = customer_names if comment.content_type_id == customer_content_type_id else seller_names
+            comment.author_name = names.get(comment.object_id, '')
+
+        Comment.objects.bulk_update(comments, ['author_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0030_comment_author_name_and_owner_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_comment_author_name, migrations.RunPython.noop),
+    ]
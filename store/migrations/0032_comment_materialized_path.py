@@ -0,0 +1,135 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+from collections import defaultdict
+
+BATCH_SIZE = 1000
+PATH_STEP = 10
+
+
+def backfill_comment_path(apps, schema_editor):
+    """
+        set path of existing comments level by level of the mptt tree, so path
+        of parents is already set when their replies are updated
+    """
+    Comment = apps.get_model('store', 'Comment')
+
+    max_level = Comment.objects.aggregate(max_level=models.Max('level'))['max_level'] or 0
+    for level in range(1, max_level + 1):
+        last_id = 0
+        while True:
+            comments = list(Comment.objects.filter(level=level, id__gt=last_id).order_by('id').only('id', 'reply_to_id')[:BATCH_SIZE])
+            if not comments:
+                break
+            last_id = comments[-1].id
+
+            parent_paths = dict(Comment.objects.filter(id__in={comment.reply_to_id for comment in comments}).values_list('id', 'path'))
+            for comment in comments:
+                comment.path = parent_paths[comment.reply_to_id] + str(comment.reply_to_id).zfill(PATH_STEP)
+
+            Comment.objects.bulk_update(comments, ['path'])
+
+
+def rebuild_comment_tree(apps, schema_editor):
+    """
+        set mptt fields of comments from their path, threads are walked in the
+        order of mptt(order_insertion_by title) so tree_id of roots, lft and
+        rght of replies are the same as a rebuild of the tree
+    """
+    Comment = apps.get_model('store', 'Comment')
+
+    root_ids = list(Comment.objects.filter(reply_to=None).order_by('title', 'id').values_list('id', flat=True))
+    tree_id = 0
+    for start in range(0, len(root_ids), BATCH_SIZE):
+        batch_root_ids = root_ids[start:start + BATCH_SIZE]
+        comments = list(
+            Comment.objects
+            .annotate(root_key=Substr('path', 1, PATH_STEP))
+            .filter(models.Q(id__in=batch_root_ids) | models.Q(root_key__in=[str(root_id).zfill(PATH_STEP) for root_id in batch_root_ids]))
+            .order_by('title', 'id')
+            .only('id', 'reply_to_id', 'path', 'title')
+        )
+
+        comments_by_id = {comment.id: comment for comment in comments}
+        replies = defaultdict(list)
+        for comment in comments:
+            replies[comment.reply_to_id].append(comment)
+
+        for root_id in batch_root_ids:
+            tree_id += 1
+            counter = 1
+            stack = [(comments_by_id[root_id], False)]
+            while stack:
+                comment, is_walked = stack.pop()
+                if is_walked:
+                    comment.rght = counter
+                    counter += 1
+                    continue
+
+                comment.tree_id = tree_id
+                comment.level = len(comment.path) // PATH_STEP
+                comment.lft = counter
+                counter += 1
+                stack.append((comment, True))
+                stack.extend((reply, False) for reply in reversed(replies[comment.id]))
+
+        Comment.objects.bulk_update(comments, ['tree_id', 'level', 'lft', 'rght'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0031_backfill_comment_author_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=250, verbose_name='Path'),
+        ),
+        migrations.RunPython(backfill_comment_path, rebuild_comment_tree),
+        # mptt fields are added again with this default when migration is reversed, then rebuild_comment_tree sets them
+        migrations.AlterField(
+            model_name='comment',
+            name='level',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='lft',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='rght',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='tree_id',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='level',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='lft',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='rght',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='tree_id',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='reply_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='store.comment', verbose_name='Reply to'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Cast, Concat, LPad, Substr
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
@@ -15,6 +17,16 @@ from datetime import date, timedelta
 from .validators import PostalCodeValidator, NationalCodeValidator
 
 
+class OwnedQuerySet(models.QuerySet):
+    
+    def owned_by(self, owner_model, owner_id):
+        """
+            filter by (content_type, object_id) index instead of joining
+            the owner table through related query name(customer/seller)
+        """
+        return self.filter(content_type=ContentType.objects.get_for_model(owner_model), object_id=owner_id)
+
+
 class Address(models.Model):
     postal_code_validator = PostalCodeValidator()
 
@@ -37,12 +49,17 @@ class Address(models.Model):
         if not self.content_object:
             raise ValidationError(_("There isn't any %(user_type)s with id=%(object_id)d.") % {'user_type': _(self.content_type.model_class().__name__), 'object_id': self.object_id})
 
+    objects = OwnedQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.province}(City: {self.city}): {self.postal_code}"
     
     class Meta:
         verbose_name = _("Address")
         verbose_name_plural = _("Addresses")
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'])
+        ]
 
 
 class Person(models.Model):
@@ -79,9 +96,13 @@ class Customer(Person):
     comment_likes = GenericRelation('CommentLike', related_query_name="customer")
     comment_dislikes = GenericRelation('CommentDislike', related_query_name="customer")
 
-    def __str__(self):
+    @property
+    def display_name(self):
         return self.full_name if self.full_name else 'Unknown'
 
+    def __str__(self):
+        return self.display_name
+
     class Meta:
         verbose_name = _("Customer")
         verbose_name_plural = _("Customers")
@@ -92,7 +113,7 @@ class IncreaseWalletCredit(models.Model):
     amount = models.PositiveIntegerField(verbose_name=_("Amount"))
     is_paid = models.BooleanField(default=False, verbose_name=_("Is paid"))
 
-    zarinpal_authority = models.CharField(max_length=255, blank=True, verbose_name=_("Zarinpal authority"))
+    zarinpal_authority = models.CharField(max_length=255, blank=True, db_index=True, verbose_name=_("Zarinpal authority"))
     zarinpal_ref_id = models.CharField(max_length=255, blank=True, verbose_name=_("Zarinpal ref_id"))
 
     created_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_("Created datetime"))
@@ -144,6 +165,10 @@ class Seller(Person):
         if self.status in [self.SELLER_STATUS_WAITING, self.SELLER_STATUS_REJECTED] and self.products.count() > 0:
             raise ValidationError(_("You can't change status this seller because there is some products relating this seller, Please remove them first."))
 
+    @property
+    def display_name(self):
+        return self.company_name
+
     def __str__(self):
         return f"{self.company_name}({self.national_code})"
 
@@ -241,7 +266,23 @@ class ProductImage(models.Model):
         verbose_name_plural = _("Product images")
 
 
-class Comment(MPTTModel):
+class CommentQuerySet(models.QuerySet):
+
+    def thread_order(self):
+        """
+            order comments depth-first like a thread, every reply right after
+            its parent and replies of a comment by creation order
+        """
+        return self.order_by(Concat('path', LPad(Cast('id', models.CharField()), Comment.PATH_STEP, Value('0'))))
+
+
+class Comment(models.Model):
+    # path is ids of ancestors of comment from root, each zero padded to PATH_STEP
+    # characters, so a thread is read by one prefix query and inserting or
+    # deleting a reply doesn't touch other comments
+    PATH_STEP = 10
+    PATH_MAX_LENGTH = 250
+
     COMMENT_STATUS_WAITING = "w"
     COMMENT_STATUS_APPROVED = "a"
     COMMENT_STATUS_NOT_APPROVED = "na"
@@ -276,12 +317,70 @@ class Comment(MPTTModel):
     title = models.CharField(max_length=255, blank=True, verbose_name=_("Title"))
     body = models.TextField(verbose_name=_("Body"))
     status = models.CharField(max_length=2, choices=COMMENT_STATUS, default=COMMENT_STATUS_WAITING, verbose_name=_("Status"))
-    reply_to = TreeForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies', verbose_name=_("Reply to"))
+    reply_to = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies', verbose_name=_("Reply to"))
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, db_index=True, editable=False, verbose_name=_("Path"))
     rating = models.IntegerField(choices=COMMENT_RATING, null=True, blank=True, verbose_name=_("Rating"))
+    # display name of content_object, kept in sync so listings don't load authors
+    author_name = models.CharField(max_length=255, blank=True, editable=False, verbose_name=_("Author name"))
 
     created_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_("Created datetime"))
     modified_datetime = models.DateTimeField(auto_now=True, verbose_name=_("Modified datetime"))
 
+    objects = CommentQuerySet.as_manager()
+
+    @property
+    def depth(self):
+        return len(self.path) // self.PATH_STEP
+
+    @property
+    def descendants_path(self):
+        """
+            path prefix of all replies of comment in its thread
+        """
+        return self.path + str(self.id).zfill(self.PATH_STEP)
+
+    def get_path_of_reply_to(self):
+        return self.reply_to.descendants_path if self.reply_to_id else ''
+
+    def get_descendants(self, include_self=False):
+        condition = models.Q(path__startswith=self.descendants_path)
+        if include_self:
+            condition |= models.Q(id=self.id)
+        return Comment.objects.filter(condition).thread_order()
+
+    @property
+    def author_type(self):
+        """
+            name of content_object model, content type is read from
+            the cache of ContentType, so it isn't joined
+        """
+        return ContentType.objects.get_for_id(self.content_type_id).model_class().__name__
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.author_name and self.content_object:
+            self.author_name = self.content_object.display_name
+
+        path = self.get_path_of_reply_to()
+        if self._state.adding or path == self.path:
+            self.path = path
+            super().save(*args, **kwargs)
+            return
+
+        # comment is moved to another thread or parent, paths of its replies are changed by one UPDATE
+        with transaction.atomic():
+            old_descendants_path = self.descendants_path
+            self.path = path
+            super().save(*args, **kwargs)
+            Comment.objects.filter(path__startswith=old_descendants_path).update(
+                path=Concat(Value(self.descendants_path), Substr('path', len(old_descendants_path) + 1))
+            )
+
+    def delete(self, *args, **kwargs):
+        """
+            delete comment and its replies by one prefix query,
+            instead of collecting replies level by level
+        """
+        return Comment.objects.filter(models.Q(id=self.id) | models.Q(path__startswith=self.descendants_path)).delete()
 
     def clean(self):
         super().clean()
@@ -291,19 +390,22 @@ class Comment(MPTTModel):
 
         if self.reply_to and self.rating:
             raise ValidationError(_("A comment that is a reply cannot be rating."))
+        elif self.reply_to and len(self.get_path_of_reply_to()) > self.PATH_MAX_LENGTH:
+            raise ValidationError(_("The replies of this comment are too deep."))
+        elif self.reply_to and self.id and (self.reply_to_id == self.id or self.reply_to.path.startswith(self.descendants_path)):
+            raise ValidationError(_("A comment cannot be a reply to itself or its replies."))
         elif not self.rating and not self.reply_to:
             raise ValidationError( _("A comment that isn't a reply should be rating."))
 
     def __str__(self):
         return f"{self.title}({self.body[:15] + '...' if len(self.body) > 15 else self.body})"
 
-    class MPTTMeta:
-        order_insertion_by = ["title"]
-        parent_attr = "reply_to"
-    
     class Meta:
         verbose_name = _("Comment")
         verbose_name_plural = _("Comments")
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'])
+        ]
 
 
 class CommentLike(models.Model):
@@ -319,6 +421,8 @@ class CommentLike(models.Model):
     created_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_("Created datetime"))
     modified_datetime = models.DateTimeField(auto_now=True, verbose_name=_("Modified datetime"))
 
+    objects = OwnedQuerySet.as_manager()
+
     def clean(self):
         super().clean()
 
@@ -331,6 +435,9 @@ class CommentLike(models.Model):
     class Meta:
         verbose_name = _("Comment like")
         verbose_name_plural = _("Comment likes")
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'comment'])
+        ]
 
 
 class CommentDislike(models.Model):
@@ -346,6 +453,8 @@ class CommentDislike(models.Model):
     created_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_("Created datetime"))
     modified_datetime = models.DateTimeField(auto_now=True, verbose_name=_("Modified datetime"))
 
+    objects = OwnedQuerySet.as_manager()
+
     def clean(self):
         super().clean()
 
@@ -358,6 +467,9 @@ class CommentDislike(models.Model):
     class Meta:
         verbose_name = _("Comment dislike")
         verbose_name_plural = _("Comment dislikes")
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'comment'])
+        ]
 
 
 class Cart(models.Model):
@@ -418,7 +530,7 @@ class Order(models.Model):
     address = models.ForeignKey(Address, on_delete=models.PROTECT, related_name="orders", verbose_name=_("Address"))
     payment_method = models.CharField(max_length=1, choices=ORDER_PAYMENT_METHOD, default=ORDER_PAYMENT_METHOD_ONLINE, verbose_name=_("Payment method"))
 
-    zarinpal_authority = models.CharField(max_length=255, blank=True, verbose_name=_("Zarinpal authority"))
+    zarinpal_authority = models.CharField(max_length=255, blank=True, db_index=True, verbose_name=_("Zarinpal authority"))
     zarinpal_ref_id = models.CharField(max_length=255, blank=True, verbose_name=_("Zarinpal ref_id"))
 
     created_datetime = models.DateTimeField(auto_now_add=True, verbose_name=_("Created datetime"))
@@ -431,6 +543,14 @@ class Order(models.Model):
             total_price += item.product.price * item.quantity
         
         return total_price 
+
+    async def aget_total_price(self):
+        total_price = 0
+
+        async for item in self.items.select_related('product'):
+            total_price += item.product.price * item.quantity
+
+        return total_price
     
     def clean(self):
         super().clean()
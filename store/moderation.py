@@ -0,0 +1,72 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Comment, CommentDislike, CommentLike, Customer, Seller
+from core.authentication import invalidate_user_auth
+
+
+def approve_comments(queryset):
+    """
+        approve waiting comments of queryset by one UPDATE,
+        return number of approved comments
+    """
+    return queryset.filter(status=Comment.COMMENT_STATUS_WAITING).update(
+        status=Comment.COMMENT_STATUS_APPROVED, modified_datetime=timezone.now()
+    )
+
+
+def reject_comments(queryset):
+    """
+        delete waiting comments of queryset(with their replies),
+        return number of deleted comments
+    """
+    with transaction.atomic():
+        _, deleted_per_model = queryset.filter(status=Comment.COMMENT_STATUS_WAITING).delete()
+    return deleted_per_model.get(Comment._meta.label, 0)
+
+
+def accept_sellers(queryset):
+    """
+        accept waiting sellers of queryset by one UPDATE and move comments,
+        comment likes and comment dislikes of their customers to them by one
+        UPDATE per table, return number of accepted sellers
+    """
+    customer_content_type = ContentType.objects.get_for_model(Customer)
+    seller_content_type = ContentType.objects.get_for_model(Seller)
+    seller_of_customer = Seller.objects.filter(user__customer=OuterRef('object_id'))
+
+    with transaction.atomic():
+        sellers = list(queryset.filter(status=Seller.SELLER_STATUS_WAITING).select_for_update().values_list('id', 'user_id'))
+        if not sellers:
+            return 0
+        user_ids = [user_id for _, user_id in sellers]
+
+        Seller.objects.filter(id__in=[seller_id for seller_id, _ in sellers]).update(status=Seller.SELLER_STATUS_ACCEPTED)
+
+        customer_ids = list(Customer.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+        for model in [Comment, CommentLike, CommentDislike]:
+            fields = {}
+            if model is Comment:
+                fields['author_name'] = Subquery(seller_of_customer.values('company_name')[:1])
+            # object_id is set after the fields whose subquery read it, MySQL
+            # assigns columns from left to right
+            fields['object_id'] = Subquery(seller_of_customer.values('id')[:1])
+            fields['content_type'] = seller_content_type
+
+            model.objects.filter(content_type=customer_content_type, object_id__in=customer_ids).update(**fields)
+
+        invalidate_user_auth(*user_ids)
+
+    return len(sellers)
+
+
+def reject_sellers(queryset):
+    """
+        delete waiting sellers of queryset by one DELETE per related table,
+        return number of rejected sellers
+    """
+    with transaction.atomic():
+        _, deleted_per_model = queryset.filter(status=Seller.SELLER_STATUS_WAITING).delete()
+    return deleted_per_model.get(Seller._meta.label, 0)
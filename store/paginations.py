@@ -1,7 +1,37 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 
 
+def get_estimated_count(queryset):
+    """
+        number of rows of table of queryset from statistics of database,
+        None if database doesn't keep it(e.g. sqlite)
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+
+    # postgresql returns -1 for tables that are never analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
 class CustomLimitOffsetPagination(LimitOffsetPagination):
     default_limit = 10
     max_limit = 15
@@ -17,3 +47,22 @@ class CustomLimitOffsetPagination(LimitOffsetPagination):
             'count_items_current_page': len(data),
             'results': data
         })
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+        paginator of admin changelists, number of rows of unfiltered querysets
+        is estimated by table statistics when it's more than
+        ADMIN_ESTIMATED_COUNT_THRESHOLD, instead of COUNT(*) on every page
+    """
+
+    @cached_property
+    def count(self):
+        threshold = settings.ADMIN_ESTIMATED_COUNT_THRESHOLD
+        query = getattr(self.object_list, 'query', None)
+
+        if threshold and query is not None and not query.where and not query.distinct:
+            estimated_count = get_estimated_count(self.object_list)
+            if estimated_count is not None and estimated_count > threshold:
+                return estimated_count
+        return super().count
@@ -1,47 +1,293 @@
 from django.conf import settings
 
 import requests
+import httpx
+import asyncio
 import json
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    pass
+
+
+class CircuitBreaker:
+    """
+        fail fast when the gateway is degraded, after failure_threshold
+        consecutive failures the circuit opens and rejects calls until
+        recovery_timeout passes, then one trial call is let through
+        (half open) and its result closes or reopens the circuit
+    """
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.STATE_HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == self.STATE_CLOSED:
+                return True
+            if self._state == self.STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = self.STATE_HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.STATE_CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.STATE_OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.STATE_CLOSED
+            self._failures = 0
+
+
+class LatencyMetrics:
+    """
+        per operation call count, error count and latency of recent calls
+    """
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency, error=False):
+        with self._lock:
+            metric = self._metrics.setdefault(operation, {
+                'count': 0, 'errors': 0, 'total_latency': 0.0, 'max_latency': 0.0,
+                'samples': deque(maxlen=self.max_samples)
+            })
+            metric['count'] += 1
+            metric['errors'] += int(error)
+            metric['total_latency'] += latency
+            metric['max_latency'] = max(metric['max_latency'], latency)
+            metric['samples'].append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, metric in self._metrics.items():
+                samples = sorted(metric['samples'])
+                result[operation] = {
+                    'count': metric['count'],
+                    'errors': metric['errors'],
+                    'avg_ms': round(metric['total_latency'] / metric['count'] * 1000, 2),
+                    'p50_ms': round(samples[int(len(samples) * 0.5)] * 1000, 2),
+                    'p95_ms': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 2),
+                    'max_ms': round(metric['max_latency'] * 1000, 2),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.ZARINPAL_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=settings.ZARINPAL_CIRCUIT_BREAKER_RECOVERY_TIMEOUT
+)
+payment_metrics = LatencyMetrics()
+
+
+def get_session():
+    """
+        return shared session of process so connections to
+        the gateway are pooled and reused between requests
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.ZARINPAL_POOL_MAXSIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    "accept": "application/json",
+                    "content-type": "application/json"
+                })
+                _session = session
+    return _session
+
+
+def get_async_client():
+    """
+        return shared async client of running event loop, an async client
+        can't be used across event loops so one client is kept per loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+
+    if client is None:
+        client = httpx.AsyncClient(
+            headers={
+                "accept": "application/json",
+                "content-type": "application/json"
+            },
+            timeout=httpx.Timeout(settings.ZARINPAL_READ_TIMEOUT, connect=settings.ZARINPAL_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.ZARINPAL_ASYNC_POOL_MAXSIZE, max_keepalive_connections=settings.ZARINPAL_POOL_MAXSIZE)
+        )
+        _async_clients[loop] = client
+    return client
+
 
 class ZarinpalSandbox:
-    _zarinpal_request_url = 'https://sandbox.zarinpal.com/pg/rest/WebGate/PaymentRequest.json'
-    _zarinpal_page_url = 'https://sandbox.zarinpal.com/pg/StartPay/'
-    _zarinpal_verify_url = 'https://sandbox.zarinpal.com/pg/rest/WebGate/PaymentVerification.json'
+    _zarinpal_request_path = '/pg/rest/WebGate/PaymentRequest.json'
+    _zarinpal_page_path = '/pg/StartPay/'
+    _zarinpal_verify_path = '/pg/rest/WebGate/PaymentVerification.json'
 
 
-    def __init__(self, merchant_id=settings.ZARINPAL_MERCHANT_ID):
+    def __init__(self, merchant_id=settings.ZARINPAL_MERCHANT_ID, base_url=None):
         self.merchant_id = merchant_id
+        self.base_url = (base_url or settings.ZARINPAL_BASE_URL).rstrip('/')
+        self.timeout = (settings.ZARINPAL_CONNECT_TIMEOUT, settings.ZARINPAL_READ_TIMEOUT)
 
-    def payment_request(self, rial_total_price, description, callback_url):
-        request_header = {
-            "accept": "application/json",
-            "content-type": "application/json"
-        }
+    def _check_circuit_breaker(self, operation):
+        if not circuit_breaker.allow_request():
+            payment_metrics.record(operation, 0, error=True)
+            raise PaymentGatewayUnavailable('Circuit breaker of zarinpal is open.')
+
+    def _read_response(self, response):
+        if response.status_code >= 500:
+            raise PaymentGatewayError(f'Zarinpal responded with status code {response.status_code}.')
+        return response.json()
+
+    def _record_failure(self, operation, start_time, error):
+        circuit_breaker.record_failure()
+        payment_metrics.record(operation, time.perf_counter() - start_time, error=True)
+        logger.warning('Zarinpal %s failed: %s', operation, error)
+
+    def _record_success(self, operation, start_time):
+        circuit_breaker.record_success()
+        payment_metrics.record(operation, time.perf_counter() - start_time)
+
+    def _post(self, operation, path, request_data):
+        self._check_circuit_breaker(operation)
+
+        start_time = time.perf_counter()
+        try:
+            response = get_session().post(url=f'{self.base_url}{path}', data=json.dumps(request_data), timeout=self.timeout)
+            data = self._read_response(response)
+        except (requests.RequestException, ValueError, PaymentGatewayError) as e:
+            self._record_failure(operation, start_time, e)
+            raise PaymentGatewayError(str(e)) from e
 
-        request_data = {
+        self._record_success(operation, start_time)
+        return data
+
+    def _get_payment_request_data(self, rial_total_price, description, callback_url):
+        return {
             'MerchantID': self.merchant_id,
             'Amount': rial_total_price // 10,
             'Description': description,
             'CallbackURL': callback_url,
         }
 
-        response = requests.post(url=self._zarinpal_request_url, data=json.dumps(request_data), headers=request_header)
-        return response.json()
-    
-    def generate_payment_page_url(self, authority):
-        return f'{self._zarinpal_page_url}{authority}'
-    
-    def payment_verify(self, rial_total_price, authority):
-        request_header = {
-            "accept": "application/json",
-            "content-type": "application/json"
-        }
-
-        request_data = {
+    def _get_payment_verify_data(self, rial_total_price, authority):
+        return {
             'MerchantID': self.merchant_id,
             'Amount': rial_total_price // 10,
             'Authority': authority,
         }
 
-        response = requests.post(url=self._zarinpal_verify_url, data=json.dumps(request_data), headers=request_header)
-        return response.json()
+    def payment_request(self, rial_total_price, description, callback_url):
+        request_data = self._get_payment_request_data(rial_total_price, description, callback_url)
+        return self._post('payment_request', self._zarinpal_request_path, request_data)
+
+    def generate_payment_page_url(self, authority):
+        return f'{self.base_url}{self._zarinpal_page_path}{authority}'
+
+    def payment_verify(self, rial_total_price, authority):
+        """
+            verifying an authority twice is safe(zarinpal returns status 101),
+            so verify is retried with backoff when the gateway fails
+        """
+        request_data = self._get_payment_verify_data(rial_total_price, authority)
+
+        for attempt in range(settings.ZARINPAL_VERIFY_RETRIES + 1):
+            try:
+                return self._post('payment_verify', self._zarinpal_verify_path, request_data)
+            except PaymentGatewayUnavailable:
+                raise
+            except PaymentGatewayError:
+                if attempt == settings.ZARINPAL_VERIFY_RETRIES:
+                    raise
+                time.sleep(settings.ZARINPAL_VERIFY_RETRY_BACKOFF * (2 ** attempt))
+
+
+class AsyncZarinpalSandbox(ZarinpalSandbox):
+    """
+        non-blocking version of ZarinpalSandbox for async views, an in-flight
+        gateway call doesn't hold a worker, circuit breaker and metrics are
+        shared with the sync client
+    """
+
+    async def _post(self, operation, path, request_data):
+        self._check_circuit_breaker(operation)
+
+        start_time = time.perf_counter()
+        try:
+            response = await get_async_client().post(url=f'{self.base_url}{path}', content=json.dumps(request_data))
+            data = self._read_response(response)
+        except (httpx.HTTPError, ValueError, PaymentGatewayError) as e:
+            self._record_failure(operation, start_time, e)
+            raise PaymentGatewayError(str(e)) from e
+
+        self._record_success(operation, start_time)
+        return data
+
+    async def payment_request(self, rial_total_price, description, callback_url):
+        request_data = self._get_payment_request_data(rial_total_price, description, callback_url)
+        return await self._post('payment_request', self._zarinpal_request_path, request_data)
+
+    async def payment_verify(self, rial_total_price, authority):
+        request_data = self._get_payment_verify_data(rial_total_price, authority)
+
+        for attempt in range(settings.ZARINPAL_VERIFY_RETRIES + 1):
+            try:
+                return await self._post('payment_verify', self._zarinpal_verify_path, request_data)
+            except PaymentGatewayUnavailable:
+                raise
+            except PaymentGatewayError:
+                if attempt == settings.ZARINPAL_VERIFY_RETRIES:
+                    raise
+                await asyncio.sleep(settings.ZARINPAL_VERIFY_RETRY_BACKOFF * (2 ** attempt))
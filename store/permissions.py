@@ -1,10 +1,11 @@
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied
-from django.shortcuts import get_object_or_404
 from django.http import Http404
 from django.utils.translation import gettext as _
 
-from .models import Order, Seller, Product
+from .models import Seller
+from .caches import get_seller_id_of_product, get_customer_id_of_order
+from .roles import get_roles
 
 
 class IsCustomerOrSeller(permissions.BasePermission):
@@ -14,9 +15,9 @@ class IsCustomerOrSeller(permissions.BasePermission):
             return True
         elif request.user and not request.user.is_authenticated:
             return False
-        elif getattr(request.user, 'seller', False) and request.user.seller.status == Seller.SELLER_STATUS_WAITING:
+        elif get_roles(request).seller_status == Seller.SELLER_STATUS_WAITING:
             raise PermissionDenied(detail=_('Your request is under review.'))
-        elif getattr(request.user, 'seller', False) and request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED:
+        elif get_roles(request).seller_status == Seller.SELLER_STATUS_ACCEPTED:
             raise PermissionDenied(detail=_('You are currently a seller.'))
         return True
     
@@ -26,8 +27,7 @@ class IsSeller(permissions.BasePermission):
     def has_permission(self, request, view):
         return bool(
             request.user and request.user.is_authenticated and
-            getattr(request.user, 'seller', False) and 
-            request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED
+            get_roles(request).is_seller
         )
 
 
@@ -39,8 +39,7 @@ class IsSellerMe(permissions.BasePermission):
         
         return bool(
             request.user and request.user.is_authenticated and
-            getattr(request.user, 'seller', False) and 
-            request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED
+            get_roles(request).is_seller
         )
 
 
@@ -60,8 +59,7 @@ class IsAdminUserOrSeller(permissions.BasePermission):
         return bool(
             request.user and request.user.is_authenticated and
             request.user.is_staff or
-            getattr(request.user, 'seller', False) and 
-            request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED
+            get_roles(request).is_seller
         )
 
 
@@ -71,39 +69,32 @@ class IsAdminUserOrSellerOwner(permissions.BasePermission):
         return bool(
             request.user and request.user.is_authenticated and
             request.user.is_staff or
-            getattr(request.user, 'seller', False) and 
-            request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED and
-            request.user.seller == obj.seller
+            get_roles(request).is_seller and
+            get_roles(request).seller_id == obj.seller_id
         )
 
 
 class IsAdminUserOrCommentOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        user = request.user.seller if getattr(request.user, 'seller', False) and request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED \
-                                   else request.user.customer
-        print(obj.content_object)
         return bool(
             request.user and request.user.is_authenticated and
             request.user.is_staff or
             request.user and request.user.is_authenticated and
-            user == obj.content_object
+            get_roles(request).is_owner_of(obj)
         )
     
 
 class IsCommentOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        user = request.user.seller if getattr(request.user, 'seller', False) and request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED \
-                                   else request.user.customer
         return bool(
             request.user and request.user.is_authenticated and
-            user == obj.content_object
+            get_roles(request).is_owner_of(obj)
         )
     
 
 class ProductImagePermission(permissions.BasePermission):
-    product = None
 
     def has_permission(self, request, view):
         try:
@@ -111,32 +102,26 @@ class ProductImagePermission(permissions.BasePermission):
         except (ValueError, TypeError):
             raise Http404
 
-        if (not ProductImagePermission.product) or \
-        (ProductImagePermission.product and ProductImagePermission.product.pk != product_pk):
-            ProductImagePermission.product = get_object_or_404(Product, pk=product_pk)
+        seller_id = get_seller_id_of_product(product_pk, request)
+        if seller_id is None:
+            raise Http404
         
         return bool(
             request.user and request.user.is_authenticated and
             request.user.is_staff or
-            getattr(request.user, 'seller', False) and 
-            request.user.seller.status == Seller.SELLER_STATUS_ACCEPTED and
-            request.user.seller == ProductImagePermission.product.seller
+            get_roles(request).is_seller and
+            get_roles(request).seller_id == seller_id
         )
 
 class IsCustomerInfoComplete(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        fields = ['first_name', 'last_name', 'birth_date', 'gender']
-        customer = request.user.customer
-
-        for field in fields:
-            if not getattr(customer, field, False):
-                raise PermissionDenied(detail=_('To register an order, you must first complete your personal information in your profile.'))
+        if not get_roles(request).is_customer_info_complete:
+            raise PermissionDenied(detail=_('To register an order, you must first complete your personal information in your profile.'))
         return True
 
 
 class IsOrderOwner(permissions.BasePermission):
-    order = None
 
     def has_permission(self, request, view):
         try:
@@ -144,9 +129,8 @@ class IsOrderOwner(permissions.BasePermission):
         except (ValueError, TypeError):
             raise Http404
 
-        if (not IsOrderOwner.order) or \
-        (IsOrderOwner.order and IsOrderOwner.order.pk != order_pk):
-            IsOrderOwner.order = get_object_or_404(Order, pk=order_pk)
+        customer_id = get_customer_id_of_order(order_pk, request)
+        if customer_id is None:
+            raise Http404
 
-        return bool(IsOrderOwner.order.customer == request.user.customer)
-        
+        return bool(customer_id == get_roles(request).customer_id)
@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+
+from .models import Customer, Seller
+
+User = get_user_model()
+
+CUSTOMER_INFO_FIELDS = ['first_name', 'last_name', 'birth_date', 'gender']
+
+
+class Roles:
+    """
+        customer and seller of the user of a request, both are loaded
+        by one joined query on first access and are also cached on the
+        user, so request.user.customer/seller don't query again
+
+        ids and seller status are read from role claims of the user
+        (see core.authentication) when there are, without loading
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._customer = None
+        self._seller = None
+        self._loaded = not (user and user.is_authenticated)
+        self._claims = None if self._loaded else getattr(user, 'role_claims', None)
+
+    def _load(self):
+        user = self.user
+        related_fields = [field for field in ['customer', 'seller'] if not User._meta.get_field(field).is_cached(user)]
+
+        if related_fields:
+            identity = User.objects.select_related(*related_fields).get(pk=user.pk)
+            for field_name in related_fields:
+                try:
+                    related_object = getattr(identity, field_name)
+                    related_object.user = user
+                except ObjectDoesNotExist:
+                    related_object = None
+                User._meta.get_field(field_name).set_cached_value(user, related_object)
+
+        self._customer = getattr(user, 'customer', None)
+        self._seller = getattr(user, 'seller', None)
+        self._loaded = True
+
+    @property
+    def customer(self):
+        if not self._loaded:
+            self._load()
+        return self._customer
+
+    @property
+    def seller(self):
+        if not self._loaded:
+            self._load()
+        return self._seller
+
+    @property
+    def customer_id(self):
+        if self._claims is not None:
+            return self._claims['customer_id']
+        return self.customer.id if self.customer else None
+
+    @property
+    def seller_id(self):
+        if self._claims is not None:
+            return self._claims['seller_id']
+        return self.seller.id if self.seller else None
+
+    @property
+    def seller_status(self):
+        if self._claims is not None:
+            return self._claims['seller_status']
+        return self.seller.status if self.seller else None
+
+    @property
+    def is_seller(self):
+        """
+            seller whose request is accepted
+        """
+        return self.seller_status == Seller.SELLER_STATUS_ACCEPTED
+
+    @property
+    def is_customer_info_complete(self):
+        return bool(self.customer) and all(getattr(self.customer, field, False) for field in CUSTOMER_INFO_FIELDS)
+
+    @property
+    def owner(self):
+        """
+            seller or customer that comments and likes of user belong to
+        """
+        return self.seller if self.is_seller else self.customer
+
+    @property
+    def owner_model(self):
+        return Seller if self.is_seller else Customer
+
+    @property
+    def owner_id(self):
+        return self.seller_id if self.is_seller else self.customer_id
+
+    def is_owner_of(self, obj):
+        """
+            compare generic relation(content_type, object_id) of obj,
+            so content_object of obj and owner aren't loaded
+        """
+        owner_id = self.owner_id
+        if owner_id is None:
+            return False
+        return obj.object_id == owner_id and obj.content_type_id == ContentType.objects.get_for_model(self.owner_model).id
+
+
+def get_roles(request):
+    """
+        roles of request, memoized on the django request so permissions,
+        views and serializers of one request share them
+    """
+    django_request = getattr(request, '_request', request)
+    roles = getattr(django_request, '_roles', None)
+
+    if roles is None or roles.user is not request.user:
+        roles = Roles(request.user)
+        django_request._roles = roles
+    return roles
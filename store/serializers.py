@@ -5,17 +5,37 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import FileExtensionValidator
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Avg
+from django.contrib.contenttypes.models import ContentType
 
 from datetime import date, timedelta
 from types import NoneType
 from mptt.exceptions import InvalidMove
 
 from .models import Cart, CartItem, Category, Comment, Customer, Address, IncreaseWalletCredit, Menu, Order, OrderItem, Person, ProductImage, Seller, Product
+from .roles import get_roles
 
 User = get_user_model()
 
 
+class SparseFieldsMixin:
+    """
+        render only fields that are requested by ?fields=/?omit= of list
+        endpoints(`sparse_fields` of context, set by SparseFieldsetMixin of
+        views), nested serializers keep all of their fields
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse_fields = self.context.get('sparse_fields')
+        parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+
+        if sparse_fields is None or parent is not None:
+            return fields
+        return {name: field for name, field in fields.items() if name in sparse_fields or field.write_only}
+
+
 class AddressCustomerSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -40,7 +60,7 @@ class AddressSellerSerializer(serializers.ModelSerializer):
         return Address.objects.create(content_object=seller, **validated_data)
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.CharField(source='user.phone')
     age = serializers.SerializerMethodField()
 
@@ -51,7 +71,8 @@ class CustomerSerializer(serializers.ModelSerializer):
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['gender'] = instance.get_gender_display()
+        if 'gender' in representation:
+            representation['gender'] = instance.get_gender_display()
         return representation
     
     def get_age(self, customer):
@@ -113,7 +134,7 @@ class RequestSellerSerializer(serializers.ModelSerializer):
     
     def get_initial(self):
         initial_dict = super().get_initial()
-        customer = self.context.get('request').user.customer
+        customer = get_roles(self.context.get('request')).customer
         field_names = ['first_name', 'last_name', 'birth_date', 'gender']
 
         for field in field_names:
@@ -127,7 +148,7 @@ class RequestSellerSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class SellerSerializer(serializers.ModelSerializer):
+class SellerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     age = serializers.SerializerMethodField()
 
     class Meta:
@@ -137,7 +158,8 @@ class SellerSerializer(serializers.ModelSerializer):
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['gender'] = instance.get_gender_display()
+        if 'gender' in representation:
+            representation['gender'] = instance.get_gender_display()
         return representation
     
     def get_age(self, seller):
@@ -230,6 +252,22 @@ class SellerChangeStatusSerializer(serializers.ModelSerializer):
         return representation
 
 
+class BulkChangeStatusSerializer(serializers.Serializer):
+    """
+        status for items with ids or for all items that match
+        the filter criteria of the query params when ids isn't sent
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=10000)
+    status = serializers.ChoiceField(choices=[])
+
+
+class SellerBulkChangeStatusSerializer(BulkChangeStatusSerializer):
+    status = serializers.ChoiceField(choices=[
+        (Seller.SELLER_STATUS_ACCEPTED, _('Accepted')),
+        (Seller.SELLER_STATUS_REJECTED, _('Rejected'))
+    ])
+
+
 class CategorySerializer(serializers.ModelSerializer):
     sub_categories = serializers.SerializerMethodField()
 
@@ -278,34 +316,18 @@ class CategoryCreateSerializer(serializers.ModelSerializer):
         return representation
     
 
-class CommentObjectRelatedField(serializers.RelatedField):
-    """
-    A custom field to use for the `content_object` generic relationship.
-    """
-
-    def to_representation(self, instance):
-        if isinstance(instance, Customer):
-            return instance.full_name if instance.full_name else 'Unknown'
-        elif isinstance(instance, Seller):
-            return instance.company_name 
-        raise Exception('Unexpected type of comment object')
-    
-
 class ReplyCommentSerializer(serializers.ModelSerializer):
-    display_name = CommentObjectRelatedField(source='content_object', read_only=True)
-    user_type = serializers.SerializerMethodField()
+    display_name = serializers.CharField(source='author_name', read_only=True)
+    user_type = serializers.CharField(source='author_type', read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'reply_to', 'display_name', 'user_type', 'title', 'body']
-    
-    def get_user_type(self, comment):
-        return comment.content_type.model_class().__name__
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    display_name = CommentObjectRelatedField(source='content_object', read_only=True)
-    user_type = serializers.SerializerMethodField()
+    display_name = serializers.CharField(source='author_name', read_only=True)
+    user_type = serializers.CharField(source='author_type', read_only=True)
     replies = serializers.SerializerMethodField()
     count_likes = serializers.SerializerMethodField()
     count_dislikes = serializers.SerializerMethodField()
@@ -318,13 +340,10 @@ class CommentSerializer(serializers.ModelSerializer):
         }
     
     def get_replies(self, comment):
-        queryset = comment.get_descendants(include_self=False).select_related('content_type').prefetch_related('content_object')\
+        queryset = comment.get_descendants(include_self=False)\
                     .filter(status=Comment.COMMENT_STATUS_APPROVED)
         serializer = ReplyCommentSerializer(queryset, many=True)
         return serializer.data
-       
-    def get_user_type(self, comment):
-        return comment.content_type.model_class().__name__
     
     def get_count_likes(self, comment):
         return comment.likes.count()
@@ -363,17 +382,14 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 class CommentDetailSerializer(serializers.ModelSerializer):
-    display_name = CommentObjectRelatedField(source='content_object', read_only=True)
-    user_type = serializers.SerializerMethodField()
+    display_name = serializers.CharField(source='author_name', read_only=True)
+    user_type = serializers.CharField(source='author_type', read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'reply_to', 'display_name', 'user_type', 'title', 'body', 'rating']
         read_only_fields = ['reply_to', 'rating']
-    
-    def get_user_type(self, comment):
-        return comment.content_type.model_class().__name__
-   
+
 
 class ProductSellerSerializer(serializers.ModelSerializer):
 
@@ -419,7 +435,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
         return representation
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     seller = serializers.CharField(source='seller.company_name', read_only=True)
     category = CategorySerializer(read_only=True)
     status = serializers.SerializerMethodField()
@@ -441,6 +457,12 @@ class ProductSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
+class ProductCardSerializer(ProductSerializer):
+
+    class Meta(ProductSerializer.Meta):
+        fields = ['id', 'title', 'slug', 'thumbnail', 'seller', 'price', 'status']
+
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer()
     seller = ProductSellerSerializer()
@@ -457,10 +479,13 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         return 'Available' if product.inventory > 0 else 'Unavailable'
     
     def get_average_rating(self, product):
-        queryset = Comment.objects.filter(product=product, status=Comment.COMMENT_STATUS_APPROVED)
+        # replies have no rating
+        average_rating = Comment.objects.filter(
+            product=product, status=Comment.COMMENT_STATUS_APPROVED, rating__isnull=False
+        ).aggregate(average_rating=Avg('rating'))['average_rating']
 
-        if queryset.exists():
-            return round(sum([comment.rating for comment in queryset]) / queryset.count(), 1)
+        if average_rating is not None:
+            return round(average_rating, 1)
         return 0
 
 
@@ -497,7 +522,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 
         product = Product(**validated_data)
         product.slug = slugify(product.title)
-        product.seller = request.user.seller
+        product.seller = get_roles(request).seller
         product.save()
 
         product_images = []
@@ -568,16 +593,13 @@ class SellerMeProductDetailSerializer(serializers.ModelSerializer):
 
 
 class CommentListWaitingSerializer(serializers.ModelSerializer):
-    user = CommentObjectRelatedField(source='content_object', read_only=True)
-    user_type = serializers.SerializerMethodField()
+    user = serializers.CharField(source='author_name', read_only=True)
+    user_type = serializers.CharField(source='author_type', read_only=True)
     product = serializers.CharField(source='product.title')
 
     class Meta:
         model = Comment
         fields = ['id', 'product', 'user', 'user_type', 'title', 'body']
-    
-    def get_user_type(self, comment):
-        return comment.content_type.model_class().__name__
 
 
 class CommentChangeStatusSerializer(serializers.ModelSerializer):
@@ -592,6 +614,13 @@ class CommentChangeStatusSerializer(serializers.ModelSerializer):
         return representation
 
 
+class CommentBulkChangeStatusSerializer(BulkChangeStatusSerializer):
+    status = serializers.ChoiceField(choices=[
+        (Comment.COMMENT_STATUS_APPROVED, _("Approved")),
+        (Comment.COMMENT_STATUS_NOT_APPROVED, _("Not approved"))
+    ])
+
+
 class CartItemProductSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -673,6 +702,108 @@ class CartItemUpdateSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
 
+class CartItemBatchOperationSerializer(serializers.Serializer):
+    OPERATION_ADD = 'add'
+    OPERATION_UPDATE = 'update'
+    OPERATION_REMOVE = 'remove'
+    OPERATIONS = [
+        (OPERATION_ADD, _('Add')),
+        (OPERATION_UPDATE, _('Update')),
+        (OPERATION_REMOVE, _('Remove'))
+    ]
+
+    operation = serializers.ChoiceField(choices=OPERATIONS, label=_('Operation'))
+    product = serializers.IntegerField(label=_('Product'))
+    quantity = serializers.IntegerField(min_value=1, required=False, label=_('Quantity'))
+
+    def validate(self, attrs):
+        if attrs.get('operation') != self.OPERATION_REMOVE and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': _('This field is required.')})
+        return super().validate(attrs)
+
+
+class CartItemBatchSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 100
+
+    operations = serializers.ListField(child=CartItemBatchOperationSerializer(), allow_empty=False,
+                                       max_length=MAX_OPERATIONS, label=_('Operations'))
+
+    def apply_operation(self, operation, products, quantities):
+        """
+            apply operation on quantities of cart(product_id -> quantity)
+            and return error message if operation isn't valid
+        """
+        operation_type = operation.get('operation')
+        product_id = operation.get('product')
+        quantity = operation.get('quantity')
+        product = products.get(product_id)
+
+        if product is None:
+            return _("There isn't any product with id=%(product_id)d.") % {'product_id': product_id}
+
+        if operation_type == CartItemBatchOperationSerializer.OPERATION_ADD and product_id in quantities:
+            return _("This product is exist in the customer's cart.")
+        elif operation_type != CartItemBatchOperationSerializer.OPERATION_ADD and product_id not in quantities:
+            return _("This product isn't exist in the customer's cart.")
+        
+        if operation_type == CartItemBatchOperationSerializer.OPERATION_REMOVE:
+            del quantities[product_id]
+        elif quantity > product.inventory:
+            return _("You can't add product more than product's inventory(%(product_quantity)d) to your cart.") % {'product_quantity': product.inventory}
+        else:
+            quantities[product_id] = quantity
+
+    def create(self, validated_data):
+        cart_pk = self.context.get('cart_pk')
+        operations = validated_data.get('operations')
+        # out of range ids would overflow parameters of queries, their operations fail as missing products
+        min_id, max_id = connection.ops.integer_field_range(Product._meta.pk.get_internal_type())
+        product_ids = {operation.get('product') for operation in operations if min_id <= operation.get('product') <= max_id}
+
+        with transaction.atomic():
+            Cart.objects.select_for_update().get(id=cart_pk)
+
+            products = Product.objects.only('id', 'inventory').in_bulk(product_ids)
+            cart_items = {
+                cart_item.product_id: cart_item 
+                for cart_item in CartItem.objects.filter(cart_id=cart_pk, product_id__in=product_ids)
+            }
+            quantities = {product_id: cart_item.quantity for product_id, cart_item in cart_items.items()}
+
+            results = []
+            for operation in operations:
+                error = self.apply_operation(operation, products, quantities)
+                result = {
+                    'operation': operation.get('operation'),
+                    'product': operation.get('product'),
+                    'status': 'failed' if error else 'done'
+                }
+                if error:
+                    result['detail'] = error
+                elif operation.get('operation') != CartItemBatchOperationSerializer.OPERATION_REMOVE:
+                    result['quantity'] = operation.get('quantity')
+                results.append(result)
+
+            created_cart_items = []
+            updated_cart_items = []
+            for product_id, quantity in quantities.items():
+                cart_item = cart_items.get(product_id)
+                if cart_item is None:
+                    created_cart_items.append(CartItem(cart_id=cart_pk, product_id=product_id, quantity=quantity))
+                elif cart_item.quantity != quantity:
+                    cart_item.quantity = quantity
+                    updated_cart_items.append(cart_item)
+            removed_cart_item_ids = [
+                cart_item.id for product_id, cart_item in cart_items.items() if product_id not in quantities
+            ]
+
+            CartItem.objects.bulk_create(created_cart_items)
+            CartItem.objects.bulk_update(updated_cart_items, fields=['quantity'])
+            if removed_cart_item_ids:
+                CartItem.objects.filter(id__in=removed_cart_item_ids).delete()
+
+        return results
+
 
 class CartSerializer(serializers.ModelSerializer):
     customer = CustomerSerializer()
@@ -731,7 +862,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         return representation
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSerializer(read_only=True)
     created_datetime = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -744,9 +875,9 @@ class OrderSerializer(serializers.ModelSerializer):
         }
     
     def validate_address(self, address):
-        customer = self.context.get('request').user.customer
+        customer_id = get_roles(self.context.get('request')).customer_id
 
-        if not address.content_object == customer:
+        if not (address.object_id == customer_id and address.content_type_id == ContentType.objects.get_for_model(Customer).id):
             raise serializers.ValidationError(_("The address with id=%(address_id)d doesn't belong to you.")  % {'address_id': address.id})
             
         return address
@@ -767,22 +898,22 @@ class OrderSerializer(serializers.ModelSerializer):
         return delivery_date
     
     def validate(self, attrs):
-        customer = self.context.get('request').user.customer
-        cart = customer.cart
+        customer_id = get_roles(self.context.get('request')).customer_id
         
-        if CartItem.objects.filter(cart=cart).count() == 0:
+        if CartItem.objects.filter(cart__customer_id=customer_id).count() == 0:
             raise serializers.ValidationError({'detail': _('Your cart is empty, Please add some products to it first.')})
         
         return super().validate(attrs)
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['status'] = instance.get_status_display()
+        if 'status' in representation:
+            representation['status'] = instance.get_status_display()
         return representation
     
     def create(self, validated_data):
         with transaction.atomic():
-            customer = self.context.get('request').user.customer
+            customer = get_roles(self.context.get('request')).customer
             cart = customer.cart
             cart_items = cart.items.select_related('product')
 
@@ -880,7 +1011,7 @@ class IncreaseWalletCreditCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         request = self.context.get('request')
-        validated_data['customer'] = request.user.customer
+        validated_data['customer'] = get_roles(request).customer
         return super().create(validated_data)
 
 
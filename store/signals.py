@@ -1,10 +1,15 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
 
 
-from .models import CartItem, Customer, IncreaseWalletCredit, Seller, Cart, Order, OrderItem, Product
+from .models import CartItem, Category, Comment, CommentDislike, CommentLike, Customer, IncreaseWalletCredit, Menu, Seller, Cart, Order, OrderItem, Product
+from .caches import get_customer_id_of_cart, invalidate_cart_snapshot, invalidate_cart_snapshots_of_products, invalidate_seller_id_of_product
 from core.signals import superuser_created, add_user_to_staff, remove_users_from_staff
+from core.authentication import invalidate_user_auth
+from core.caches import NAMESPACE_CATEGORIES, NAMESPACE_MENUS, get_tiered_cache
 
 User = get_user_model()
 
@@ -19,37 +24,51 @@ def create_customer_for_newly_created_user(sender, instance, created, **kwargs):
 def create_seller_for_newly_created_superuser(sender, instance, national_code, **kwargs):
     Seller.objects.create(user=instance, company_name='Mix shop', national_code=national_code, status=Seller.SELLER_STATUS_ACCEPTED)
 
+
+def reassign_comments_owner(from_model, from_id, to_owner):
+    """
+        move comments, comment likes and comment dislikes of an owner(customer
+        or seller) to another owner by one UPDATE per table in one transaction
+    """
+    from_content_type = ContentType.objects.get_for_model(from_model)
+    to_content_type = ContentType.objects.get_for_model(type(to_owner))
+
+    with transaction.atomic():
+        for model in [Comment, CommentLike, CommentDislike]:
+            fields = {'content_type': to_content_type, 'object_id': to_owner.id}
+            if model is Comment:
+                fields['author_name'] = to_owner.display_name
+            model.objects.filter(content_type=from_content_type, object_id=from_id).update(**fields)
+
+
 @receiver(pre_save, sender=Seller)
-def change_type_user_when_update_seller_for_comments(sender, instance, **kwargs):
+def reassign_comments_when_update_seller_status(sender, instance, **kwargs):
     if instance.id:
-        customer_instance = instance.user.customer
-        previous_instance = Seller.objects.get(id=instance.id)
-        if instance.status != previous_instance.status:
-            if previous_instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                comments = [comment for comment in instance.comments.all()]
-            elif previous_instance.status == Seller.SELLER_STATUS_WAITING:
-                comments = [comment for comment in customer_instance.comments.all()]
+        previous_status = Seller.objects.filter(id=instance.id).values_list('status', flat=True).first()
+        if previous_status is None or instance.status == previous_status:
+            return
 
-            if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                for comment in comments:
-                    comment.content_object = instance
-                    comment.save()
-            elif instance.status == Seller.SELLER_STATUS_WAITING:
-                for comment in comments:
-                    comment.content_object = customer_instance
-                    comment.save()
+        if previous_status == Seller.SELLER_STATUS_WAITING and instance.status == Seller.SELLER_STATUS_ACCEPTED:
+            customer_id = Customer.objects.filter(user_id=instance.user_id).values_list('id', flat=True).first()
+            reassign_comments_owner(Customer, customer_id, instance)
+        elif previous_status == Seller.SELLER_STATUS_ACCEPTED and instance.status == Seller.SELLER_STATUS_WAITING:
+            reassign_comments_owner(Seller, instance.id, Customer.objects.get(user_id=instance.user_id))
 
 
 @receiver(post_save, sender=Seller)
-def change_type_user_after_create_seller_for_comments(sender, instance, created, **kwargs):
-    if created:
-        customer_instance = instance.user.customer
-        comments = [comment for comment in customer_instance.comments.all()]
+def reassign_comments_after_create_accepted_seller(sender, instance, created, **kwargs):
+    if created and instance.status == Seller.SELLER_STATUS_ACCEPTED:
+        customer_id = Customer.objects.filter(user_id=instance.user_id).values_list('id', flat=True).first()
+        reassign_comments_owner(Customer, customer_id, instance)
+
 
-        if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-            for comment in comments:
-                    comment.content_object = instance
-                    comment.save()
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Seller)
+def update_author_name_of_comments_based_on_change_owner(sender, instance, created, update_fields=None, **kwargs):
+    if not created and not (update_fields and set(update_fields) == {'wallet_amount'}):
+        Comment.objects.filter(
+            content_type=ContentType.objects.get_for_model(sender), object_id=instance.id
+        ).exclude(author_name=instance.display_name).update(author_name=instance.display_name)
 
 
 @receiver(add_user_to_staff)
@@ -65,72 +84,6 @@ def remove_users_from_seller(sender, queryset, **kwargs):
             seller.delete()
 
 
-@receiver(pre_save, sender=Seller)
-def change_type_user_when_update_seller_for_comment_likes(sender, instance, **kwargs):
-    if instance.id:
-        customer_instance = instance.user.customer
-        previous_instance = Seller.objects.get(id=instance.id)
-        if instance.status != previous_instance.status:
-            if previous_instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                comment_likes = [comment_like for comment_like in instance.comment_likes.all()]
-            elif previous_instance.status == Seller.SELLER_STATUS_WAITING:
-                comment_likes = [comment_like for comment_like in customer_instance.comment_likes.all()]
-
-            if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                for comment_like in comment_likes:
-                    comment_like.content_object = instance
-                    comment_like.save()
-            elif instance.status == Seller.SELLER_STATUS_WAITING:
-                for comment_like in comment_likes:
-                    comment_like.content_object = customer_instance
-                    comment_like.save()
-
-
-@receiver(post_save, sender=Seller)
-def change_type_user_after_create_seller_for_comment_likes(sender, instance, created, **kwargs):
-    if created:
-        customer_instance = instance.user.customer
-        comment_likes = [comment_like for comment_like in customer_instance.comment_likes.all()]
-
-        if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-            for comment_like in comment_likes:
-                    comment_like.content_object = instance
-                    comment_like.save()
-
-
-@receiver(pre_save, sender=Seller)
-def change_type_user_when_update_seller_for_comment_dislikes(sender, instance, **kwargs):
-    if instance.id:
-        customer_instance = instance.user.customer
-        previous_instance = Seller.objects.get(id=instance.id)
-        if instance.status != previous_instance.status:
-            if previous_instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                comment_dislikes = [comment_dislike for comment_dislike in instance.comment_dislikes.all()]
-            elif previous_instance.status == Seller.SELLER_STATUS_WAITING:
-                comment_dislikes = [comment_dislike for comment_dislike in customer_instance.comment_dislikes.all()]
-
-            if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-                for comment_dislike in comment_dislikes:
-                    comment_dislike.content_object = instance
-                    comment_dislike.save()
-            elif instance.status == Seller.SELLER_STATUS_WAITING:
-                for comment_dislike in comment_dislikes:
-                    comment_dislike.content_object = customer_instance
-                    comment_dislike.save()
-
-
-@receiver(post_save, sender=Seller)
-def change_type_user_after_create_seller_for_comment_dislikes(sender, instance, created, **kwargs):
-    if created:
-        customer_instance = instance.user.customer
-        comment_dislikes = [comment_like for comment_like in customer_instance.comment_dislikes.all()]
-
-        if instance.status == Seller.SELLER_STATUS_ACCEPTED:
-            for comment_like in comment_dislikes:
-                    comment_like.content_object = instance
-                    comment_like.save()
-
-
 @receiver(post_save, sender=Seller)
 def remove_seller_when_status_change_to_rejected(sender, instance, created, **kwargs):
     if not created and instance.status == Seller.SELLER_STATUS_REJECTED:
@@ -196,12 +149,16 @@ def change_products_inventory_based_on_change_order_status(sender, instance, **k
                 order_item.product.inventory -= order_item.quantity
                 products.append(order_item.product)
             Product.objects.bulk_update(products, fields=['inventory'])
+            product_ids = [product.id for product in products]
+            transaction.on_commit(lambda: invalidate_cart_snapshots_of_products(product_ids))
         elif previous_instance.status == Order.ORDER_STATUS_PAID and instance.status in [Order.ORDER_STATUS_UNPAID, Order.ORDER_STATUS_CANCELED]:
             products = []
             for order_item in instance.items.select_related('product'):
                 order_item.product.inventory += order_item.quantity
                 products.append(order_item.product)
             Product.objects.bulk_update(products, fields=['inventory'])
+            product_ids = [product.id for product in products]
+            transaction.on_commit(lambda: invalidate_cart_snapshots_of_products(product_ids))
 
 
 @receiver(pre_save, sender=IncreaseWalletCredit)
@@ -240,4 +197,62 @@ def change_amount_of_wallet_customer_based_on_payment_method_wallet(sender, inst
             customer = instance.customer
 
             customer.wallet_amount += previous_instance.get_total_price()
-            customer.save(update_fields=['wallet_amount'])
\ No newline at end of file
+            customer.save(update_fields=['wallet_amount'])
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_snapshot_based_on_change_cart_items(sender, instance, **kwargs):
+    customer_id = get_customer_id_of_cart(instance.cart_id)
+    if customer_id is not None:
+        # after commit so a cart that is built meanwhile can't read the old items with the new version
+        transaction.on_commit(lambda: invalidate_cart_snapshot(customer_id))
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_cart_snapshot_based_on_change_customer(sender, instance, created, update_fields=None, **kwargs):
+    if not created and not (update_fields and set(update_fields) == {'wallet_amount'}):
+        customer_id = instance.id
+        transaction.on_commit(lambda: invalidate_cart_snapshot(customer_id))
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_cart_snapshots_based_on_change_product(sender, instance, **kwargs):
+    if instance.id:
+        previous_values = Product.objects.filter(id=instance.id).values_list('title', 'price', 'inventory').first()
+        if previous_values != (instance.title, instance.price, instance.inventory):
+            # after commit so a cart that is built meanwhile can't read the old product with the new version
+            transaction.on_commit(lambda: invalidate_cart_snapshots_of_products([instance.id]))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_seller_id_of_product_based_on_change_product(sender, instance, created=False, update_fields=None, **kwargs):
+    if not created and not (update_fields and set(update_fields) == {'viewer'}):
+        invalidate_seller_id_of_product(instance.id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories_namespace_based_on_change_category(sender, instance, **kwargs):
+    # after commit, so no process rebuilds the namespace from uncommitted data
+    transaction.on_commit(lambda: get_tiered_cache().bump_version(NAMESPACE_CATEGORIES))
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+def invalidate_menus_namespace_based_on_change_menu(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_tiered_cache().bump_version(NAMESPACE_MENUS))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_based_on_change_user(sender, instance, created=False, update_fields=None, **kwargs):
+    if not created and not (update_fields and set(update_fields) == {'last_login'}):
+        invalidate_user_auth(instance.id)
+
+
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+def invalidate_user_auth_based_on_change_seller(sender, instance, **kwargs):
+    invalidate_user_auth(instance.user_id)
@@ -1,3 +1,847 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
-# Create your tests here.
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from core.authentication import ClaimsRefreshToken
+from core.caches import get_tiered_cache
+from core.instrumentation import QueryBudgetTestMixin
+from core.throttles import ProductAnonThrottle, ProductUserThrottle, get_throttle_store
+from .idempotency import IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_LOCK_KEY, IDEMPOTENCY_REPLAYED_HEADER, get_idempotency_scope
+from .models import CartItem, Category, Comment, CommentDislike, CommentLike, Customer, IncreaseWalletCredit, Menu, Product, ProductImage, Seller
+from .payment import CircuitBreaker, PaymentGatewayError, PaymentGatewayUnavailable, ZarinpalSandbox
+from .zarinpal_stub import start_stub_server
+
+User = get_user_model()
+
+
+def get_authorization(user):
+    return f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'
+
+
+def create_seller(phone, status=Seller.SELLER_STATUS_ACCEPTED):
+    user = User.objects.create_user(phone=phone, password='password')
+    return Seller.objects.create(user=user, company_name=f'company {phone}', national_code=f'1{phone[2:]}0', status=status)
+
+
+def create_product(seller, category, title='product', price=1000, inventory=10):
+    return Product.objects.create(
+        title=title, slug=title.replace(' ', '-'), seller=seller, category=category,
+        description='description', price=price, inventory=inventory
+    )
+
+
+# tests run in one process, so its locmem cache is shared like the cache of production
+@override_settings(QUERY_INSTRUMENTATION=True, PROCESS_LOCAL_CACHE_BACKENDS=[])
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """
+        endpoints of QUERY_BUDGETS don't execute more queries than their budget
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+        customer = cls.user.customer
+        customer.first_name = 'first'
+        customer.last_name = 'last'
+        customer.birth_date = date(2000, 1, 1)
+        customer.gender = 'm'
+        customer.save()
+
+        seller_user = User.objects.create_user(phone='09122222222', password='password')
+        seller = Seller.objects.create(user=seller_user, company_name='company', national_code='0499370899', status=Seller.SELLER_STATUS_ACCEPTED)
+        category = Category.objects.create(title='category')
+        sub_category = Category.objects.create(title='sub category', sub_category=category)
+        cls.products = [
+            Product.objects.create(
+                title=f'product {i}', slug=f'product-{i}', seller=seller, category=[category, sub_category][i % 2],
+                description='description', price=1000 * (i + 1), inventory=i
+            )
+            for i in range(10)
+        ]
+        for product in cls.products[:5]:
+            ProductImage.objects.create(product=product, image='product_images/image.jpg', name='image')
+
+    def setUp(self):
+        cache.clear()
+        get_tiered_cache().clear_local()
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.user))
+
+    def test_menu_list(self):
+        # namespace of menus is bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            root = Menu.objects.create(title='root', url='/')
+            for i in range(5):
+                Menu.objects.create(title=f'menu {i}', url=f'/menu-{i}/', sub_menu=root)
+
+        response = self.client.get('/store/menus/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results'][0]['sub_menus']), 5)
+        self.assertQueryBudget(response)
+
+    def test_customer_me(self):
+        response = self.client.get('/store/customers/me/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'first')
+        self.assertQueryBudget(response)
+
+    def test_product_batch(self):
+        ids = [product.id for product in reversed(self.products)] + [0]
+        response = self.client.get('/store/products/batch/', {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card['id'] for card in response.data['results']], ids[:-1])
+        self.assertEqual(response.data['missing'], [0])
+        self.assertQueryBudget(response)
+
+    def test_product_batch_out_of_range_ids(self):
+        ids = [self.products[0].id, 2 ** 63, -2 ** 63 - 1]
+        response = self.client.get('/store/products/batch/', {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card['id'] for card in response.data['results']], ids[:1])
+        self.assertEqual(response.data['missing'], ids[1:])
+        self.assertQueryBudget(response)
+
+
+class WalletCreditCallbackTests(APITestCase):
+    """
+        callback of wallet credit only finds credits of requesting customer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(phone='09111111111', password='password')
+        cls.other = User.objects.create_user(phone='09122222222', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.credit = IncreaseWalletCredit.objects.create(customer=self.owner.customer, amount=10000, zarinpal_authority='A0001')
+
+    def test_callback_of_credit_of_another_customer(self):
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.other))
+        response = self.client.get('/store/wallet-credits/callback/', {'Status': 'NOK', 'Authority': 'A0001'})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(IncreaseWalletCredit.objects.filter(id=self.credit.id).exists())
+
+    def test_unsuccessful_callback_deletes_credit_of_customer(self):
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.owner))
+        response = self.client.get('/store/wallet-credits/callback/', {'Status': 'NOK', 'Authority': 'A0001'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IncreaseWalletCredit.objects.filter(id=self.credit.id).exists())
+
+
+class CartSnapshotTests(APITestCase):
+    """
+        snapshot of carts/me is invalidated once changes are committed
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+        cls.product = create_product(create_seller('09122222222'), Category.objects.create(title='category'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.user))
+
+    def get_cart(self):
+        response = self.client.get('/store/carts/me/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_change_of_cart_items(self):
+        self.assertEqual(self.get_cart()['items'], [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            cart_item = CartItem.objects.create(cart=self.user.customer.cart, product=self.product, quantity=2)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.get_cart()['total_price'], 2000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cart_item.delete()
+        self.assertEqual(self.get_cart()['items'], [])
+
+    def test_change_of_customer(self):
+        self.get_cart()
+
+        customer = self.user.customer
+        customer.first_name = 'first'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            customer.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.get_cart()['customer']['first_name'], 'first')
+
+    def test_change_of_product(self):
+        CartItem.objects.create(cart=self.user.customer.cart, product=self.product, quantity=2)
+        self.assertEqual(self.get_cart()['total_price'], 2000)
+
+        self.product.price = 3000
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.get_cart()['total_price'], 6000)
+
+
+class CartItemBatchTests(APITestCase):
+    """
+        operations of carts/me/items/batch are applied in order and each of them has its own result
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+        seller = create_seller('09122222222')
+        category = Category.objects.create(title='category')
+        cls.products = [create_product(seller, category, title=f'product {i}', inventory=5) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.user))
+        self.cart = self.user.customer.cart
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=1)
+
+    def batch(self, operations):
+        return self.client.post('/store/carts/me/items/batch/', {'operations': operations}, format='json')
+
+    def get_quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_results_of_operations(self):
+        first, second, third = [product.id for product in self.products]
+        response = self.batch([
+            {'operation': 'add', 'product': second, 'quantity': 2},
+            {'operation': 'update', 'product': first, 'quantity': 3},
+            {'operation': 'add', 'product': first, 'quantity': 1},
+            {'operation': 'remove', 'product': third},
+            {'operation': 'update', 'product': second, 'quantity': 6},
+            {'operation': 'remove', 'product': first},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['done', 'done', 'failed', 'failed', 'failed', 'done']
+        )
+        self.assertEqual(response.data['results'][0]['quantity'], 2)
+        self.assertEqual(self.get_quantities(), {second: 2})
+
+    def test_missing_products(self):
+        missing_ids = [Product.objects.latest('id').id + 1, 2 ** 70, -2 ** 70]
+        response = self.batch([{'operation': 'add', 'product': product_id, 'quantity': 1} for product_id in missing_ids])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['product'] for result in response.data['results']], missing_ids)
+        self.assertEqual({result['status'] for result in response.data['results']}, {'failed'})
+        self.assertEqual(self.get_quantities(), {self.products[0].id: 1})
+
+    def test_invalid_operations(self):
+        self.assertEqual(self.batch([{'operation': 'add', 'product': 'product', 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.batch([{'operation': 'add', 'product': self.products[1].id}]).status_code, 400)
+        self.assertEqual(self.batch([{'operation': 'move', 'product': self.products[1].id, 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.get_quantities(), {self.products[0].id: 1})
+
+
+@patch('store.views.AsyncZarinpalSandbox.payment_request', new_callable=AsyncMock, return_value={'Authority': 'A0001'})
+class IdempotencyTests(APITestCase):
+    """
+        requests with the same Idempotency-Key are executed once per user
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+        cls.other = User.objects.create_user(phone='09122222222', password='password')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_credit(self, user, amount=10000, idempotency_key='key'):
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(user))
+        return self.client.post('/store/wallet-credits/', {'amount': amount}, headers={IDEMPOTENCY_KEY_HEADER: idempotency_key})
+
+    def test_retry_replays_response(self, payment_request):
+        response = self.create_credit(self.user)
+        replayed_response = self.create_credit(self.user)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(replayed_response.status_code, 302)
+        self.assertEqual(replayed_response['Location'], response['Location'])
+        self.assertEqual(replayed_response[IDEMPOTENCY_REPLAYED_HEADER], 'true')
+        self.assertNotIn(IDEMPOTENCY_REPLAYED_HEADER, response)
+        self.assertEqual(payment_request.await_count, 1)
+        self.assertEqual(IncreaseWalletCredit.objects.count(), 1)
+
+    def test_keys_are_per_user(self, payment_request):
+        self.create_credit(self.user)
+        response = self.create_credit(self.other)
+
+        self.assertNotIn(IDEMPOTENCY_REPLAYED_HEADER, response)
+        self.assertEqual(IncreaseWalletCredit.objects.count(), 2)
+
+    def test_key_of_another_request(self, payment_request):
+        self.create_credit(self.user)
+        response = self.create_credit(self.user, amount=20000)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(IncreaseWalletCredit.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_key_in_progress(self, payment_request):
+        request = SimpleNamespace(user=self.user, method='POST', path='/store/wallet-credits/')
+        cache.set(IDEMPOTENCY_LOCK_KEY.format(scope=get_idempotency_scope(request, 'key')), 'fingerprint', 60)
+
+        response = self.create_credit(self.user)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(IncreaseWalletCredit.objects.exists())
+
+    def test_long_key(self, payment_request):
+        response = self.create_credit(self.user, idempotency_key='k' * 256)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IncreaseWalletCredit.objects.exists())
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """
+        circuit opens after consecutive failures, lets one trial call through
+        after recovery timeout and is closed or reopened by result of trial
+    """
+
+    def setUp(self):
+        self.circuit_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+
+    def open(self):
+        for _ in range(self.circuit_breaker.failure_threshold):
+            self.circuit_breaker.record_failure()
+
+    def pass_recovery_timeout(self):
+        self.circuit_breaker._opened_at -= self.circuit_breaker.recovery_timeout
+
+    def test_open_after_consecutive_failures(self):
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_success()
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_CLOSED)
+        self.assertTrue(self.circuit_breaker.allow_request())
+
+        self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_OPEN)
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.open()
+        self.pass_recovery_timeout()
+
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_HALF_OPEN)
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+    def test_success_of_trial_closes(self):
+        self.open()
+        self.pass_recovery_timeout()
+        self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_success()
+
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_CLOSED)
+        self.assertTrue(self.circuit_breaker.allow_request())
+        self.assertTrue(self.circuit_breaker.allow_request())
+
+    def test_failure_of_trial_reopens(self):
+        self.open()
+        self.pass_recovery_timeout()
+        self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_failure()
+
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_OPEN)
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+
+class PaymentGatewayTests(APITestCase):
+    """
+        calls to the gateway fail fast while circuit breaker is open
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.server = start_stub_server(failure_rate=1)
+        self.circuit_breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+        patcher = patch('store.payment.circuit_breaker', self.circuit_breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def payment_request(self):
+        return ZarinpalSandbox('merchant', base_url=self.server.url).payment_request(10000, 'description', 'http://testserver/')
+
+    def test_failures_open_circuit(self):
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayError):
+                self.payment_request()
+
+        self.server.failure_rate = 0
+        with self.assertRaises(PaymentGatewayUnavailable):
+            self.payment_request()
+
+        self.circuit_breaker._opened_at -= self.circuit_breaker.recovery_timeout
+        self.assertEqual(self.payment_request()['Status'], 100)
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_CLOSED)
+
+    @override_settings(ZARINPAL_VERIFY_RETRIES=2, ZARINPAL_VERIFY_RETRY_BACKOFF=0)
+    def test_retries_of_verify_stop_when_circuit_opens(self):
+        with self.assertRaises(PaymentGatewayUnavailable):
+            ZarinpalSandbox('merchant', base_url=self.server.url).payment_verify(10000, 'A0001')
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.STATE_OPEN)
+
+    def test_wallet_credit_when_circuit_is_open(self):
+        for _ in range(2):
+            self.circuit_breaker.record_failure()
+
+        self.client.credentials(HTTP_AUTHORIZATION=get_authorization(self.user))
+        response = self.client.post('/store/wallet-credits/', {'amount': 10000})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(IncreaseWalletCredit.objects.exists())
+
+
+class ProductThrottleTests(APITestCase):
+    """
+        products are throttled per user for authenticated requests and per ip for the others
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(phone='09111111111', password='password')
+        cls.other = User.objects.create_user(phone='09122222222', password='password')
+
+    def setUp(self):
+        cache.clear()
+        get_throttle_store().clear()
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'products_anon': '2/min', 'products_user': '3/min'}
+        settings_override = override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_ident_keys(self, user):
+        django_request = APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        django_request.user = user
+        request = Request(django_request)
+        return ProductUserThrottle().get_ident_key(request, None), ProductAnonThrottle().get_ident_key(request, None)
+
+    def get_products(self, user=None):
+        self.client.force_authenticate(user)
+        return self.client.get('/store/products/').status_code
+
+    def test_ident_keys(self):
+        self.assertEqual(self.get_ident_keys(self.user), (self.user.pk, None))
+        self.assertEqual(self.get_ident_keys(AnonymousUser()), (None, '10.0.0.1'))
+
+    def test_limits(self):
+        self.assertEqual([self.get_products(self.user) for _ in range(4)], [200, 200, 200, 429])
+        self.assertEqual(self.get_products(self.other), 200)
+        self.assertEqual([self.get_products() for _ in range(3)], [200, 200, 429])
+
+
+class SellerCommentReassignmentTests(TestCase):
+    """
+        comments, likes and dislikes of a user move to its seller when seller is
+        accepted and back to its customer when seller is waiting again
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product(create_seller('09122222222'), Category.objects.create(title='category'))
+        cls.other_customer = User.objects.create_user(phone='09133333333', password='password').customer
+        cls.other_comment = Comment.objects.create(content_object=cls.other_customer, product=cls.product, body='body', rating=3)
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone='09111111111', password='password')
+        self.customer = self.user.customer
+        self.customer.first_name = 'first'
+        self.customer.save()
+
+        self.comment = Comment.objects.create(content_object=self.customer, product=self.product, body='body', rating=5)
+        CommentLike.objects.create(content_object=self.customer, comment=self.other_comment)
+        CommentDislike.objects.create(content_object=self.customer, comment=self.comment)
+
+    def assertOwner(self, owner):
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.content_object, owner)
+        self.assertEqual(self.comment.author_name, owner.display_name)
+        for model in [Comment, CommentLike, CommentDislike]:
+            self.assertEqual(model.objects.filter(content_type__model=type(owner).__name__.lower(), object_id=owner.id).count(), 1)
+        self.other_comment.refresh_from_db()
+        self.assertEqual(self.other_comment.content_object, self.other_customer)
+
+    def test_accept_and_revert_seller(self):
+        seller = Seller.objects.create(user=self.user, company_name='shop', national_code='1111111111')
+        self.assertOwner(self.customer)
+
+        seller.status = Seller.SELLER_STATUS_ACCEPTED
+        seller.save()
+        self.assertOwner(seller)
+
+        seller.status = Seller.SELLER_STATUS_WAITING
+        seller.save()
+        self.assertOwner(Customer.objects.get(id=self.customer.id))
+
+    def test_create_accepted_seller(self):
+        seller = Seller.objects.create(user=self.user, company_name='shop', national_code='1111111111', status=Seller.SELLER_STATUS_ACCEPTED)
+        self.assertOwner(seller)
+
+    def get_queries_of_accepting_seller(self, phone, comments):
+        user = User.objects.create_user(phone=phone, password='password')
+        for _ in range(comments):
+            Comment.objects.create(content_object=user.customer, product=self.product, body='body', rating=5)
+        seller = Seller.objects.create(user=user, company_name='shop', national_code=f'1{phone[2:]}0')
+
+        seller.status = Seller.SELLER_STATUS_ACCEPTED
+        with CaptureQueriesContext(connection) as queries:
+            seller.save()
+        self.assertEqual(Comment.objects.filter(content_type__model='seller', object_id=seller.id).count(), comments)
+        return len(queries)
+
+    def test_queries_of_reassignment_are_constant(self):
+        self.assertEqual(self.get_queries_of_accepting_seller('09144444444', 1), self.get_queries_of_accepting_seller('09155555555', 6))
+
+
+class CommentPathTests(TestCase):
+    """
+        replies of comments are kept by materialized path
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product(create_seller('09122222222'), Category.objects.create(title='category'))
+        cls.customer = User.objects.create_user(phone='09111111111', password='password').customer
+
+    def setUp(self):
+        self.root = self.create_comment(rating=5)
+        self.reply = self.create_comment(reply_to=self.root)
+        self.reply_of_reply = self.create_comment(reply_to=self.reply)
+        self.other_root = self.create_comment(rating=3)
+
+    def create_comment(self, **fields):
+        return Comment.objects.create(content_object=self.customer, product=self.product, body='body', **fields)
+
+    def get_path(self, *comments):
+        return ''.join(str(comment.id).zfill(Comment.PATH_STEP) for comment in comments)
+
+    def test_path(self):
+        self.assertEqual(self.root.path, '')
+        self.assertEqual(self.reply.path, self.get_path(self.root))
+        self.assertEqual(self.reply_of_reply.path, self.get_path(self.root, self.reply))
+        self.assertEqual(list(self.root.get_descendants(include_self=True)), [self.root, self.reply, self.reply_of_reply])
+
+    def test_move(self):
+        self.reply.reply_to = self.other_root
+        self.reply.save()
+
+        self.reply_of_reply.refresh_from_db()
+        self.assertEqual(self.reply_of_reply.path, self.get_path(self.other_root, self.reply))
+        self.assertEqual(list(self.root.get_descendants()), [])
+        self.assertEqual(list(self.other_root.get_descendants()), [self.reply, self.reply_of_reply])
+
+    def test_delete(self):
+        self.reply.delete()
+
+        self.assertEqual(list(Comment.objects.thread_order()), [self.root, self.other_root])
+
+    def test_too_deep(self):
+        comment = self.root
+        while len(comment.descendants_path) <= Comment.PATH_MAX_LENGTH:
+            comment = self.create_comment(reply_to=comment)
+
+        with self.assertRaisesMessage(ValidationError, gettext("The replies of this comment are too deep.")):
+            Comment(content_object=self.customer, product=self.product, body='body', reply_to=comment).clean()
+
+    def test_reply_to_itself_or_its_replies(self):
+        for reply_to in [self.reply, self.reply_of_reply]:
+            self.reply.reply_to = reply_to
+            with self.assertRaisesMessage(ValidationError, gettext("A comment cannot be a reply to itself or its replies.")):
+                self.reply.clean()
+
+
+class BulkModerationTestMixin:
+    url = None
+
+    @classmethod
+    def create_admin(cls):
+        admin = User.objects.create_user(phone='09100000000', password='password')
+        admin.is_staff = True
+        admin.save()
+        return admin
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.admin)
+
+    def change_status(self, data, query_params=''):
+        return self.client.post(f'{self.url}{query_params}', data, format='json')
+
+    def test_without_ids_and_filter_criteria(self):
+        response = self.change_status({'status': self.accepted_status})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_admin(self):
+        self.client.force_authenticate(User.objects.create_user(phone='09199999999', password='password'))
+        response = self.change_status({'status': self.accepted_status, 'ids': [1]})
+        self.assertEqual(response.status_code, 403)
+
+
+class CommentBulkModerationTests(BulkModerationTestMixin, APITestCase):
+    """
+        waiting comments are approved or rejected by ids or by filter criteria
+    """
+    url = '/store/list-waiting-comments/bulk-change-status/'
+    accepted_status = Comment.COMMENT_STATUS_APPROVED
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls.create_admin()
+        seller = create_seller('09122222222')
+        category = Category.objects.create(title='category')
+        cls.products = [create_product(seller, category, title=f'product {i}') for i in range(2)]
+        cls.customer = User.objects.create_user(phone='09111111111', password='password').customer
+
+    def create_comment(self, product, status=Comment.COMMENT_STATUS_WAITING, **fields):
+        return Comment.objects.create(content_object=self.customer, product=product, body='body', status=status, **fields)
+
+    def test_approve_by_ids(self):
+        comments = [self.create_comment(self.products[0]) for _ in range(3)]
+        rejected_comment = self.create_comment(self.products[0], status=Comment.COMMENT_STATUS_NOT_APPROVED, rating=1)
+
+        response = self.change_status({'status': Comment.COMMENT_STATUS_APPROVED, 'ids': [comments[0].id, comments[1].id, rejected_comment.id]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            dict(Comment.objects.values_list('id', 'status')),
+            {comments[0].id: 'a', comments[1].id: 'a', comments[2].id: 'w', rejected_comment.id: 'na'}
+        )
+
+    def test_reject_by_filter_criteria(self):
+        comment = self.create_comment(self.products[0], rating=5)
+        reply = self.create_comment(self.products[0], status=Comment.COMMENT_STATUS_APPROVED, reply_to=comment)
+        other_comment = self.create_comment(self.products[1], rating=5)
+
+        response = self.change_status({'status': Comment.COMMENT_STATUS_NOT_APPROVED}, f'?product={self.products[0].id}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse(Comment.objects.filter(id__in=[comment.id, reply.id]).exists())
+        self.assertTrue(Comment.objects.filter(id=other_comment.id).exists())
+
+
+class SellerBulkModerationTests(BulkModerationTestMixin, APITestCase):
+    """
+        waiting sellers are accepted or rejected by ids or by filter criteria,
+        comments of accepted sellers move to them
+    """
+    url = '/store/list-requests/bulk-change-status/'
+    accepted_status = Seller.SELLER_STATUS_ACCEPTED
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls.create_admin()
+        cls.product = create_product(create_seller('09122222222'), Category.objects.create(title='category'))
+
+    def create_waiting_seller(self, phone, gender=''):
+        seller = create_seller(phone, status=Seller.SELLER_STATUS_WAITING)
+        seller.gender = gender
+        seller.save()
+        return seller
+
+    def test_accept_by_ids(self):
+        sellers = [self.create_waiting_seller(f'0913000000{i}') for i in range(3)]
+        comment = Comment.objects.create(content_object=sellers[0].user.customer, product=self.product, body='body', rating=5)
+        like = CommentLike.objects.create(content_object=sellers[0].user.customer, comment=comment)
+
+        response = self.change_status({'status': Seller.SELLER_STATUS_ACCEPTED, 'ids': [sellers[0].id, sellers[1].id]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            dict(Seller.objects.filter(id__in=[seller.id for seller in sellers]).values_list('id', 'status')),
+            {sellers[0].id: 'a', sellers[1].id: 'a', sellers[2].id: 'w'}
+        )
+        comment.refresh_from_db()
+        like.refresh_from_db()
+        self.assertEqual((comment.content_object, comment.author_name), (sellers[0], sellers[0].company_name))
+        self.assertEqual(like.content_object, sellers[0])
+
+    def test_reject_by_filter_criteria(self):
+        male_seller = self.create_waiting_seller('09130000001', gender='m')
+        female_seller = self.create_waiting_seller('09130000002', gender='f')
+
+        response = self.change_status({'status': Seller.SELLER_STATUS_REJECTED}, '?gender=m')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(Seller.objects.filter(id=male_seller.id).exists())
+        self.assertTrue(Seller.objects.filter(id=female_seller.id).exists())
+
+
+class MenuETagTests(APITestCase):
+    """
+        pages of menus have a strong etag and are 304 while menus don't change
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_tiered_cache().clear_local()
+        patcher = patch('store.menus._compiled_menu', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.root = self.create_menu('root')
+        self.create_menu('sub menu', sub_menu=self.root)
+
+    def create_menu(self, title, **fields):
+        # namespace of menus is bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return Menu.objects.create(title=title, url=f'/{title}/', **fields)
+
+    def get_menus(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/store/menus/', params, **headers)
+
+    def test_not_modified(self):
+        response = self.get_menus()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['sub_menus'][0]['title'], 'sub menu')
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            not_modified = self.get_menus(etag=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.content, b'')
+
+    def test_change_of_menus(self):
+        etag = self.get_menus()['ETag']
+        self.create_menu('new root')
+
+        response = self.get_menus(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['title'], 'new root')
+
+    def test_etag_of_pages(self):
+        self.create_menu('new root')
+        etag = self.get_menus()['ETag']
+
+        response = self.get_menus(etag=etag, limit=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.get_menus(etag=response['ETag'], limit=1).status_code, 304)
+
+
+class SparseFieldsetTests(APITestCase):
+    """
+        lists render only fields of ?fields= and ?omit=, unknown fields are 400
+    """
+    urls = ['/store/products/', '/store/customers/', '/store/sellers/', '/store/orders/']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(phone='09100000000', password='password')
+        cls.admin.is_staff = True
+        cls.admin.save()
+        create_product(create_seller('09122222222'), Category.objects.create(title='category'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.admin)
+
+    def test_fields_and_omit(self):
+        response = self.client.get('/store/products/', {'fields': 'id,title,price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'title', 'price'])
+
+        response = self.client.get('/store/products/', {'fields': 'id,title,price', 'omit': 'price'})
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'title'])
+
+    def test_unknown_fields(self):
+        for url in self.urls:
+            for param in ['fields', 'omit']:
+                with self.subTest(url=url, param=param):
+                    response = self.client.get(url, {param: 'id,unknown,other'})
+
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data['detail'], gettext('Unknown fields: %(fields)s.') % {'fields': 'other, unknown'})
+
+
+class ProductBatchTests(APITestCase):
+    """
+        cards of products of ?ids= in order of ids, without duplicates and
+        with missing ids
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = create_seller('09122222222')
+        category = Category.objects.create(title='category')
+        cls.products = [create_product(seller, category, title=f'product {i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def get_batch(self, ids):
+        return self.client.get('/store/products/batch/', {'ids': ids})
+
+    def test_order_and_duplicates(self):
+        first, second, third = (product.id for product in self.products)
+        missing_id = third + 100
+        response = self.get_batch(f'{third}, {first},{missing_id},{third},{second},')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card['id'] for card in response.data['results']], [third, first, second])
+        self.assertEqual(response.data['results'][0]['title'], 'product 2')
+        self.assertEqual(response.data['missing'], [missing_id])
+        self.assertEqual(Product.objects.get(id=first).viewer, self.products[0].viewer)
+
+    @override_settings(PRODUCT_BATCH_MAX_IDS=2)
+    def test_invalid_ids(self):
+        first, second, third = (product.id for product in self.products)
+        cases = [
+            (f'{first},product', gettext('Ids must be comma separated integers.')),
+            (' , ', gettext('Send ids of products.')),
+            (f'{first},{second},{third}', gettext('At most %(max_ids)d products can be requested at once.') % {'max_ids': 2}),
+        ]
+        for ids, detail in cases:
+            with self.subTest(ids=ids):
+                response = self.get_batch(ids)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['detail'], detail)
+
+        # duplicates aren't counted
+        self.assertEqual(self.get_batch(f'{first},{second},{first}').status_code, 200)
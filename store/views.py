@@ -5,33 +5,137 @@ from rest_framework.response import Response
 from rest_framework import status as status_code
 from rest_framework import generics
 from rest_framework import mixins
+from rest_framework.exceptions import ValidationError
 from django.http import Http404
-from django.db.models import Prefetch, Case, When, Value, Sum
+from django.db import connection
+from django.db.models import Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext as _
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import get_object_or_404, aget_object_or_404, redirect
 from django.urls import reverse
 from django.conf import settings
 
 from django_filters.rest_framework import DjangoFilterBackend
+from asgiref.sync import sync_to_async
 from functools import cached_property
 
 from . import serializers
 from .models import Cart, CartItem, Category, Comment, CommentLike, CommentDislike, Customer, Address, Menu, Order, OrderItem, Product, ProductImage, Seller, IncreaseWalletCredit
 from .paginations import CustomLimitOffsetPagination
-from .filters import CustomerFilter, OrderFilter, SellerFilter, ProductFilter, SellerMeProductFilter, OrderMeFilter, IncreaseWalletCreditFilter
+from .filters import CustomerFilter, OrderFilter, SellerFilter, ProductFilter, SellerMeProductFilter, OrderMeFilter, IncreaseWalletCreditFilter, CommentWaitingFilter
 from .permissions import IsCustomerOrSeller, IsSeller, IsAdminUserOrReadOnly, IsAdminUserOrSeller, IsAdminUserOrSellerOwner, IsAdminUserOrCommentOwner, IsCommentOwner, IsSellerMe, ProductImagePermission, IsCustomerInfoComplete, IsOrderOwner
 from .ordering import ProductOrderingFilter
-from .payment import ZarinpalSandbox
+from .payment import AsyncZarinpalSandbox, PaymentGatewayError
+from .caches import get_cart_snapshot, get_cart_snapshot_versions, set_cart_snapshot, invalidate_cart_snapshot
+from .menus import get_menu_response
+from .fast_serializers import CustomerFastSerializer, IncreaseWalletCreditFastSerializer, OrderMeFastSerializer, ProductCardFastSerializer, ProductFastSerializer
+from .idempotency import idempotent
+from .roles import get_roles
+from .moderation import approve_comments, reject_comments, accept_sellers, reject_sellers
+from core.throttles import ProductAnonThrottle, ProductUserThrottle
+from .async_views import AsyncGenericAPIView, AsyncAPIView, AsyncViewSetMixin
+
+
+class Projection:
+    """
+        model fields and relations that a serializer field needs
+    """
+
+    def __init__(self, *only, select_related=(), prefetch_related=()):
+        self.only = only
+        self.select_related = select_related
+        self.prefetch_related = prefetch_related
+
+
+class SparseFieldsetMixin:
+    """
+        ?fields=id,title and/or ?omit=category on list, serializer renders only
+        selected fields and project_queryset loads only columns and relations
+        of their projections(sparse_fieldset), in order of serializer fields
+    """
+    sparse_fieldset = {}
 
+    @cached_property
+    def sparse_fields(self):
+        """
+            names of selected fields or None when all of fields are requested
+        """
+        if self.action != 'list':
+            return None
+
+        params = {param: self.request.query_params.get(param) for param in ['fields', 'omit']}
+        names = {param: {name.strip() for name in value.split(',') if name.strip()} for param, value in params.items() if value}
+        if not names:
+            return None
+
+        unknown_names = set().union(*names.values()) - self.sparse_fieldset.keys()
+        if unknown_names:
+            raise ValidationError({'detail': _('Unknown fields: %(fields)s.') % {'fields': ', '.join(sorted(unknown_names))}})
 
-class CustomerViewSet(ModelViewSet):
+        requested_names = names.get('fields', self.sparse_fieldset.keys())
+        omitted_names = names.get('omit', set())
+        return [name for name in self.sparse_fieldset if name in requested_names and name not in omitted_names]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.sparse_fields
+        return context
+
+    def project_queryset(self, queryset):
+        if self.sparse_fields is None:
+            return queryset
+
+        only, select_related, prefetch_related = ['id'], [], []
+        for name in self.sparse_fields:
+            projection = self.sparse_fieldset[name]
+            only.extend(projection.only)
+            select_related.extend(projection.select_related)
+            prefetch_related.extend(projection.prefetch_related)
+
+        queryset = queryset.select_related(None).prefetch_related(None).only(*only)
+        # select_related() without fields follows every relation
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset.prefetch_related(*prefetch_related)
+
+
+class FastListMixin:
+    """
+        list by fast_serializer_class(store.fast_serializers) on values_list()
+        rows instead of model instances and serializer of list action, which
+        still describes the output(e.g. for swagger)
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.fast_serializer_class(self.get_serializer_context())
+        rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+
+class CustomerViewSet(FastListMixin, SparseFieldsetMixin, ModelViewSet):
     http_method_names = ['get', 'head', 'options', 'put', 'patch']
     queryset = Customer.objects.all().select_related('user').order_by('-id')
     permission_classes = [IsAdminUser]
     pagination_class = CustomLimitOffsetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = CustomerFilter
+    fast_serializer_class = CustomerFastSerializer
+    sparse_fieldset = {
+        'id': Projection(),
+        'user': Projection('user__phone', select_related=['user']),
+        'first_name': Projection('first_name'),
+        'last_name': Projection('last_name'),
+        'profile_image': Projection('profile_image'),
+        'gender': Projection('gender'),
+        'age': Projection('birth_date'),
+    }
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -43,12 +147,13 @@ class CustomerViewSet(ModelViewSet):
 
         if self.action =='retrieve':
             return queryset.prefetch_related('addresses')
+        elif self.action == 'list':
+            return self.project_queryset(queryset)
         return queryset
     
     @action(detail=False, methods=['GET', 'PUT', 'PATCH'], permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
-        user = request.user
-        customer = self.queryset.prefetch_related('addresses').get(id=user.customer.id)
+        customer = self.queryset.prefetch_related('addresses').get(id=get_roles(request).customer_id)
 
         if request.method == 'GET':
             serializer = serializers.CustomerDetailSerializer(customer, context=self.get_serializer_context())
@@ -95,7 +200,7 @@ class AddressCustomerViewSet(ModelViewSet):
         return customer
 
     def get_queryset(self):
-        return Address.objects.filter(customer=self.customer)
+        return Address.objects.owned_by(Customer, self.customer.pk)
     
     def get_serializer_context(self):
         return {'customer_pk': self.customer.pk}
@@ -114,18 +219,30 @@ class RequestSellerGenericAPIView(generics.GenericAPIView):
         return Response({'detail': _('Your request has been successfully registered.')}, status=status_code.HTTP_200_OK)
 
 
-class SellerViewSet(ModelViewSet):
+class SellerViewSet(SparseFieldsetMixin, ModelViewSet):
     queryset = Seller.objects.all().select_related('user').order_by('-id')
     permission_classes = [IsAdminUser]
     pagination_class = CustomLimitOffsetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = SellerFilter
+    sparse_fieldset = {
+        'id': Projection(),
+        'company_name': Projection('company_name'),
+        'first_name': Projection('first_name'),
+        'last_name': Projection('last_name'),
+        'profile_image': Projection('profile_image'),
+        'national_code': Projection('national_code'),
+        'gender': Projection('gender'),
+        'age': Projection('birth_date'),
+    }
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
         if self.action =='retrieve':
             return queryset.prefetch_related('products').prefetch_related('addresses')
+        elif self.action == 'list':
+            return self.project_queryset(queryset)
         return queryset
 
     def get_serializer_class(self):
@@ -146,8 +263,7 @@ class SellerViewSet(ModelViewSet):
     
     @action(detail=False, methods=['GET', 'PUT', 'PATCH', 'DELETE'], permission_classes=[IsSeller])
     def me(self, request, *args, **kwargs):
-        user = request.user
-        seller = self.queryset.prefetch_related('products').prefetch_related('addresses').get(id=user.seller.id)
+        seller = self.queryset.prefetch_related('products').prefetch_related('addresses').get(id=get_roles(request).seller_id)
 
         if request.method == 'GET':
             serializer = serializers.SellerDetailSerializer(seller, context=self.get_serializer_context())
@@ -199,7 +315,7 @@ class AddressSellerViewSet(ModelViewSet):
         return seller
 
     def get_queryset(self):
-        return Address.objects.filter(seller=self.seller)
+        return Address.objects.owned_by(Seller, self.seller.pk)
     
     def get_serializer_context(self):
         return {'seller_pk': self.seller.pk}
@@ -213,11 +329,10 @@ class SellerMeProductViewSet(ModelViewSet):
     ordering_fields = ['price', 'inventory', 'created_datetime', 'viewer', 'sales_count']
 
     def get_queryset(self):
-        seller = self.request.user.seller
+        seller_id = get_roles(self.request).seller_id
 
-        queryset = Product.objects.filter(seller=seller).select_related('category').annotate(
-                    sales_count=Case(When(order_items__order__status=Order.ORDER_STATUS_PAID, then=Sum('order_items__quantity')),
-                                     default=Value(0))
+        queryset = Product.objects.filter(seller_id=seller_id).select_related('category').annotate(
+                    sales_count=Coalesce(Sum('order_items__quantity', filter=Q(order_items__order__status=Order.ORDER_STATUS_PAID)), 0)
                 ).order_by('-created_datetime')
 
         if self.action == 'list':
@@ -239,14 +354,46 @@ class SellerMeProductViewSet(ModelViewSet):
         return serializers.ProductUpdateSerializer
 
 
-class SellerListRequestsViewSet(ModelViewSet):
-    http_method_names = ['get', 'head', 'options', 'patch']
+class BulkChangeStatusMixin:
+    """
+        change status of items with ids of request body, or items that match
+        filter criteria of query params, by bulk_change_status_functions
+    """
+    bulk_change_status_functions = {}
+
+    @action(detail=False, methods=['POST'], url_path='bulk-change-status')
+    def bulk_change_status(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+        item_status = serializer.validated_data.get('status')
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+        elif not any(name in request.query_params for name in self.filterset_class.base_filters):
+            return Response({'detail': _('Send ids or filter criteria of items.')}, status=status_code.HTTP_400_BAD_REQUEST)
+
+        count = self.bulk_change_status_functions[item_status](queryset.order_by())
+        return Response({'status': dict(serializer.fields['status'].choices)[item_status], 'count': count}, status=status_code.HTTP_200_OK)
+
+
+class SellerListRequestsViewSet(BulkChangeStatusMixin, ModelViewSet):
+    http_method_names = ['get', 'head', 'options', 'post', 'patch']
     queryset = Seller.objects.filter(status=Seller.SELLER_STATUS_WAITING)
     permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SellerFilter
+    bulk_change_status_functions = {
+        Seller.SELLER_STATUS_ACCEPTED: accept_sellers,
+        Seller.SELLER_STATUS_REJECTED: reject_sellers
+    }
 
     def get_serializer_class(self):
         if self.action == 'partial_update':
             return serializers.SellerChangeStatusSerializer
+        elif self.action == 'bulk_change_status':
+            return serializers.SellerBulkChangeStatusSerializer
         return serializers.SellerListRequestsSerializer
     
     def partial_update(self, request, *args, **kwargs):
@@ -265,6 +412,7 @@ class SellerListRequestsViewSet(ModelViewSet):
 class CategoryViewSet(ModelViewSet):
     queryset = Category.objects.all().order_by('-id')
     pagination_class = CustomLimitOffsetPagination
+    read_from_replica = True
     permission_classes = [IsAdminUserOrReadOnly]
 
     def get_queryset(self):
@@ -299,27 +447,44 @@ class CategoryViewSet(ModelViewSet):
         return Response(status=status_code.HTTP_204_NO_CONTENT)
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.select_related('seller').select_related('category').annotate(
-                    sales_count=Case(When(order_items__order__status=Order.ORDER_STATUS_PAID, then=Sum('order_items__quantity')),
-                                     default=Value(0))
-                ).order_by('-created_datetime')
+class ProductViewSet(FastListMixin, SparseFieldsetMixin, ModelViewSet):
+    queryset = Product.objects.select_related('seller').select_related('category').order_by('-created_datetime')
     pagination_class = CustomLimitOffsetPagination
     filter_backends = [DjangoFilterBackend, ProductOrderingFilter]
     filterset_class = ProductFilter
+    read_from_replica = True
     ordering_fields = ['price', 'inventory', 'created_datetime', 'viewer', 'sales_count']
+    throttle_classes = [ProductAnonThrottle, ProductUserThrottle]
+    fast_serializer_class = ProductFastSerializer
+    sparse_fieldset = {
+        'id': Projection(),
+        'title': Projection('title'),
+        'slug': Projection('slug'),
+        'category': Projection('category', select_related=['category']),
+        'thumbnail': Projection(prefetch_related=[Prefetch('images', to_attr='product_images')]),
+        'seller': Projection('seller__company_name', select_related=['seller']),
+        'price': Projection('price'),
+        'viewer': Projection('viewer'),
+        'status': Projection('inventory'),
+    }
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
+        # sales count is only used for ordering, its join is skipped for other requests
+        if 'sales_count' in self.request.query_params.get(ProductOrderingFilter.ordering_param, ''):
+            queryset = queryset.annotate(
+                sales_count=Coalesce(Sum('order_items__quantity', filter=Q(order_items__order__status=Order.ORDER_STATUS_PAID)), 0)
+            )
+
         if self.action == 'list':
-            return queryset.prefetch_related(
+            return self.project_queryset(queryset.prefetch_related(
                 Prefetch('images', to_attr="product_images")
-            )
+            ))
         elif self.action == 'retrieve':
             return queryset.prefetch_related(
                 Prefetch('comments',
-                queryset=Comment.objects.prefetch_related('content_object').select_related('content_type').prefetch_related('likes').prefetch_related('dislikes').filter(status=Comment.COMMENT_STATUS_APPROVED, reply_to__isnull=True))
+                queryset=Comment.objects.prefetch_related('likes').prefetch_related('dislikes').filter(status=Comment.COMMENT_STATUS_APPROVED, reply_to__isnull=True))
             ).prefetch_related('images')
             
         return queryset
@@ -333,6 +498,8 @@ class ProductViewSet(ModelViewSet):
             return serializers.ProductCreateSerializer
         elif self.action == 'upload_image':
             return serializers.ProductImageSerializer
+        elif self.action == 'batch':
+            return serializers.ProductCardSerializer
         return serializers.ProductUpdateSerializer
     
     def get_permissions(self):
@@ -358,6 +525,38 @@ class ProductViewSet(ModelViewSet):
         instance.delete()
         return Response(status=status_code.HTTP_204_NO_CONTENT)
     
+    @action(detail=False, methods=['GET'])
+    def batch(self, request, *args, **kwargs):
+        """
+            cards of products of ?ids=3,1,2 in order of ids by one query of products
+            and one of their images, ids that don't exist(or are out of range of
+            primary key column) are returned as missing, viewer of products isn't
+            changed
+        """
+        try:
+            ids = list(dict.fromkeys(int(product_id) for product_id in request.query_params.get('ids', '').split(',') if product_id.strip()))
+        except ValueError:
+            return Response({'detail': _('Ids must be comma separated integers.')}, status=status_code.HTTP_400_BAD_REQUEST)
+
+        if not ids:
+            return Response({'detail': _('Send ids of products.')}, status=status_code.HTTP_400_BAD_REQUEST)
+        elif len(ids) > settings.PRODUCT_BATCH_MAX_IDS:
+            return Response(
+                {'detail': _('At most %(max_ids)d products can be requested at once.') % {'max_ids': settings.PRODUCT_BATCH_MAX_IDS}},
+                status=status_code.HTTP_400_BAD_REQUEST
+            )
+
+        # out of range ids would overflow parameters of query
+        min_id, max_id = connection.ops.integer_field_range(Product._meta.pk.get_internal_type())
+        queryset = Product.objects.filter(id__in=[product_id for product_id in ids if min_id <= product_id <= max_id])
+
+        serializer = ProductCardFastSerializer(self.get_serializer_context())
+        cards = {card['id']: card for card in serializer.serialize(serializer.get_rows(queryset))}
+        return Response({
+            'results': [cards[product_id] for product_id in ids if product_id in cards],
+            'missing': [product_id for product_id in ids if product_id not in cards],
+        })
+
     @action(detail=False, url_path='upload-image', methods=['POST'], permission_classes=[IsAdminUserOrSeller])
     def upload_image(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={'request': request})
@@ -369,6 +568,7 @@ class ProductViewSet(ModelViewSet):
 class CommentViewSet(ModelViewSet):
     http_method_names = ['get', 'head', 'options', 'post', 'delete', 'patch']
     pagination_class = CustomLimitOffsetPagination
+    read_from_replica = True
 
     @cached_property
     def product(self):
@@ -394,7 +594,7 @@ class CommentViewSet(ModelViewSet):
                     product=product,
                     status=Comment.COMMENT_STATUS_APPROVED)
         
-        return queryset.select_related('content_type').prefetch_related('content_object').prefetch_related('likes').prefetch_related('dislikes').order_by('-created_datetime')
+        return queryset.prefetch_related('likes').prefetch_related('dislikes').order_by('-created_datetime')
     
     def get_serializer_class(self):
         if self.action in ['retrieve', 'partial_update']:
@@ -405,13 +605,8 @@ class CommentViewSet(ModelViewSet):
         product = self.product
         
         if self.action == 'create':
-            user = self.request.user
-            if getattr(user, 'seller', False) and user.seller.status == Seller.SELLER_STATUS_ACCEPTED:
-                user_type = user.seller
-            else:
-                user_type = user.customer
             return {'product': product,
-                    'user': user_type}
+                    'user': get_roles(self.request).owner}
         return super().get_serializer_context()
     
     def get_permissions(self):
@@ -424,15 +619,23 @@ class CommentViewSet(ModelViewSet):
         return super().get_permissions()
     
 
-class CommentListWaitingViewSet(ModelViewSet):
-    http_method_names = ['get', 'head', 'options', 'patch']
-    queryset = Comment.objects.prefetch_related('content_object').select_related('content_type').select_related('product').filter(status=Comment.COMMENT_STATUS_WAITING).order_by('-created_datetime')
+class CommentListWaitingViewSet(BulkChangeStatusMixin, ModelViewSet):
+    http_method_names = ['get', 'head', 'options', 'post', 'patch']
+    queryset = Comment.objects.select_related('product').filter(status=Comment.COMMENT_STATUS_WAITING).order_by('-created_datetime')
     permission_classes = [IsAdminUser]
     pagination_class = CustomLimitOffsetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CommentWaitingFilter
+    bulk_change_status_functions = {
+        Comment.COMMENT_STATUS_APPROVED: approve_comments,
+        Comment.COMMENT_STATUS_NOT_APPROVED: reject_comments
+    }
 
     def get_serializer_class(self):
         if self.action == 'partial_update':
             return serializers.CommentChangeStatusSerializer
+        elif self.action == 'bulk_change_status':
+            return serializers.CommentBulkChangeStatusSerializer
         return serializers.CommentListWaitingSerializer
     
     def partial_update(self, request, *args, **kwargs):
@@ -481,23 +684,16 @@ class CommentLikeAPIView(APIView):
         if comment.reply_to:
             return Response({'detail': _('A comment that is a reply cannot be liked.')}, status=status_code.HTTP_400_BAD_REQUEST)
         
-        user = self.request.user
-        if getattr(user, 'seller', False) and user.seller.status == Seller.SELLER_STATUS_ACCEPTED:
-            user_type = user.seller
-            queryset = CommentLike.objects.filter(
-                seller=user_type, comment_id=comment_pk
-            )
-        else:
-            user_type = user.customer
-            queryset = CommentLike.objects.filter(
-                customer=user_type, comment_id=comment_pk
-            )
+        roles = get_roles(request)
+        queryset = CommentLike.objects.owned_by(roles.owner_model, roles.owner_id).filter(comment_id=comment_pk)
 
         if queryset.exists():
             queryset.first().delete()
             return Response({'detail': _('The comment like was removed.')}, status=status_code.HTTP_200_OK)
         else:
-            CommentLike.objects.create(content_object=user_type, comment_id=comment_pk)
+            CommentLike.objects.create(
+                content_type=ContentType.objects.get_for_model(roles.owner_model), object_id=roles.owner_id, comment_id=comment_pk
+            )
 
         return Response({'detail': _('The comment was successfully liked.')}, status=status_code.HTTP_201_CREATED)
 
@@ -522,23 +718,16 @@ class CommentDisLikeAPIView(APIView):
         if comment.reply_to:
             return Response({'detail': _('A comment that is a reply cannot be disliked.')}, status=status_code.HTTP_400_BAD_REQUEST)
         
-        user = self.request.user
-        if getattr(user, 'seller', False) and user.seller.status == Seller.SELLER_STATUS_ACCEPTED:
-            user_type = user.seller
-            queryset = CommentDislike.objects.filter(
-                seller=user_type, comment_id=comment_pk
-            )
-        else:
-            user_type = user.customer
-            queryset = CommentDislike.objects.filter(
-                customer=user_type, comment_id=comment_pk
-            )
+        roles = get_roles(request)
+        queryset = CommentDislike.objects.owned_by(roles.owner_model, roles.owner_id).filter(comment_id=comment_pk)
 
         if queryset.exists():
             queryset.first().delete()
             return Response({'detail': _('The comment dislike was removed.')}, status=status_code.HTTP_200_OK)
         else:
-            CommentDislike.objects.create(content_object=user_type, comment_id=comment_pk)
+            CommentDislike.objects.create(
+                content_type=ContentType.objects.get_for_model(roles.owner_model), object_id=roles.owner_id, comment_id=comment_pk
+            )
 
         return Response({'detail': _('The comment was successfully disliked.')}, status=status_code.HTTP_201_CREATED)
 
@@ -568,16 +757,22 @@ class CartViewSet(ModelViewSet):
     
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
-        queryset = self.get_queryset().prefetch_related(
-                Prefetch('items',
-                         queryset=CartItem.objects.select_related('product')
+        customer_id = get_roles(request).customer_id
+        data = get_cart_snapshot(customer_id)
+
+        if data is None:
+            versions = get_cart_snapshot_versions(customer_id)
+            queryset = self.get_queryset().prefetch_related(
+                    Prefetch('items',
+                             queryset=CartItem.objects.select_related('product')
+                    )
                 )
-            )
-        customer = request.user.customer
-        cart = queryset.get(customer_id=customer.id)
+            cart = queryset.get(customer_id=customer_id)
 
-        serializer = serializers.CartDetailSerializer(cart)
-        return Response(serializer.data, status=status_code.HTTP_200_OK)
+            data = serializers.CartDetailSerializer(cart).data
+            set_cart_snapshot(customer_id, versions, data)
+
+        return Response(data, status=status_code.HTTP_200_OK)
 
 
 class CartItemViewset(ModelViewSet):
@@ -595,7 +790,7 @@ class CartItemViewset(ModelViewSet):
         cart_pk = self.kwargs.get('cart_pk')
 
         if cart_pk == 'me':
-            cart = Cart.objects.get(customer=self.request.user.customer)
+            cart = Cart.objects.get(customer_id=get_roles(self.request).customer_id)
         else:
             try:
                 cart_pk = int(cart_pk)
@@ -615,18 +810,35 @@ class CartItemViewset(ModelViewSet):
             return serializers.CartItemCreateSerializer
         elif self.action == 'partial_update':
             return serializers.CartItemUpdateSerializer
+        elif self.action == 'batch':
+            return serializers.CartItemBatchSerializer
         return serializers.CartItemSerializer
     
     def get_serializer_context(self):
         return {'cart_pk': self.cart.pk}
+    
+    @action(detail=False, methods=['POST'])
+    def batch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        invalidate_cart_snapshot(self.cart.customer_id)
+        return Response({'results': results}, status=status_code.HTTP_200_OK)
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(SparseFieldsetMixin, ModelViewSet):
     http_method_names = ['get', 'options', 'head', 'post', 'patch', 'delete']
     queryset = Order.objects.all().select_related('customer__user').order_by('-created_datetime')
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderFilter
     pagination_class = CustomLimitOffsetPagination
+    sparse_fieldset = {
+        'id': Projection(),
+        'customer': Projection('customer', select_related=['customer__user']),
+        'status': Projection('status'),
+        'created_datetime': Projection('created_datetime'),
+        'delivery_date': Projection('delivery_date'),
+    }
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -637,6 +849,8 @@ class OrderViewSet(ModelViewSet):
                          queryset=OrderItem.objects.select_related('product')
                 )
             ).select_related('address')
+        elif self.action == 'list':
+            return self.project_queryset(queryset)
 
         return queryset
 
@@ -652,6 +866,7 @@ class OrderViewSet(ModelViewSet):
             return serializers.OrderUpdateSerializer
         return serializers.OrderSerializer
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         created_order_serializer = self.get_serializer(data=request.data)
         created_order_serializer.is_valid(raise_exception=True)
@@ -683,15 +898,16 @@ class OrderViewSet(ModelViewSet):
         return Response(serializer.data, status=status_code.HTTP_200_OK)        
 
 
-class OrderMeViewSet(ModelViewSet):
+class OrderMeViewSet(FastListMixin, ModelViewSet):
     http_method_names = ['get', 'options', 'head', 'patch', 'delete']
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderMeFilter
     pagination_class = CustomLimitOffsetPagination
+    fast_serializer_class = OrderMeFastSerializer
 
     def get_queryset(self):
-        customer = self.request.user.customer
-        queryset = Order.objects.filter(customer=customer).select_related('customer__user').order_by('-created_datetime')
+        customer_id = get_roles(self.request).customer_id
+        queryset = Order.objects.filter(customer_id=customer_id).select_related('customer__user').order_by('-created_datetime')
 
         if self.action =='retrieve':
             return queryset.prefetch_related(
@@ -751,44 +967,48 @@ class ClearAllCartAPIView(APIView):
         if cart_pk:
             cart = get_object_or_404(Cart, id=cart_pk)
         else:    
-            customer = request.user.customer
-            cart = Cart.objects.get(customer_id=customer.id)
+            cart = Cart.objects.get(customer_id=get_roles(request).customer_id)
         
         if cart.items.count() == 0:
             return Response({'detail': _('The cart is empty.')}, status=status_code.HTTP_400_BAD_REQUEST)
 
         cart.items.all().delete()
+        invalidate_cart_snapshot(cart.customer_id)
         return Response(status=status_code.HTTP_204_NO_CONTENT)
 
 
-class PaymentProcessSandboxGenericAPIView(generics.GenericAPIView):
+class PaymentProcessSandboxGenericAPIView(AsyncGenericAPIView):
     serializer_class = serializers.OrderPaymentSerializer
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    @idempotent
+    async def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        customer = request.user.customer
+        customer = await Customer.objects.aget(user_id=request.user.id)
         payment_method = serializer.validated_data.get('payment_method')
         order_id = serializer.validated_data.get('order_id')
 
-        order = get_object_or_404(Order, id=order_id, customer_id=customer.id, status=Order.ORDER_STATUS_UNPAID)
+        order = await aget_object_or_404(Order, id=order_id, customer_id=customer.id, status=Order.ORDER_STATUS_UNPAID)
 
-        rial_total_price = order.get_total_price()
+        rial_total_price = await order.aget_total_price()
 
         if payment_method == Order.ORDER_PAYMENT_METHOD_ONLINE:
-            zarinpal_sandbox = ZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
-            data = zarinpal_sandbox.payment_request(
-                rial_total_price=rial_total_price, 
-                description=f'#{order.id}: {customer.full_name}',
-                callback_url=request.build_absolute_uri(reverse('store:payment-callback-sandbox'))
-            )
+            zarinpal_sandbox = AsyncZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
+            try:
+                data = await zarinpal_sandbox.payment_request(
+                    rial_total_price=rial_total_price, 
+                    description=f'#{order.id}: {customer.full_name}',
+                    callback_url=request.build_absolute_uri(reverse('store:payment-callback-sandbox'))
+                )
+            except PaymentGatewayError:
+                return Response({'detail': _('The payment gateway is not available now, please try again later.')}, status=status_code.HTTP_503_SERVICE_UNAVAILABLE)
 
             authority = data['Authority']
             
             order.zarinpal_authority = authority
-            order.save(update_fields=['zarinpal_authority'])
+            await order.asave(update_fields=['zarinpal_authority'])
 
             if 'errors' not in data or len(data['errors']) == 0:
                 return redirect(zarinpal_sandbox.generate_payment_page_url(authority=authority))
@@ -800,32 +1020,35 @@ class PaymentProcessSandboxGenericAPIView(generics.GenericAPIView):
             
             order.status = Order.ORDER_STATUS_PAID
             order.payment_method = Order.ORDER_PAYMENT_METHOD_WALLET
-            order.save(update_fields=['status', 'payment_method'])
+            await order.asave(update_fields=['status', 'payment_method'])
 
             return Response({'detail': _('Your payment has been successfully complete.')}, status=status_code.HTTP_200_OK) 
 
 
-class PaymentCallbackSandboxAPIView(APIView):
+class PaymentCallbackSandboxAPIView(AsyncAPIView):
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         status = request.query_params.get('Status')
         authority = request.query_params.get('Authority')
 
-        order = get_object_or_404(Order, zarinpal_authority=authority)
+        order = await aget_object_or_404(Order, zarinpal_authority=authority)
 
         if status == 'OK':
-            zarinpal_sandbox = ZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
-            data = zarinpal_sandbox.payment_verify(
-                rial_total_price=order.get_total_price(), 
-                authority=authority
-            )
+            zarinpal_sandbox = AsyncZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
+            try:
+                data = await zarinpal_sandbox.payment_verify(
+                    rial_total_price=await order.aget_total_price(), 
+                    authority=authority
+                )
+            except PaymentGatewayError:
+                return Response({'detail': _('The payment gateway is not available now, please try again later.')}, status=status_code.HTTP_503_SERVICE_UNAVAILABLE)
             
             payment_status = data['Status']
 
             if payment_status == 100:
                 order.status = Order.ORDER_STATUS_PAID
                 order.zarinpal_ref_id = data['RefID']
-                order.save(update_fields=['status', 'zarinpal_ref_id'])
+                await order.asave(update_fields=['status', 'zarinpal_ref_id'])
 
                 return Response({'detail': _('Your payment has been successfully complete.')}, status=status_code.HTTP_200_OK)
             elif payment_status == 101:
@@ -836,42 +1059,52 @@ class PaymentCallbackSandboxAPIView(APIView):
             return Response({'detail': _('The payment was unsuccessful.')}, status=status_code.HTTP_400_BAD_REQUEST)
 
 
-class IncreaseWalletCreditViewSet(mixins.ListModelMixin,
+class IncreaseWalletCreditViewSet(AsyncViewSetMixin,
+                                  FastListMixin,
+                                  mixins.ListModelMixin,
                                   mixins.CreateModelMixin,
                                   GenericViewSet):
     queryset = IncreaseWalletCredit.objects.select_related('customer__user').order_by('-created_datetime')
     filter_backends = [DjangoFilterBackend]
     filterset_class = IncreaseWalletCreditFilter
     pagination_class = CustomLimitOffsetPagination
+    fast_serializer_class = IncreaseWalletCreditFastSerializer
     
     def get_permissions(self):
         if self.action == 'create':
             return [IsAuthenticated()]
-        return [IsAdminUser()]
+        elif self.action == 'list':
+            return [IsAdminUser()]
+        return super().get_permissions()
     
     def get_serializer_class(self):
         if self.action == 'create':
             return serializers.IncreaseWalletCreditCreateSerializer
         return serializers.IncreaseWalletCreditSerializer
     
-    def create(self, request, *args, **kwargs):
+    @idempotent
+    async def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        increase_wallet_credit = serializer.save()
+        increase_wallet_credit = await sync_to_async(serializer.save)()
 
-        customer = request.user.customer
+        customer = increase_wallet_credit.customer
 
-        zarinpal_sandbox = ZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
-        data = zarinpal_sandbox.payment_request(
-            rial_total_price=increase_wallet_credit.amount, 
-            description=f'#{increase_wallet_credit.id}: {customer.full_name if customer.full_name else customer.user.phone}',
-            callback_url=request.build_absolute_uri(reverse('store:wallet-credit-callback'))
-        )
+        zarinpal_sandbox = AsyncZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
+        try:
+            data = await zarinpal_sandbox.payment_request(
+                rial_total_price=increase_wallet_credit.amount, 
+                description=f'#{increase_wallet_credit.id}: {customer.full_name if customer.full_name else request.user.phone}',
+                callback_url=request.build_absolute_uri(reverse('store:wallet-credit-callback'))
+            )
+        except PaymentGatewayError:
+            await increase_wallet_credit.adelete()
+            return Response({'detail': _('The payment gateway is not available now, please try again later.')}, status=status_code.HTTP_503_SERVICE_UNAVAILABLE)
 
         authority = data['Authority']
         
         increase_wallet_credit.zarinpal_authority = authority
-        increase_wallet_credit.save(update_fields=['zarinpal_authority'])
+        await increase_wallet_credit.asave(update_fields=['zarinpal_authority'])
 
         if 'errors' not in data or len(data['errors']) == 0:
             return redirect(zarinpal_sandbox.generate_payment_page_url(authority=authority))
@@ -880,34 +1113,38 @@ class IncreaseWalletCreditViewSet(mixins.ListModelMixin,
             return Response({'detail': _('Error from zarinpal.')}, status=status_code.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
-    def callback(self, request, *args, **kwargs):
+    async def callback(self, request, *args, **kwargs):
         status = request.query_params.get('Status')
         authority = request.query_params.get('Authority')
 
-        increase_wallet_credit = get_object_or_404(IncreaseWalletCredit, zarinpal_authority=authority)
+        # authority is sent by client, so only credits of requesting customer are found
+        increase_wallet_credit = await aget_object_or_404(IncreaseWalletCredit, zarinpal_authority=authority, customer__user_id=request.user.id)
 
         if status == 'OK':
-            zarinpal_sandbox = ZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
-            data = zarinpal_sandbox.payment_verify(
-                rial_total_price=increase_wallet_credit.amount, 
-                authority=authority
-            )
+            zarinpal_sandbox = AsyncZarinpalSandbox(settings.ZARINPAL_MERCHANT_ID)
+            try:
+                data = await zarinpal_sandbox.payment_verify(
+                    rial_total_price=increase_wallet_credit.amount, 
+                    authority=authority
+                )
+            except PaymentGatewayError:
+                return Response({'detail': _('The payment gateway is not available now, please try again later.')}, status=status_code.HTTP_503_SERVICE_UNAVAILABLE)
             
             payment_status = data['Status']
 
             if payment_status == 100:
                 increase_wallet_credit.is_paid = True
                 increase_wallet_credit.zarinpal_ref_id = data['RefID']
-                increase_wallet_credit.save(update_fields=['is_paid', 'zarinpal_ref_id'])
+                await increase_wallet_credit.asave(update_fields=['is_paid', 'zarinpal_ref_id'])
 
                 return Response({'detail': _('Your payment has been successfully complete.')}, status=status_code.HTTP_200_OK)
             elif payment_status == 101:
                 return Response({'detail': _('Your payment has been successfully complete and has already been register.')}, status=status_code.HTTP_200_OK)
             else:
-                increase_wallet_credit.delete()
+                await increase_wallet_credit.adelete()
                 return Response({'detail': _('The payment was unsuccessful.')}, status=status_code.HTTP_400_BAD_REQUEST)
         else:
-            increase_wallet_credit.delete()
+            await increase_wallet_credit.adelete()
             return Response({'detail': _('The payment was unsuccessful.')}, status=status_code.HTTP_400_BAD_REQUEST)
 
 
@@ -918,24 +1155,17 @@ class MenuViewset(mixins.CreateModelMixin,
                   GenericViewSet):
     queryset = Menu.objects.all().order_by('-id')
     pagination_class = CustomLimitOffsetPagination
+    read_from_replica = True
     permission_classes = [IsAdminUserOrReadOnly]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        if self.action == 'list':
-            max_depth = 0
-            for menu in queryset:
-                depth = menu.level
-                if depth > max_depth:
-                    max_depth = depth
-        
-            return queryset.filter(sub_menu__isnull=True).prefetch_related(
-                '__'.join(['sub_menus' for _ in range(max_depth + 1)])
-            )
-        return queryset.select_related('sub_menu')
+        return super().get_queryset().select_related('sub_menu')
     
     def get_serializer_class(self):
         if self.action == 'list':
             return serializers.MenuSerializer
         return serializers.MenuCreateSerializer
+
+    def list(self, request, *args, **kwargs):
+        # menus are served from precompiled json(store.menus), MenuSerializer describes it
+        return get_menu_response(request, self)
@@ -0,0 +1,125 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import json
+import random
+import threading
+import time
+
+
+class ZarinpalStubRequestHandler(BaseHTTPRequestHandler):
+    """
+        local stand-in of zarinpal sandbox REST api(payment request,
+        payment verification and start pay page) for offline tests
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def send_json(self, status, data):
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    def inject_latency_and_failure(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self.send_json(503, {'errors': ['Service unavailable.']})
+            return True
+        return False
+
+    def do_POST(self):
+        request_data = self.read_json()
+
+        if self.inject_latency_and_failure():
+            return
+
+        if self.path.endswith('/PaymentRequest.json'):
+            self.send_json(200, self.server.payment_request(request_data))
+        elif self.path.endswith('/PaymentVerification.json'):
+            self.send_json(200, self.server.payment_verify(request_data))
+        else:
+            self.send_json(404, {'errors': ['Not found.']})
+
+    def do_GET(self):
+        if self.path.startswith('/pg/StartPay/'):
+            content = b'<html><body>Zarinpal stub payment page</body></html>'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.send_json(404, {'errors': ['Not found.']})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ZarinpalStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, latency=0, failure_rate=0):
+        super().__init__(server_address, ZarinpalStubRequestHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.payments = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def payment_request(self, request_data):
+        amount = request_data.get('Amount')
+        if not request_data.get('MerchantID') or not isinstance(amount, int) or amount < 1000:
+            return {'Status': -1, 'Authority': '', 'errors': ['Invalid request data.']}
+
+        with self._lock:
+            self._next_id += 1
+            authority = 'A%035d' % self._next_id
+            self.payments[authority] = {'amount': amount, 'ref_id': None}
+        return {'Status': 100, 'Authority': authority}
+
+    def payment_verify(self, request_data):
+        """
+            every authority is considered as paid by the customer,
+            so verification succeeds once and then returns status 101
+        """
+        with self._lock:
+            payment = self.payments.get(request_data.get('Authority'))
+
+            if payment is None:
+                return {'Status': -11, 'RefID': 0}
+            if payment['amount'] != request_data.get('Amount'):
+                return {'Status': -50, 'RefID': 0}
+            if payment['ref_id'] is not None:
+                return {'Status': 101, 'RefID': payment['ref_id']}
+
+            self._next_id += 1
+            payment['ref_id'] = self._next_id
+        return {'Status': 100, 'RefID': payment['ref_id']}
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0, failure_rate=0):
+    """
+        start stub server in a daemon thread and return it,
+        port 0 means a free port is chosen(see server.url)
+    """
+    server = ZarinpalStubServer((host, port), latency=latency, failure_rate=failure_rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server